@@ -0,0 +1,75 @@
+"""Concurrent reads over many spreadsheets with AsyncGSheetHandler, against a local stand-in Sheets server
+
+Each request waits LATENCY_SECONDS on the server side, as a round trip to Google would.
+    python -m benchmarks.bench_async_sheets
+"""
+import asyncio
+import json
+import threading
+import time
+from http.server import (BaseHTTPRequestHandler, ThreadingHTTPServer)
+
+from google.oauth2.credentials import Credentials
+
+from google_api_helpers.g_auth_helpers import AuthScope
+from google_api_helpers.g_sheet_async_helpers import AsyncGSheetHandler
+from google_api_helpers.g_scheduler_helpers import GRequestScheduler
+
+LATENCY_SECONDS: float = 0.05
+SPREADSHEETS_N: int = 300
+
+
+class ValuesRequestHandler(BaseHTTPRequestHandler):
+    # keep-alive connections, as Google servers do
+    protocol_version = "HTTP/1.1"
+    # headers and body are separate writes: without it, delayed acks add ~40ms per response
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        time.sleep(LATENCY_SECONDS)
+        content = json.dumps({'range': 'Sheet1!A1:C3',
+                              'majorDimension': 'ROWS',
+                              'values': [['A', 'B', 'C'], ['1', '2', '3'], ['4', '5', '6']]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandInServer(ThreadingHTTPServer):
+    # the default backlog of 5 drops connections opened concurrently
+    request_queue_size = 128
+
+
+async def read_spreadsheets(base_url: str, max_concurrency: int) -> float:
+    async with AsyncGSheetHandler(auth_scopes=[AuthScope.SpreadSheet],
+                                  spreadsheet_id="spreadsheet_id",
+                                  max_concurrency=max_concurrency,
+                                  base_url=base_url,
+                                  # the stand-in server has no quota: measure the concurrency alone
+                                  scheduler=GRequestScheduler(quota_buckets={})) as gsheet:
+        gsheet.authorized_creds = Credentials(token="token")
+        started_at = time.perf_counter()
+        results = await asyncio.gather(*[gsheet.read_gsheet(sheet_name="Sheet1",
+                                                            sheet_range="A1:C3",
+                                                            as_dataframe=False,
+                                                            spreadsheet_id=f"spreadsheet_{spreadsheet_n}")
+                                         for spreadsheet_n in range(SPREADSHEETS_N)])
+        assert all(len(result) == 3 for result in results)
+        return time.perf_counter() - started_at
+
+
+if __name__ == '__main__':
+    server = StandInServer(("127.0.0.1", 0), ValuesRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    server_url = f"http://127.0.0.1:{server.server_address[1]}/v4/spreadsheets"
+
+    for bench_concurrency in (1, 10, 25):
+        elapsed = asyncio.run(read_spreadsheets(base_url=server_url, max_concurrency=bench_concurrency))
+        print(f"max_concurrency={bench_concurrency:<3}: {SPREADSHEETS_N} spreadsheets read in {elapsed:6.2f} s, "
+              f"{SPREADSHEETS_N / elapsed:7.1f} reads/s")
+    server.shutdown()
@@ -0,0 +1,118 @@
+"""Full tab reads: values.get JSON versus a Drive CSV export, against a local stand-in server
+
+Both paths run their real client code: the Sheets discovery client then values_to_dataframe, and
+stream_sheet_export then read_export. The server adds a fixed latency per request and a bandwidth limit:
+exports are rendered by Docs and answer later than values.get, set both latencies to the ones you measure.
+    python -m benchmarks.bench_export_crossover
+"""
+import csv
+import io
+import json
+import tempfile
+import threading
+import time
+from http.server import (BaseHTTPRequestHandler, ThreadingHTTPServer)
+from typing import Dict
+
+import httplib2
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build_from_document
+
+from google_api_helpers.dataframe_helpers import values_to_dataframe
+from google_api_helpers.g_auth_helpers import AuthScope
+from google_api_helpers.g_drive_helpers import (GDriveHandler, read_export, stream_sheet_export)
+from google_api_helpers.g_scheduler_helpers import GRequestScheduler
+from google_api_helpers.g_service_helpers import get_discovery_doc
+
+COLUMNS_N: int = 20
+ROWS_NS = (100, 1_000, 5_000, 10_000, 15_000, 25_000, 50_000)
+VALUES_LATENCY_SECONDS: float = 0.15
+EXPORT_LATENCY_SECONDS: float = 0.6
+BANDWIDTH_BYTES_PER_SECOND: float = 20 * 1024 * 1024
+
+
+def build_values(rows_n: int) -> list:
+    """Formatted values, as values.get returns them by default"""
+    header = [f"column_{column_n}" for column_n in range(COLUMNS_N)]
+    rows = [[str(row_n * column_n) if column_n % 2 else f"{row_n * 0.25 + column_n:.2f}"
+             for column_n in range(COLUMNS_N)]
+            for row_n in range(rows_n)]
+    return [header] + rows
+
+
+PAYLOADS: Dict[int, Dict[str, bytes]] = {}
+
+
+def get_payloads(rows_n: int) -> Dict[str, bytes]:
+    if rows_n not in PAYLOADS:
+        values = build_values(rows_n)
+        csv_content = io.StringIO()
+        csv.writer(csv_content, lineterminator="\n").writerows(values)
+        PAYLOADS[rows_n] = {
+            'values': json.dumps({'range': f"Sheet1!A1:T{rows_n + 1}", 'majorDimension': 'ROWS',
+                                  'values': values}).encode(),
+            'export': csv_content.getvalue().encode()}
+    return PAYLOADS[rows_n]
+
+
+class StandInRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        # the spreadsheet id is the number of rows
+        is_export = self.path.startswith("/spreadsheets/d/")
+        rows_n = int(self.path.split("/")[3])
+        content = get_payloads(rows_n)['export' if is_export else 'values']
+        time.sleep((EXPORT_LATENCY_SECONDS if is_export else VALUES_LATENCY_SECONDS)
+                   + len(content) / BANDWIDTH_BYTES_PER_SECOND)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/csv" if is_export else "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == '__main__':
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    sheets_service = build_from_document(get_discovery_doc(api_name="sheets", api_version="v4"),
+                                         http=httplib2.Http(),
+                                         client_options={'api_endpoint': base_url})
+    # the stand-in server has no quota: measure the export path alone
+    gdrive = GDriveHandler(auth_scopes=[AuthScope.DriveReadOnly], credentials_folder_path=tempfile.mkdtemp(),
+                           scheduler=GRequestScheduler(quota_buckets={}), transport="requests")
+    gdrive.authorized_creds = Credentials(token="token")
+
+    # the payloads are built before timing
+    for bench_rows_n in ROWS_NS:
+        get_payloads(bench_rows_n)
+
+    crossover_cells = None
+    for bench_rows_n in ROWS_NS:
+        payloads = get_payloads(bench_rows_n)
+
+        started_at = time.perf_counter()
+        result = sheets_service.spreadsheets().values().get(spreadsheetId=str(bench_rows_n),
+                                                            range="Sheet1!A:T").execute()
+        values_to_dataframe(range_values=result['values'], header=True, typed=True)
+        values_seconds = time.perf_counter() - started_at
+
+        started_at = time.perf_counter()
+        with stream_sheet_export(g_handler=gdrive, spreadsheet_id=str(bench_rows_n), sheet_id=0,
+                                 export_url=f"{base_url}/spreadsheets/d/{{spreadsheet_id}}/export") as export_file:
+            read_export(export_file=export_file, header=True, typed=True)
+        export_seconds = time.perf_counter() - started_at
+
+        cells_n = bench_rows_n * COLUMNS_N
+        if crossover_cells is None and export_seconds < values_seconds:
+            crossover_cells = cells_n
+        print(f"{cells_n:>9,} cells: values.get {values_seconds:6.3f} s ({len(payloads['values']) / 1e6:6.2f} MB), "
+              f"export {export_seconds:6.3f} s ({len(payloads['export']) / 1e6:6.2f} MB)")
+    print(f"export faster from: {crossover_cells:,} cells" if crossover_cells else "export never faster")
+    server.shutdown()
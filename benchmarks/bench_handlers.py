@@ -0,0 +1,162 @@
+"""pytest-benchmark suite of GSheetHandler and GMailHandler against the local stand-in server
+
+Runs offline without credentials, the handlers real code is measured: discovery client, scheduler and parsing.
+    python -m pytest benchmarks/bench_handlers.py
+    python -m pytest benchmarks/bench_handlers.py --benchmark-autosave
+    python -m pytest benchmarks/bench_handlers.py --benchmark-compare --benchmark-compare-fail=mean:10%
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+
+from benchmarks.fake_google_server import (FakeGoogleServer, FakeGoogleConfig)
+from google_api_helpers.g_auth_helpers import AuthScope
+from google_api_helpers.g_mail_helpers import GMailHandler
+from google_api_helpers.g_scheduler_helpers import GRequestScheduler
+from google_api_helpers.g_service_helpers import (set_api_endpoint, clear_service_cache)
+from google_api_helpers.g_sheet_helpers import GSheetHandler
+
+LATENCY_SECONDS: float = 0.002
+
+
+def _credentials(base_url: str) -> Credentials:
+    return Credentials(token="token", refresh_token="refresh_token", token_uri=f"{base_url}token",
+                       client_id="client_id", client_secret="client_secret")
+
+
+def _scheduler() -> GRequestScheduler:
+    # the stand-in server has no quota: measure the handlers alone
+    return GRequestScheduler(quota_buckets={}, base_delay=0.01)
+
+
+@pytest.fixture(scope="module")
+def fake_server():
+    with FakeGoogleServer(FakeGoogleConfig(latency_seconds=LATENCY_SECONDS)) as fake_server:
+        set_api_endpoint('sheets', fake_server.base_url)
+        set_api_endpoint('gmail', fake_server.base_url)
+        yield fake_server
+        set_api_endpoint('sheets')
+        set_api_endpoint('gmail')
+        clear_service_cache()
+
+
+@pytest.fixture
+def gsheet(fake_server, tmp_path) -> GSheetHandler:
+    gsheet = GSheetHandler(auth_scopes=[AuthScope.SpreadSheet], spreadsheet_id="spreadsheet_id",
+                           credentials_folder_path=tmp_path, scheduler=_scheduler())
+    gsheet.authorized_creds = _credentials(fake_server.base_url)
+    return gsheet
+
+
+@pytest.fixture
+def gmail(fake_server, tmp_path) -> GMailHandler:
+    gmail = GMailHandler(auth_scopes=[AuthScope.GmailReadOnly], credentials_folder_path=tmp_path,
+                         scheduler=_scheduler())
+    gmail.authorized_creds = _credentials(fake_server.base_url)
+    return gmail
+
+
+def test_read_gsheet(benchmark, gsheet):
+    df = benchmark(gsheet.read_gsheet, sheet_name="Sheet1", sheet_range="A1:T1000", header=True)
+    assert df.shape == (999, 20)
+
+
+def test_read_gsheets_batch(benchmark, gsheet):
+    sheet_ranges = [("Sheet1", f"A{row_n}:T{row_n + 99}") for row_n in range(1, 1000, 100)]
+    ranges_values = benchmark(gsheet.read_gsheets_batch, sheet_ranges=sheet_ranges, as_dataframe=False)
+    assert [len(range_values) for range_values in ranges_values.values()] == [100] * 10
+
+
+def test_update_gsheet(benchmark, gsheet):
+    values = [[f"{row_n}.{column_n}" for column_n in range(20)] for row_n in range(1_000)]
+    updated_cells = benchmark(gsheet.update_gsheet, sheet_name="Sheet1", sheet_new_values=values,
+                              sheet_start_cell="A1")
+    assert updated_cells == 20_000
+
+
+def test_write_dataframe(benchmark, gsheet):
+    df = pd.DataFrame({f"column_{column_n}": range(column_n, column_n + 10_000) for column_n in range(10)})
+    write_report = benchmark(gsheet.write_dataframe, sheet_name="Sheet1", df=df, max_bytes=100_000)
+    assert write_report.rows_written == 10_000
+
+
+def test_get_message_ids(benchmark, gmail):
+    message_ids = benchmark(gmail.get_message_ids)
+    assert len(message_ids) == 1_000
+
+
+def test_read_message(benchmark, gmail):
+    g_email = benchmark(gmail.read_message, msg_id=f"{42:016x}")
+    assert g_email.subject == "Subject 42"
+    assert len(g_email.body_text) == 2_000
+
+
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_read_messages(benchmark, gmail, max_workers):
+    msg_ids = [f"{message_n:016x}" for message_n in range(1_000)]
+    g_emails = benchmark(lambda: list(gmail.read_messages(msg_ids=msg_ids, max_workers=max_workers)))
+    assert len(g_emails) == 1_000
+
+
+def test_list_message_headers(benchmark, gmail):
+    df = benchmark(gmail.list_message_headers, max_workers=4)
+    assert len(df) == 1_000
+    assert df['received_date'].notna().all()
+
+
+def test_sync_changes(benchmark, gmail, tmp_path):
+    checkpoint_path = tmp_path / "g_mail_sync.json"
+    assert gmail.sync_changes(checkpoint_path=checkpoint_path).full_resync
+    # steady state: nothing changed since the checkpoint
+    changes = benchmark(gmail.sync_changes, checkpoint_path=checkpoint_path)
+    assert not changes.full_resync and not changes.added
+
+
+def test_auth_refresh(benchmark, fake_server):
+    credentials = _credentials(fake_server.base_url)
+    request = Request()
+    benchmark(credentials.refresh, request)
+    assert credentials.token.startswith("token_")
+
+
+@pytest.mark.parametrize("transport", ["httplib2", "requests", "httpx"])
+def test_read_gsheet_threads(benchmark, fake_server, tmp_path, transport):
+    # new handlers and threads, as the jobs of a worker process: a pooled transport reuses the connections
+    def read_gsheets():
+        def read_gsheet():
+            gsheet = GSheetHandler(auth_scopes=[AuthScope.SpreadSheet], spreadsheet_id="spreadsheet_id",
+                                   credentials_folder_path=tmp_path, scheduler=_scheduler(), transport=transport)
+            gsheet.authorized_creds = credentials
+            return gsheet.read_gsheet(sheet_name="Sheet1", sheet_range="A1:C3", as_dataframe=False)
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            return list(executor.map(lambda _: read_gsheet(), range(8)))
+
+    credentials = _credentials(fake_server.base_url)
+    connections_n = fake_server.connections_n
+    results = benchmark(read_gsheets)
+    benchmark.extra_info['connections_n'] = fake_server.connections_n - connections_n
+    assert all(len(range_values) == 3 for range_values in results)
+
+
+def test_read_gsheet_quota_errors(benchmark, fake_server, tmp_path):
+    # every third request is throttled with Retry-After: 0, the retries are measured
+    with FakeGoogleServer(FakeGoogleConfig(latency_seconds=LATENCY_SECONDS, quota_error_every=3)) as throttling_server:
+        set_api_endpoint('sheets', throttling_server.base_url)
+        gsheet = GSheetHandler(auth_scopes=[AuthScope.SpreadSheet], spreadsheet_id="spreadsheet_id",
+                               credentials_folder_path=tmp_path, scheduler=_scheduler())
+        gsheet.authorized_creds = _credentials(throttling_server.base_url)
+
+        def read_gsheets() -> list:
+            # three reads a round: at least one is throttled, even in a single round with --benchmark-disable
+            return [gsheet.read_gsheet(sheet_name="Sheet1", sheet_range="A1:T100") for _ in range(3)]
+
+        try:
+            dfs = benchmark(read_gsheets)
+        finally:
+            set_api_endpoint('sheets', fake_server.base_url)
+        assert all(df.shape == (100, 20) for df in dfs)
+        assert gsheet.scheduler.stats['throttled'] > 0
@@ -0,0 +1,63 @@
+"""Peak memory of a 1M-cell values.get response: decoded at once, as read_gsheet does, or streamed into
+column buffers, as read_gsheet_streamed does
+
+The responses are read from in-memory streams built before tracing, as a socket would deliver them:
+formatted values are strings, unformatted ones numbers.
+    python -m benchmarks.bench_memory_read
+"""
+import io
+import json
+import time
+import tracemalloc
+from typing import Callable
+
+from google_api_helpers.dataframe_helpers import (columns_to_dataframe, read_values_stream, values_to_dataframe)
+
+ROWS_N: int = 50_000
+COLUMNS_N: int = 20
+
+
+def build_response(formatted: bool, rows_n: int = ROWS_N, columns_n: int = COLUMNS_N) -> bytes:
+    """A header row then values, strings as FORMATTED_VALUE returns them or numbers as UNFORMATTED_VALUE does"""
+    values = [[f"column_{column_n}" for column_n in range(columns_n)]]
+    for row_n in range(rows_n - 1):
+        row_values = [row_n * column_n if column_n % 2 else row_n * 0.25 + column_n for column_n in range(columns_n)]
+        values.append([str(value) for value in row_values] if formatted else row_values)
+    return json.dumps({'range': f"Sheet1!A1:{chr(64 + columns_n)}{rows_n}",
+                       'majorDimension': 'ROWS',
+                       'values': values}).encode()
+
+
+def read_decoded(response_stream: io.BytesIO, typed: bool):
+    # httplib2 reads the whole body, googleapiclient decodes it, then the DataFrame is built from the rows
+    content = response_stream.read()
+    result = json.loads(content)
+    return values_to_dataframe(range_values=result.get('values', []), header=True, typed=typed)
+
+
+def read_streamed(response_stream: io.BytesIO, typed: bool):
+    header_values, columns = read_values_stream(values_stream=response_stream, rows_n=ROWS_N, header=True,
+                                                numeric_columns=typed)
+    return columns_to_dataframe(header_values=header_values, columns=columns, typed=typed)
+
+
+def measure(read: Callable, response: bytes, typed: bool):
+    tracemalloc.start()
+    started_at = time.perf_counter()
+    df = read(io.BytesIO(response), typed=typed)
+    elapsed_seconds = time.perf_counter() - started_at
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert df.shape == (ROWS_N - 1, COLUMNS_N)
+    return peak_bytes, elapsed_seconds
+
+
+if __name__ == '__main__':
+    for bench_formatted, bench_typed in ((True, False), (False, True)):
+        bench_response = build_response(formatted=bench_formatted)
+        print(f"{'formatted' if bench_formatted else 'unformatted'} response, {'' if bench_typed else 'not '}typed: "
+              f"{ROWS_N * COLUMNS_N:,} cells, {len(bench_response) / 1e6:.1f} MB")
+        for read_name, read_function in (("decoded", read_decoded), ("streamed", read_streamed)):
+            bench_peak_bytes, bench_seconds = measure(read=read_function, response=bench_response, typed=bench_typed)
+            print(f"{read_name:>10}: peak {bench_peak_bytes / 1e6:7.1f} MB, {bench_seconds:6.2f} s "
+                  f"(traced, slower than untraced)")
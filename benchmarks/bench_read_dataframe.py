@@ -0,0 +1,67 @@
+"""Typed DataFrame conversion of a 100k x 20 values response: per-cell casting versus values_to_dataframe
+
+Runs offline on synthetic UNFORMATTED_VALUE values with truncated trailing cells.
+    python -m benchmarks.bench_read_dataframe
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+from google_api_helpers.dataframe_helpers import values_to_dataframe
+
+ROWS_N: int = 100_000
+COLUMNS_N: int = 20
+
+
+def build_values(rows_n: int = ROWS_N, columns_n: int = COLUMNS_N) -> list:
+    rng = np.random.default_rng(0)
+    columns = []
+    for column_n in range(columns_n):
+        if column_n % 5 == 0:
+            columns.append(rng.integers(0, 1_000, rows_n).tolist())
+        elif column_n % 5 == 1:
+            columns.append(rng.random(rows_n).round(4).tolist())
+        elif column_n % 5 == 2:
+            columns.append((rng.random(rows_n) > 0.5).tolist())
+        elif column_n % 5 == 3:
+            columns.append((45_000 + rng.integers(0, 1_000, rows_n)).tolist())
+        else:
+            columns.append([f"name_{value}" for value in rng.integers(0, 100, rows_n)])
+    rows = [list(row) for row in zip(*columns)]
+    # the API truncates trailing empty cells
+    for row_n in range(0, rows_n, 7):
+        del rows[row_n][-3:]
+    header = [f"column_{column_n}" for column_n in range(columns_n)]
+    return [header] + rows
+
+
+def per_cell_conversion(range_values: list) -> pd.DataFrame:
+    """The conversion callers run today on the read_gsheet DataFrame"""
+    df = pd.DataFrame(data=range_values)
+    df.columns = df.iloc[0]
+    df = df.iloc[1:].reset_index(drop=True)
+    for column_n, column in enumerate(df.columns):
+        if column_n % 5 in (0, 1):
+            df[column] = df[column].apply(lambda value: float(value) if value not in (None, "") else np.nan)
+        elif column_n % 5 == 2:
+            df[column] = df[column].apply(lambda value: bool(value) if value is not None else None)
+        elif column_n % 5 == 3:
+            df[column] = df[column].apply(lambda value: pd.Timestamp("1899-12-30") + pd.Timedelta(days=value)
+                                          if value is not None else pd.NaT)
+    return df
+
+
+def vectorized_conversion(range_values: list) -> pd.DataFrame:
+    date_columns = [column_n for column_n in range(COLUMNS_N) if column_n % 5 == 3]
+    return values_to_dataframe(range_values=range_values, header=True, typed=True, date_columns=date_columns)
+
+
+if __name__ == '__main__':
+    bench_values = build_values()
+    for bench_name, bench_function in [("per cell conversion", per_cell_conversion),
+                                       ("values_to_dataframe", vectorized_conversion)]:
+        started_at = time.perf_counter()
+        bench_df = bench_function(bench_values)
+        print(f"{bench_name:<22}: {time.perf_counter() - started_at:8.3f} s, "
+              f"dtypes: {sorted(set(str(dtype) for dtype in bench_df.dtypes))}")
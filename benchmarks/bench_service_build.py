@@ -0,0 +1,41 @@
+"""Per-call overhead of discovery.build versus the shared service layer
+
+Runs offline: requests are built but never executed.
+    python -m benchmarks.bench_service_build
+"""
+import timeit
+
+from google.oauth2.credentials import Credentials
+from googleapiclient import discovery
+
+from google_api_helpers.g_service_helpers import (build_service, get_resource)
+
+# discovery.build parses the 300kB sheets document and creates a transport on each call: keep it small
+CALLS_N: int = 20
+
+
+def build_each_call(credentials: Credentials):
+    service = discovery.build('sheets', 'v4', credentials=credentials, static_discovery=True)
+    return service.spreadsheets().values().get(spreadsheetId="spreadsheet_id", range="Sheet1!A1:B2")
+
+
+def shared_service(credentials: Credentials):
+    service = build_service(api_name='sheets', api_version='v4', credentials=credentials)
+    return get_resource(service, "spreadsheets.values").get(spreadsheetId="spreadsheet_id", range="Sheet1!A1:B2")
+
+
+def run_benchmark(calls_n: int = CALLS_N) -> dict:
+    credentials = Credentials(token="token")
+    results: dict = {}
+    for bench_name, bench_function in [("discovery.build per call", build_each_call),
+                                       ("shared service layer", shared_service)]:
+        elapsed = min(timeit.repeat(lambda: bench_function(credentials), number=calls_n, repeat=3))
+        results[bench_name] = elapsed / calls_n * 1_000_000
+    return results
+
+
+if __name__ == '__main__':
+    bench_results = run_benchmark()
+    for name, micro_seconds in bench_results.items():
+        print(f"{name:<28}: {micro_seconds:10.1f} µs/call")
+    print(f"{'speed up':<28}: {bench_results['discovery.build per call'] / bench_results['shared service layer']:10.1f}x")
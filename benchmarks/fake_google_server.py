@@ -0,0 +1,322 @@
+"""Local stand-in for the Sheets v4, Gmail v1 (with its HTTP batch endpoint) and OAuth token endpoints used by
+the handlers
+
+Responses follow the shapes of the Google APIs, generated from the request: a values.get of 'A1:T1000'
+returns 1000 x 20 values. Latency, quota errors and payload sizes are set on FakeGoogleConfig.
+
+    with FakeGoogleServer(FakeGoogleConfig(latency_seconds=0.05)) as fake_server:
+        set_api_endpoint('sheets', fake_server.base_url)
+        set_api_endpoint('gmail', fake_server.base_url)
+"""
+import base64
+import email
+import json
+import re
+import threading
+import time
+from http.server import (BaseHTTPRequestHandler, ThreadingHTTPServer)
+from typing import (Optional, List, Dict, Tuple)
+from urllib.parse import (urlsplit, parse_qs, unquote)
+
+from google_api_helpers.misc_helpers import A1Range
+
+_SHEETS_PATH_RE = re.compile(r'/v4/spreadsheets/(?P<spreadsheet_id>[^/:]+)(?P<rest>.*)')
+_GMAIL_PATH_RE = re.compile(r'/gmail/v1/users/(?P<user_id>[^/]+)/(?P<rest>.*)')
+
+
+class FakeGoogleConfig:
+    def __init__(self, latency_seconds: float = 0.0,
+                 quota_error_every: int = 0,
+                 retry_after_seconds: float = 0.0,
+                 sheet_rows_n: int = 1_000,
+                 sheet_columns_n: int = 20,
+                 messages_n: int = 1_000,
+                 message_body_bytes: int = 2_000):
+        """
+        Args:
+            latency_seconds (float=0.0): server side wait of each request
+            quota_error_every (int=0): every nth request is answered with a 429, never if 0,
+                the requests of an HTTP batch count one each
+            retry_after_seconds (float=0.0): the Retry-After header of the 429 responses
+            sheet_rows_n (int=1_000): the grid rows of each sheet, the rows returned for open-ended ranges
+            sheet_columns_n (int=20): the grid columns of each sheet
+            messages_n (int=1_000): the messages in the mailbox
+            message_body_bytes (int=2_000): the size of each message text body
+        """
+        self.latency_seconds: float = latency_seconds
+        self.quota_error_every: int = quota_error_every
+        self.retry_after_seconds: float = retry_after_seconds
+        self.sheet_rows_n: int = sheet_rows_n
+        self.sheet_columns_n: int = sheet_columns_n
+        self.messages_n: int = messages_n
+        self.message_body_bytes: int = message_body_bytes
+
+
+class FakeGoogleRequestHandler(BaseHTTPRequestHandler):
+    # keep-alive connections, as Google servers do
+    protocol_version = "HTTP/1.1"
+    # headers and body are separate writes: without it, delayed acks add ~40ms per response
+    disable_nagle_algorithm = True
+
+    server: "FakeGoogleHTTPServer"
+
+    def setup(self):
+        super().setup()
+        self.server.count_connection()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, content: dict, headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(content).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(body)))
+        for header_name, header_value in (headers or {}).items():
+            self.send_header(header_name, header_value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def _handle(self, method: str):
+        body = self._read_body() if method != "GET" else b""
+        config = self.server.config
+        request_n = self.server.count_request(method)
+        if config.latency_seconds:
+            time.sleep(config.latency_seconds)
+        if config.quota_error_every and request_n % config.quota_error_every == 0:
+            self._send_json(429, {'error': {'code': 429, 'message': 'Quota exceeded', 'status': 'RESOURCE_EXHAUSTED'}},
+                            headers={'Retry-After': str(config.retry_after_seconds)})
+            return
+
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        if method == "POST" and url.path == "/batch":
+            self._send_batch(body)
+            return
+        if url.path == "/token":
+            self._send_json(200, {'access_token': f"token_{request_n}", 'expires_in': 3600, 'token_type': 'Bearer'})
+            return
+        sheets_match = _SHEETS_PATH_RE.fullmatch(url.path)
+        if sheets_match:
+            status, content = self.server.sheets_response(method, unquote(sheets_match['rest']), query, body)
+            self._send_json(status, content)
+            return
+        gmail_match = _GMAIL_PATH_RE.fullmatch(url.path)
+        if gmail_match:
+            status, content = self.server.gmail_response(method, gmail_match['rest'], query)
+            self._send_json(status, content)
+            return
+        self._send_json(404, {'error': {'code': 404, 'message': f'Not found: {url.path}'}})
+
+    def _send_batch(self, body: bytes):
+        """Answer a multipart/mixed HTTP batch of Gmail GET requests, as googleapiclient.http.BatchHttpRequest sends"""
+        config = self.server.config
+        batch_message = email.message_from_bytes(
+            f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + body)
+        response_parts: List[str] = []
+        for part in batch_message.get_payload():
+            request_line = part.get_payload().lstrip().split("\n", 1)[0]
+            method, path, _ = request_line.split(" ", 2)
+            request_n = self.server.count_request(method)
+            url = urlsplit(path)
+            gmail_match = _GMAIL_PATH_RE.fullmatch(url.path)
+            if config.quota_error_every and request_n % config.quota_error_every == 0:
+                status, content = 429, {'error': {'code': 429, 'message': 'Quota exceeded'}}
+            elif gmail_match:
+                status, content = self.server.gmail_response(method, gmail_match['rest'], parse_qs(url.query))
+            else:
+                status, content = 404, {'error': {'code': 404, 'message': f'Not found: {url.path}'}}
+            response_parts.append(f"Content-Type: application/http\r\n"
+                                  f"Content-ID: <response-{part['Content-ID'][1:-1]}>\r\n\r\n"
+                                  f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                                  f"Content-Type: application/json; charset=UTF-8\r\n"
+                                  f"Retry-After: {config.retry_after_seconds}\r\n\r\n"
+                                  f"{json.dumps(content)}\r\n")
+        boundary = "batch_fake_google_server"
+        response_body = ("".join(f"--{boundary}\r\n{response_part}" for response_part in response_parts)
+                         + f"--{boundary}--\r\n").encode()
+        self.send_response(200)
+        self.send_header("Content-Type", f"multipart/mixed; boundary={boundary}")
+        self.send_header("Content-Length", str(len(response_body)))
+        self.end_headers()
+        self.wfile.write(response_body)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_PUT(self):
+        self._handle("PUT")
+
+
+class FakeGoogleHTTPServer(ThreadingHTTPServer):
+    # the default backlog of 5 drops connections opened concurrently
+    request_queue_size = 128
+    daemon_threads = True
+
+    def __init__(self, config: FakeGoogleConfig):
+        super().__init__(("127.0.0.1", 0), FakeGoogleRequestHandler)
+        self.config: FakeGoogleConfig = config
+        self._counter_lock = threading.Lock()
+        self.requests_n: int = 0
+        self.requests_per_method: Dict[str, int] = {}
+        self.connections_n: int = 0
+
+    def count_connection(self):
+        with self._counter_lock:
+            self.connections_n += 1
+
+    def count_request(self, method: str) -> int:
+        with self._counter_lock:
+            self.requests_n += 1
+            self.requests_per_method[method] = self.requests_per_method.get(method, 0) + 1
+            return self.requests_n
+
+    def _range_values(self, range_address: str, major_dimension: str = "ROWS") -> Tuple[str, List[List]]:
+        a1_range = A1Range.parse(range_address)
+        start_row, start_column = a1_range.start_row or 1, a1_range.start_column or 1
+        end_row = min(a1_range.end_row or self.config.sheet_rows_n, self.config.sheet_rows_n)
+        end_column = min(a1_range.end_column or self.config.sheet_columns_n, self.config.sheet_columns_n)
+        values = [[f"{row_n}.{column_n}" for column_n in range(start_column, end_column + 1)]
+                  for row_n in range(start_row, end_row + 1)]
+        if major_dimension == "COLUMNS":
+            values = [list(column_values) for column_values in zip(*values)]
+        echo_range = A1Range(start_row, start_column, end_row, end_column, a1_range.sheet_name)
+        return echo_range.to_a1(), values
+
+    def sheets_response(self, method: str, rest: str, query: Dict[str, List[str]], body: bytes) -> Tuple[int, dict]:
+        request_body = json.loads(body) if body else {}
+        if method == "GET" and rest == "":
+            return 200, {'sheets': [{'properties': {
+                'sheetId': sheet_n, 'title': f"Sheet{sheet_n + 1}", 'index': sheet_n,
+                'gridProperties': {'rowCount': self.config.sheet_rows_n,
+                                   'columnCount': self.config.sheet_columns_n}}} for sheet_n in range(3)]}
+        major_dimension = query.get('majorDimension', ['ROWS'])[0]
+        if method == "GET" and rest.startswith("/values/"):
+            echo_range, values = self._range_values(rest[len("/values/"):], major_dimension)
+            return 200, {'range': echo_range, 'majorDimension': major_dimension, 'values': values}
+        if method == "GET" and rest == "/values:batchGet":
+            value_ranges = []
+            for range_address in query.get('ranges', []):
+                echo_range, values = self._range_values(range_address, major_dimension)
+                value_ranges.append({'range': echo_range, 'majorDimension': major_dimension, 'values': values})
+            return 200, {'valueRanges': value_ranges}
+        if method == "PUT" and rest.startswith("/values/"):
+            return 200, _update_response(rest[len("/values/"):], request_body.get('values', []))
+        if method == "POST" and rest == "/values:batchUpdate":
+            responses = [_update_response(data['range'], data['values']) for data in request_body.get('data', [])]
+            return 200, {'totalUpdatedCells': sum(response['updatedCells'] for response in responses),
+                         'responses': responses}
+        if method == "POST" and rest.endswith(":append"):
+            update_response = _update_response(rest[len("/values/"):-len(":append")], request_body.get('values', []))
+            return 200, {'updates': update_response}
+        if method == "POST" and rest.endswith(":clear"):
+            return 200, {'clearedRange': rest[len("/values/"):-len(":clear")]}
+        if method == "POST" and rest == ":batchUpdate":
+            return 200, {'replies': [{} for _ in request_body.get('requests', [])]}
+        return 404, {'error': {'code': 404, 'message': f'Not found: {rest}'}}
+
+    def _message(self, message_n: int, message_format: str, metadata_headers: Optional[List[str]] = None) -> dict:
+        headers = [{'name': 'Subject', 'value': f"Subject {message_n}"},
+                   {'name': 'From', 'value': f"sender{message_n % 50}@example.com"},
+                   {'name': 'Date', 'value': time.strftime("%a, %d %b %Y %H:%M:%S +0000",
+                                                           time.gmtime(1_700_000_000 - message_n * 3600))}]
+        message = {'id': f"{message_n:016x}", 'threadId': f"{message_n:016x}", 'labelIds': ['INBOX'],
+                   'historyId': str(10_000 + message_n), 'sizeEstimate': self.config.message_body_bytes,
+                   'internalDate': str((1_700_000_000 - message_n * 3600) * 1000)}
+        if message_format == "metadata":
+            if metadata_headers:
+                headers = [header for header in headers if header['name'] in metadata_headers]
+            message['payload'] = {'mimeType': 'text/plain', 'headers': headers}
+        else:
+            body = ("x" * self.config.message_body_bytes).encode()
+            message['payload'] = {'mimeType': 'text/plain', 'headers': headers,
+                                  'body': {'size': len(body), 'data': base64.urlsafe_b64encode(body).decode()}}
+        return message
+
+    def gmail_response(self, method: str, rest: str, query: Dict[str, List[str]]) -> Tuple[int, dict]:
+        if method == "GET" and rest == "messages":
+            max_results = min(int(query.get('maxResults', ['100'])[0]), 500)
+            page_start = int(query.get('pageToken', ['0'])[0])
+            page_end = min(page_start + max_results, self.config.messages_n)
+            content: dict = {'messages': [{'id': f"{message_n:016x}", 'threadId': f"{message_n:016x}"}
+                                          for message_n in range(page_start, page_end)],
+                             'resultSizeEstimate': self.config.messages_n}
+            if page_end < self.config.messages_n:
+                content['nextPageToken'] = str(page_end)
+            return 200, content
+        if method == "GET" and rest.startswith("messages/"):
+            message_n = int(rest[len("messages/"):], 16)
+            if message_n >= self.config.messages_n:
+                return 404, {'error': {'code': 404, 'message': 'Requested entity was not found.'}}
+            return 200, self._message(message_n, query.get('format', ['full'])[0], query.get('metadataHeaders'))
+        if method == "GET" and rest == "history":
+            # message n was added at historyId 10_000 + n, older historyIds are expired
+            start_history_id = int(query['startHistoryId'][0])
+            if start_history_id < 10_000:
+                return 404, {'error': {'code': 404, 'message': 'Requested entity was not found.'}}
+            max_results = min(int(query.get('maxResults', ['100'])[0]), 500)
+            page_start = max(int(query.get('pageToken', [start_history_id - 10_000 + 1])[0]), 0)
+            page_end = min(page_start + max_results, self.config.messages_n)
+            content = {'history': [{'id': str(10_000 + message_n),
+                                    'messagesAdded': [{'message': self._message(message_n, "minimal")}]}
+                                   for message_n in range(page_start, page_end)],
+                       'historyId': str(10_000 + self.config.messages_n)}
+            if page_end < self.config.messages_n:
+                content['nextPageToken'] = str(page_end)
+            return 200, content
+        if method == "GET" and rest == "profile":
+            return 200, {'emailAddress': 'me@example.com', 'messagesTotal': self.config.messages_n,
+                         'historyId': str(10_000 + self.config.messages_n)}
+        return 404, {'error': {'code': 404, 'message': f'Not found: {rest}'}}
+
+
+def _update_response(range_address: str, values: List[List]) -> dict:
+    rows_n = len(values)
+    columns_n = max((len(row_values) for row_values in values), default=0)
+    a1_range = A1Range.parse(range_address)
+    updated_range = A1Range.from_shape(start_cell=f"{A1Range(a1_range.start_row or 1, a1_range.start_column or 1)}"
+                                       .partition(":")[0],
+                                       rows_n=rows_n, columns_n=columns_n, sheet_name=a1_range.sheet_name)
+    return {'updatedRange': updated_range.to_a1(), 'updatedRows': rows_n, 'updatedColumns': columns_n,
+            'updatedCells': sum(len(row_values) for row_values in values)}
+
+
+class FakeGoogleServer:
+    def __init__(self, config: Optional[FakeGoogleConfig] = None):
+        self.config: FakeGoogleConfig = config or FakeGoogleConfig()
+        self._http_server: Optional[FakeGoogleHTTPServer] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._http_server.server_address[1]}/"
+
+    @property
+    def requests_n(self) -> int:
+        return self._http_server.requests_n
+
+    @property
+    def connections_n(self) -> int:
+        return self._http_server.connections_n
+
+    def start(self) -> "FakeGoogleServer":
+        self._http_server = FakeGoogleHTTPServer(config=self.config)
+        threading.Thread(target=self._http_server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._http_server is not None:
+            self._http_server.shutdown()
+            self._http_server.server_close()
+            self._http_server = None
+
+    def __enter__(self) -> "FakeGoogleServer":
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
@@ -36,6 +36,16 @@ def get_g_credentials_path() -> Path:
     return credential_path
 
 
+def get_g_cache_path() -> Path:
+    """Return the path to the local cache folder and create the folder if it doesn't exist"""
+    app_root_path: Path = get_root_full_path()
+    cache_path: Path = Path(app_root_path, "g_cache")
+
+    if not cache_path.exists():
+        cache_path.mkdir(parents=False, exist_ok=True)
+    return cache_path
+
+
 def logging_config(log_file_name: Optional[str] = None,
                    force_local_folder: bool = False,
                    project_name: Optional[str] = None,
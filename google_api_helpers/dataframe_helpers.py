@@ -0,0 +1,328 @@
+"""Typed pd.DataFrame conversion of the values returned by the Sheets API
+
+Columns are converted one at a time with vectorized NumPy/pandas operations, never cell by cell.
+"""
+from typing import (BinaryIO, Dict, List, Optional, Tuple, Union)
+
+import numpy as np
+import pandas as pd
+
+# Sheets serial numbers count the days since 1899-12-30
+SERIAL_NUMBER_ORIGIN: str = "1899-12-30"
+# values probed before converting a whole string column, text columns are rejected without a full parse
+PROBE_VALUES_N: int = 100
+# rows parsed from a response stream before being copied into the column buffers
+STREAM_CHUNK_ROWS: int = 4096
+
+
+def pad_rows(range_values: List[List]) -> np.ndarray:
+    """Return the values as a 2D object array, the rows truncated by the API being padded with None"""
+    width = max(map(len, range_values), default=0)
+    padded_values = np.full((len(range_values), width), None, dtype=object)
+    # rows of the same width are assigned at once, the API truncates mainly the trailing rows
+    row_widths = np.fromiter(map(len, range_values), dtype=np.int64, count=len(range_values))
+    for row_width in np.unique(row_widths):
+        if row_width == 0:
+            continue
+        rows_n = np.flatnonzero(row_widths == row_width)
+        row_block = np.empty((len(rows_n), row_width), dtype=object)
+        row_block[:] = [range_values[row_n] for row_n in rows_n]
+        padded_values[rows_n, :row_width] = row_block
+    return padded_values
+
+
+def _whole_numbers_to_int(float_values: np.ndarray,
+                          is_empty: np.ndarray) -> Union[np.ndarray, pd.api.extensions.ExtensionArray, None]:
+    """Return a float64 column as int64, or Int64 with empty cells, None if a value is not a whole number"""
+    filled_values = float_values[~is_empty]
+    if not (filled_values == np.floor(filled_values)).all() or not (np.abs(filled_values) < 2 ** 53).all():
+        return None
+    if not is_empty.any():
+        return float_values.astype(np.int64)
+    return pd.array(np.where(is_empty, None, float_values), dtype="Int64")
+
+
+def _convert_column(column_values: np.ndarray, is_date: bool = False) -> Union[np.ndarray, pd.api.extensions.ExtensionArray]:
+    """Return the column as its narrowest type: boolean, Int64, float64, datetime64 or the object values
+
+    Numbers written with leading zeros, i.e.: '007', are kept as strings, and a date column is kept as its values
+    unless all of them are dates
+    """
+    is_empty = pd.isna(column_values) | (column_values == "")
+    filled_values = column_values[~is_empty]
+    if not len(filled_values):
+        return column_values
+
+    if is_date:
+        if pd.api.types.infer_dtype(filled_values, skipna=True) in ("integer", "floating", "mixed-integer-float"):
+            serial_numbers = np.where(is_empty, np.nan, column_values).astype(np.float64)
+            return pd.to_datetime(serial_numbers, unit="D", origin=SERIAL_NUMBER_ORIGIN).values
+        date_values = pd.to_datetime(np.where(is_empty, None, column_values), errors="coerce")
+        if pd.isna(date_values[~is_empty]).any():
+            return column_values
+        return date_values.values
+
+    inferred_type = pd.api.types.infer_dtype(filled_values, skipna=True)
+    if inferred_type == "string":
+        # formatted values: numbers and booleans come as strings
+        probe_values = filled_values[:PROBE_VALUES_N].astype(str)
+        if (np.isin(np.char.upper(probe_values), ("TRUE", "FALSE")).all()
+                and np.isin(np.char.upper(filled_values.astype(str)), ("TRUE", "FALSE")).all()):
+            inferred_type = "boolean"
+            column_values = np.where(is_empty, None, np.char.upper(column_values.astype(str)) == "TRUE")
+        else:
+            if np.isnan(pd.to_numeric(probe_values, errors="coerce")).any():
+                return column_values
+            numeric_values = pd.to_numeric(filled_values, errors="coerce")
+            if np.isnan(numeric_values).any():
+                return column_values
+            if pd.Series(filled_values.astype(str)).str.match(r"[+-]?0\d").any():
+                # codes such as '007': the leading zeros would be lost
+                return column_values
+            inferred_type = "floating"
+            column_values = np.where(is_empty, np.nan, pd.to_numeric(column_values, errors="coerce"))
+
+    if inferred_type == "boolean":
+        return pd.array(np.where(is_empty, None, column_values), dtype="boolean")
+    if inferred_type == "integer":
+        if not is_empty.any():
+            return column_values.astype(np.int64)
+        return pd.array(np.where(is_empty, None, column_values), dtype="Int64")
+    if inferred_type in ("floating", "mixed-integer-float"):
+        float_values = np.where(is_empty, np.nan, column_values).astype(np.float64)
+        int_values = _whole_numbers_to_int(float_values, is_empty=is_empty)
+        return float_values if int_values is None else int_values
+    return column_values
+
+
+def values_to_dataframe(range_values: List[List],
+                        header: bool = False,
+                        typed: bool = False,
+                        date_columns: Optional[List[Union[str, int]]] = None) -> pd.DataFrame:
+    """Return the values of a Sheets range as a pd.DataFrame
+
+    Args:
+        range_values (List[List]): the 'values' of a Sheets API response, rows can be of different lengths
+        header (bool=False): use the first row as the columns names
+        typed (bool=False): convert the columns to boolean, Int64, float64 when all their values allow it,
+            numbers written with leading zeros are kept as strings
+        date_columns (Optional[List[Union[str, int]]]=None): columns names or positions holding dates,
+            as serial numbers (dateTimeRenderOption=SERIAL_NUMBER) or as formatted strings
+    """
+    if not range_values:
+        return pd.DataFrame()
+    if not header and not typed and not date_columns:
+        return pd.DataFrame(data=range_values)
+    padded_values = pad_rows(range_values)
+
+    column_names: List[Union[str, int]] = list(range(padded_values.shape[1]))
+    if header:
+        column_names = [column_name if column_name not in (None, "") else column_n
+                        for column_n, column_name in enumerate(padded_values[0])]
+        padded_values = padded_values[1:]
+
+    if not typed and not date_columns:
+        return pd.DataFrame(data=padded_values, columns=column_names)
+
+    date_columns = set(date_columns or [])
+    columns: dict = {}
+    for column_n, column_name in enumerate(column_names):
+        is_date = column_name in date_columns or column_n in date_columns
+        if typed or is_date:
+            columns[column_n] = _convert_column(padded_values[:, column_n], is_date=is_date)
+        else:
+            columns[column_n] = padded_values[:, column_n]
+    df = pd.DataFrame(data=columns)
+    df.columns = column_names
+    return df
+
+
+def _numeric_chunk(chunk_column: np.ndarray) -> Tuple[Optional[np.ndarray], np.ndarray]:
+    """Return the chunk values as float64, empty cells as NaN, None if a value is not a number,
+    and the mask of its empty strings
+    """
+    is_empty_string = chunk_column == ""
+    is_empty = pd.isna(chunk_column) | is_empty_string
+    if is_empty.any():
+        chunk_column = np.where(is_empty, None, chunk_column)
+    if pd.api.types.infer_dtype(chunk_column, skipna=True) not in ("integer", "floating", "mixed-integer-float",
+                                                                     "empty"):
+        return None, is_empty_string
+    return np.where(is_empty, np.nan, chunk_column).astype(np.float64), is_empty_string
+
+
+def _numbers_to_objects(column_buffer: np.ndarray) -> np.ndarray:
+    """Return a float64 column buffer as objects: whole numbers as int, as the API sent them, NaN as None"""
+    object_buffer = np.full(len(column_buffer), None, dtype=object)
+    is_filled = ~np.isnan(column_buffer)
+    is_whole = is_filled & (column_buffer == np.floor(column_buffer))
+    object_buffer[is_whole] = column_buffer[is_whole].astype(np.int64).astype(object)
+    object_buffer[is_filled & ~is_whole] = column_buffer[is_filled & ~is_whole].astype(object)
+    return object_buffer
+
+
+def read_values_stream(values_stream: BinaryIO,
+                       rows_n: int = 0,
+                       header: bool = False,
+                       numeric_columns: bool = False,
+                       chunk_rows: int = STREAM_CHUNK_ROWS,
+                       ) -> Tuple[List, List[np.ndarray]]:
+    """Parse a values.get response from a file-like object into column buffers, requires ijson
+
+    The rows are parsed as they are read and copied by chunks into buffers preallocated to rows_n, grown if
+    exceeded: neither the response bytes, its decoded dict nor its list of rows are held in memory.
+
+    Args:
+        values_stream (BinaryIO): the response body, i.e.: requests Response.raw
+        rows_n (int=0): the expected number of rows, the buffers start at chunk_rows rows if 0
+        header (bool=False): return the first row apart, as the columns names
+        numeric_columns (bool=False): keep the columns holding JSON numbers only in float64 buffers rather than
+            as Python objects, i.e.: with UNFORMATTED_VALUE, a column is turned back into objects when
+            a value is not a number, its whole numbers as int
+        chunk_rows (int=STREAM_CHUNK_ROWS): the rows parsed before being copied into the buffers
+
+    Returns: (the header values, empty if not header, the column buffers padded with None or NaN)
+    """
+    import ijson
+
+    header_values: List = []
+    is_header_row: bool = header
+    column_buffers: List[np.ndarray] = []
+    buffer_rows_n: int = max(rows_n - (1 if header else 0), chunk_rows)
+    parsed_rows_n: int = 0
+    chunk: np.ndarray = np.full((chunk_rows, 1), None, dtype=object)
+    chunk_rows_n: int = 0
+    # column -> rows of the empty strings of its float64 buffer, put back if it is turned into objects
+    empty_string_rows: Dict[int, List[np.ndarray]] = {}
+
+    def flush_chunk():
+        nonlocal buffer_rows_n
+        if parsed_rows_n + chunk_rows_n > buffer_rows_n:
+            buffer_rows_n = max(buffer_rows_n * 2, parsed_rows_n + chunk_rows_n)
+            for column_n, column_buffer in enumerate(column_buffers):
+                grown_buffer = np.full(buffer_rows_n, np.nan if column_buffer.dtype == np.float64 else None,
+                                       dtype=column_buffer.dtype)
+                grown_buffer[:parsed_rows_n] = column_buffer[:parsed_rows_n]
+                column_buffers[column_n] = grown_buffer
+        while len(column_buffers) < chunk.shape[1]:
+            # a column first filled in this chunk
+            column_buffers.append(np.full(buffer_rows_n, np.nan, dtype=np.float64) if numeric_columns
+                                  else np.full(buffer_rows_n, None, dtype=object))
+        for column_n, column_buffer in enumerate(column_buffers):
+            chunk_column = chunk[:chunk_rows_n, column_n]
+            if column_buffer.dtype == np.float64:
+                numeric_values, is_empty_string = _numeric_chunk(chunk_column)
+                if numeric_values is not None:
+                    column_buffer[parsed_rows_n:parsed_rows_n + chunk_rows_n] = numeric_values
+                    if is_empty_string.any():
+                        empty_string_rows.setdefault(column_n, []).append(parsed_rows_n
+                                                                          + np.flatnonzero(is_empty_string))
+                    continue
+                column_buffer = _numbers_to_objects(column_buffer)
+                for empty_string_rows_n in empty_string_rows.pop(column_n, []):
+                    column_buffer[empty_string_rows_n] = ""
+                column_buffers[column_n] = column_buffer
+            column_buffer[parsed_rows_n:parsed_rows_n + chunk_rows_n] = chunk_column
+        chunk.fill(None)
+
+    for row_values in ijson.items(values_stream, "values.item", use_float=True):
+        if is_header_row:
+            header_values = row_values
+            is_header_row = False
+            continue
+        row_width = len(row_values)
+        if row_width > chunk.shape[1]:
+            grown_chunk = np.full((chunk_rows, row_width), None, dtype=object)
+            grown_chunk[:, :chunk.shape[1]] = chunk
+            chunk = grown_chunk
+        if row_width:
+            chunk[chunk_rows_n, :row_width] = row_values
+        chunk_rows_n += 1
+        if chunk_rows_n == chunk_rows:
+            flush_chunk()
+            parsed_rows_n += chunk_rows_n
+            chunk_rows_n = 0
+    if chunk_rows_n:
+        flush_chunk()
+        parsed_rows_n += chunk_rows_n
+
+    # columns named by the header only
+    while len(column_buffers) < len(header_values):
+        column_buffers.append(np.full(parsed_rows_n, None, dtype=object))
+    return header_values, [column_buffer[:parsed_rows_n] for column_buffer in column_buffers]
+
+
+def columns_to_dataframe(header_values: List,
+                         columns: List[np.ndarray],
+                         typed: bool = False,
+                         date_columns: Optional[List[Union[str, int]]] = None) -> pd.DataFrame:
+    """Return the column buffers of read_values_stream as a pd.DataFrame, as values_to_dataframe does
+
+    Args:
+        header_values (List): the columns names, positions are used if empty
+        columns (List[np.ndarray]): the column buffers
+        typed (bool=False): see values_to_dataframe, float64 buffers of whole numbers become int64, or Int64
+            with empty cells
+        date_columns (Optional[List[Union[str, int]]]=None): see values_to_dataframe
+    """
+    if not columns:
+        return pd.DataFrame()
+    column_names: List[Union[str, int]] = [
+        header_values[column_n] if column_n < len(header_values) and header_values[column_n] not in (None, "")
+        else column_n
+        for column_n in range(len(columns))]
+
+    date_columns = set(date_columns or [])
+    converted_columns: dict = {}
+    for column_n, (column_name, column_values) in enumerate(zip(column_names, columns)):
+        is_date = column_name in date_columns or column_n in date_columns
+        if column_values.dtype == np.float64:
+            is_empty = np.isnan(column_values)
+            if is_empty.all():
+                column_values = np.full(len(column_values), None, dtype=object)
+            elif is_date:
+                column_values = pd.to_datetime(column_values, unit="D", origin=SERIAL_NUMBER_ORIGIN).values
+            elif typed:
+                int_values = _whole_numbers_to_int(column_values, is_empty=is_empty)
+                if int_values is not None:
+                    column_values = int_values
+            else:
+                column_values = _numbers_to_objects(column_values)
+        elif typed or is_date:
+            column_values = _convert_column(column_values, is_date=is_date)
+        converted_columns[column_n] = column_values
+    df = pd.DataFrame(data=converted_columns)
+    if not header_values and not typed and not date_columns:
+        # the types pandas infers from the rows in values_to_dataframe
+        df = df.infer_objects()
+    df.columns = column_names
+    return df
+
+
+def columns_to_arrow(header_values: List, columns: List[np.ndarray]):
+    """Return the column buffers of read_values_stream as a pyarrow.Table, requires pyarrow
+
+    Object columns mixing types, i.e.: numbers and text, are converted to strings
+    """
+    import pyarrow as pa
+
+    column_names: List[str] = [
+        str(header_values[column_n]) if column_n < len(header_values) and header_values[column_n] not in (None, "")
+        else str(column_n)
+        for column_n in range(len(columns))]
+    arrays: list = []
+    for column_values in columns:
+        try:
+            arrays.append(pa.array(column_values, from_pandas=True))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            arrays.append(pa.array([None if value is None else str(value) for value in column_values],
+                                   type=pa.string()))
+    return pa.Table.from_arrays(arrays, names=column_names)
+
+
+if __name__ == '__main__':
+    values = [['Date', 'Amount', 'Paid', 'Name'],
+              [45292, 10, True, 'A'],
+              [45293, 12.5, False],
+              [45294]]
+    print(values_to_dataframe(values, header=True, typed=True, date_columns=['Date']).dtypes)
@@ -1,16 +1,25 @@
 import logging
+import time
+from contextlib import nullcontext
 from enum import Enum
 from os import environ
 from pathlib import Path
-from typing import List, Union
+from typing import (BinaryIO, Callable, List, Optional, Union)
 from google.auth.exceptions import RefreshError
 
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
+from googleapiclient.discovery import Resource
+from googleapiclient.http import HttpRequest
 
 from google_api_helpers.app_config import get_g_credentials_path
 from google_api_helpers.app_config import (logging_config)
+from google_api_helpers.g_instrumentation_helpers import (GInstrumentation, request_resource_id)
+from google_api_helpers.g_scheduler_helpers import (GRequestScheduler, PRIORITY_NORMAL, get_default_scheduler)
+from google_api_helpers.g_service_helpers import (build_service, get_resource)
+from google_api_helpers.g_transport_helpers import (GTransportPool, PooledHttp, StreamingHttp, TRANSPORTS,
+                                                    get_transport_pool)
 
 logger = logging.getLogger(f"g_auth_helpers:{Path(__file__).name}")
 
@@ -29,7 +38,21 @@ class AuthScope(Enum):
 
 class GAuthHandler:
     def __init__(self, auth_scopes: Union[List[AuthScope], None],
-                 credentials_folder_path: Union[Path, str, None] = None):
+                 credentials_folder_path: Union[Path, str, None] = None,
+                 scheduler: Optional[GRequestScheduler] = None,
+                 instrumentation: Optional[GInstrumentation] = None,
+                 transport: Union[str, GTransportPool] = "httplib2"):
+        """
+        Args:
+            scheduler (Optional[GRequestScheduler]=None): throttles and retries the requests,
+                the scheduler of the process if None
+            instrumentation (Optional[GInstrumentation]=None): receives an event per API call, nothing is measured
+                if None
+            transport (Union[str, GTransportPool]="httplib2"): "httplib2", a connection per thread and service,
+                "requests" or "httpx", a keep-alive pool shared by the handlers of the process, or a GTransportPool
+        """
+        if isinstance(transport, str) and transport not in TRANSPORTS:
+            raise ValueError(f"transport: {transport} not in {TRANSPORTS}")
         # scope
         if not auth_scopes:
             auth_scopes = [AuthScope.SpreadSheet, AuthScope.GmailReadOnly]
@@ -50,6 +73,12 @@ class GAuthHandler:
 
         self.authorized_creds = None
 
+        # quotas are per user: the handlers share the process scheduler unless given their own
+        self.scheduler: GRequestScheduler = get_default_scheduler() if scheduler is None else scheduler
+        # each API call emits a GCallEvent when set, nothing is measured otherwise
+        self.instrumentation: Optional[GInstrumentation] = instrumentation
+        self.transport: Union[str, GTransportPool] = transport
+
     def get_g_auth(self) -> bool:
         """Return True if auth to GSheet has been authorized"""
         # check if a token has already been given
@@ -87,6 +116,90 @@ class GAuthHandler:
 
         return True
 
+    def get_service(self, api_name: str, api_version: str) -> Resource:
+        """Return the api service for the authorized credentials, built once per thread and reused"""
+        if self.instrumentation is None:
+            return build_service(api_name=api_name,
+                                 api_version=api_version,
+                                 credentials=self.authorized_creds,
+                                 transport=self.transport)
+        started_at = time.perf_counter()
+        service = build_service(api_name=api_name,
+                                api_version=api_version,
+                                credentials=self.authorized_creds,
+                                transport=self.transport)
+        self.instrumentation.add_pending_phase('service', time.perf_counter() - started_at)
+        return service
+
+    def get_service_resource(self, api_name: str, api_version: str, resource_path: str) -> Resource:
+        """Return a nested resource of the api service, i.e.: 'spreadsheets.values', built once per thread"""
+        return get_resource(service=self.get_service(api_name=api_name, api_version=api_version),
+                            resource_path=resource_path)
+
+    def get_streaming_http(self, read_stream: Callable[[BinaryIO], object]) -> StreamingHttp:
+        """Return a StreamingHttp sending its requests with the handler credentials through the handler transport
+        pool, the "requests" pool of the process for httplib2 which reads whole responses
+        """
+        transport_pool = self.transport if isinstance(self.transport, GTransportPool) \
+            else get_transport_pool("httpx" if self.transport == "httpx" else "requests")
+        return StreamingHttp(pooled_http=PooledHttp(transport_pool=transport_pool, credentials=self.authorized_creds),
+                             read_stream=read_stream)
+
+    def execute_request(self, request: HttpRequest,
+                        quota_bucket: str,
+                        cost: float = 1.0,
+                        priority: int = PRIORITY_NORMAL):
+        """Execute a request through the scheduler: throttled within its quota bucket and retried on 429 and 5xx
+
+        Returns: the request response, raises HttpError once the retries are exhausted
+        """
+        if self.instrumentation is None:
+            return self.scheduler.execute(request=request, quota_bucket=quota_bucket, cost=cost, priority=priority)
+
+        call_event = self.instrumentation.new_event(method_id=request.methodId,
+                                                    resource_id=request_resource_id(request.uri),
+                                                    quota_units=cost)
+        call_event.request_bytes = len(request.body) if request.body else 0
+        creds = self.authorized_creds
+        if creds is not None and not creds.valid and creds.refresh_token:
+            # refreshed here rather than by the transport to time it
+            started_at = time.perf_counter()
+            creds.refresh(Request())
+            call_event.add_phase('auth', time.perf_counter() - started_at)
+
+        postproc = request.postproc
+
+        def timed_postproc(resp, content):
+            call_event.status = resp.status
+            call_event.response_bytes += len(content)
+            postproc_started_at = time.perf_counter()
+            try:
+                return postproc(resp, content)
+            finally:
+                call_event.add_phase('decode', time.perf_counter() - postproc_started_at)
+
+        request.postproc = timed_postproc
+        try:
+            response = self.scheduler.execute(request=request, quota_bucket=quota_bucket, cost=cost,
+                                              priority=priority, call_event=call_event)
+            call_event.succeeded = True
+            return response
+        finally:
+            if 'decode' in call_event.phases:
+                # the response is decoded within the network timing of the scheduler
+                call_event.add_phase('network', -call_event.phases['decode'])
+            self.instrumentation.emit(call_event)
+
+    def instrument_step(self, step_name: str, resource_id: Optional[str] = None):
+        """Time a local step following a call, i.e.: the DataFrame build, when the handler is instrumented
+
+            with self.instrument_step('values_to_dataframe'):
+                df = values_to_dataframe(...)
+        """
+        if self.instrumentation is None:
+            return nullcontext()
+        return self.instrumentation.time_step(step_name=step_name, resource_id=resource_id)
+
 
 if __name__ == '__main__':
     logging_config(log_file_name="g_auth_helpers.log",
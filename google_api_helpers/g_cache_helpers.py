@@ -0,0 +1,387 @@
+"""Local read-through caches stored in SQLite
+
+GReadCache, the Sheets values: an entry is keyed by (spreadsheet_id, range, value render option,
+date time render option) and is stale when:
+    - it is older than the cache ttl
+    - the spreadsheet Drive version changed since it was cached, when the handler has a Drive scope
+    - the handler wrote to or cleared its sheet
+
+GMessageStore, the Gmail messages: a message never changes once it exists, an entry is kept until evicted
+by size or deleted from the mailbox, only its labels are updated, see GMailHandler.sync_changes
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import datetime
+from email.utils import parseaddr
+from pathlib import Path
+from typing import (Optional, List, Union, Dict, Tuple, Iterable)
+
+from google_api_helpers.app_config import get_g_cache_path
+
+logger = logging.getLogger(f"g_cache_helpers:{Path(__file__).name}")
+
+# seconds an entry is served before being read again from the API
+CACHE_TTL: float = 3600.0
+# seconds a spreadsheet Drive version is trusted before being checked again
+VERSION_CHECK_INTERVAL: float = 10.0
+
+_CREATE_TABLE_SQL: str = """
+CREATE TABLE IF NOT EXISTS range_values (
+    spreadsheet_id TEXT NOT NULL,
+    sheet_range TEXT NOT NULL,
+    value_render_option TEXT NOT NULL,
+    date_time_render_option TEXT NOT NULL,
+    sheet_name TEXT NOT NULL,
+    drive_version TEXT,
+    cached_at REAL NOT NULL,
+    range_values BLOB NOT NULL,
+    PRIMARY KEY (spreadsheet_id, sheet_range, value_render_option, date_time_render_option)
+)
+"""
+_CREATE_INDEX_SQL: str = """
+CREATE INDEX IF NOT EXISTS range_values_sheet ON range_values (spreadsheet_id, sheet_name)
+"""
+
+CacheKey = Tuple[str, str, str, str]
+
+# bytes of compressed messages kept by GMessageStore before the least recently read ones are evicted
+MESSAGE_STORE_MAX_BYTES: int = 512 * 1024 * 1024
+
+_CREATE_MESSAGES_TABLE_SQL: str = """
+CREATE TABLE IF NOT EXISTS messages (
+    user_id TEXT NOT NULL,
+    msg_id TEXT NOT NULL,
+    message_format TEXT NOT NULL,
+    sender TEXT,
+    received_at REAL,
+    size_bytes INTEGER NOT NULL,
+    accessed_at REAL NOT NULL,
+    message BLOB NOT NULL,
+    PRIMARY KEY (user_id, msg_id, message_format)
+)
+"""
+_CREATE_LABELS_TABLE_SQL: str = """
+CREATE TABLE IF NOT EXISTS message_labels (
+    user_id TEXT NOT NULL,
+    msg_id TEXT NOT NULL,
+    label_id TEXT NOT NULL,
+    PRIMARY KEY (user_id, msg_id, label_id)
+)
+"""
+_CREATE_MESSAGES_INDEXES_SQL: Tuple[str, ...] = (
+    "CREATE INDEX IF NOT EXISTS messages_sender ON messages (user_id, sender)",
+    "CREATE INDEX IF NOT EXISTS messages_received_at ON messages (user_id, received_at)",
+    "CREATE INDEX IF NOT EXISTS messages_accessed_at ON messages (accessed_at)",
+    "CREATE INDEX IF NOT EXISTS message_labels_label ON message_labels (user_id, label_id)",
+)
+
+
+class GReadCache:
+    def __init__(self, cache_path: Union[Path, str, None] = None,
+                 ttl: float = CACHE_TTL,
+                 version_check_interval: float = VERSION_CHECK_INTERVAL):
+        """Cache of the values read by GSheetHandler.read_gsheet, can be shared between handlers and threads
+
+        Args:
+            cache_path (Union[Path, str, None]=None): the SQLite file, defaults to g_cache/g_read_cache.sqlite
+            ttl (float=CACHE_TTL): seconds an entry is served before being read again from the API
+            version_check_interval (float=VERSION_CHECK_INTERVAL): seconds a spreadsheet Drive version is
+                trusted before being checked again, so a dashboard refresh checks it once
+        """
+        if cache_path is None:
+            cache_path = Path(get_g_cache_path(), "g_read_cache.sqlite")
+        self.cache_path: Path = Path(cache_path)
+        self.ttl: float = ttl
+        self.version_check_interval: float = version_check_interval
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(self.cache_path), check_same_thread=False)
+        with self._connection:
+            self._connection.execute(_CREATE_TABLE_SQL)
+            self._connection.execute(_CREATE_INDEX_SQL)
+
+        # spreadsheet_id -> (Drive version, monotonic time it was checked)
+        self._drive_versions: Dict[str, Tuple[str, float]] = {}
+        self.stats: Dict[str, int] = {'hits': 0, 'misses': 0, 'stale': 0, 'version_checks': 0}
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def get(self, cache_key: CacheKey,
+            drive_version: Optional[str] = None) -> Union[List[List], None]:
+        """Return the cached values, None if missing or stale
+
+        Args:
+            cache_key (CacheKey): (spreadsheet_id, sheet_range, value_render_option, date_time_render_option)
+            drive_version (Optional[str]=None): the spreadsheet current Drive version, not checked if None
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT drive_version, cached_at, range_values FROM range_values "
+                "WHERE spreadsheet_id = ? AND sheet_range = ? AND value_render_option = ? "
+                "AND date_time_render_option = ?", cache_key).fetchone()
+            if row is None:
+                self.stats['misses'] += 1
+                return None
+            cached_version, cached_at, compressed_values = row
+            if time.time() - cached_at > self.ttl or (drive_version is not None and drive_version != cached_version):
+                self.stats['stale'] += 1
+                return None
+            self.stats['hits'] += 1
+        return json.loads(zlib.decompress(compressed_values))
+
+    def put(self, cache_key: CacheKey, sheet_name: str, range_values: List[List],
+            drive_version: Optional[str] = None):
+        compressed_values = zlib.compress(json.dumps(range_values, separators=(",", ":")).encode())
+        with self._lock, self._connection:
+            self._connection.execute("INSERT OR REPLACE INTO range_values VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                     (*cache_key, sheet_name.upper(), drive_version, time.time(),
+                                      compressed_values))
+
+    def invalidate(self, spreadsheet_id: str, sheet_name: Optional[str] = None):
+        """Drop the entries of a sheet, of the whole spreadsheet if sheet_name is None"""
+        with self._lock, self._connection:
+            if sheet_name is None:
+                self._connection.execute("DELETE FROM range_values WHERE spreadsheet_id = ?", (spreadsheet_id,))
+            else:
+                self._connection.execute("DELETE FROM range_values WHERE spreadsheet_id = ? AND sheet_name = ?",
+                                         (spreadsheet_id, sheet_name.upper()))
+            # the handler write changed the Drive version
+            self._drive_versions.pop(spreadsheet_id, None)
+
+    def clear(self):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM range_values")
+            self._drive_versions = {}
+
+    def get_checked_version(self, spreadsheet_id: str) -> Union[str, None]:
+        """Return the Drive version checked less than version_check_interval seconds ago, None otherwise"""
+        checked_version = self._drive_versions.get(spreadsheet_id)
+        if checked_version is None or time.monotonic() - checked_version[1] > self.version_check_interval:
+            return None
+        return checked_version[0]
+
+    def set_checked_version(self, spreadsheet_id: str, drive_version: str):
+        with self._lock:
+            self.stats['version_checks'] += 1
+            self._drive_versions[spreadsheet_id] = (drive_version, time.monotonic())
+
+
+def _message_sender(message: dict) -> Union[str, None]:
+    """Return the lower case email address of the From header, None without headers"""
+    headers = message.get('payload', {}).get('headers', [])
+    from_header = next((header['value'] for header in headers if header['name'].lower() == 'from'), None)
+    if from_header is None:
+        return None
+    return parseaddr(from_header)[1].lower() or from_header.lower()
+
+
+class GMessageStore:
+    def __init__(self, store_path: Union[Path, str, None] = None,
+                 max_bytes: int = MESSAGE_STORE_MAX_BYTES):
+        """Persistent store of the Gmail messages read by GMailHandler, can be shared between handlers and threads
+
+        Messages are kept as the messages.get responses, compressed, keyed by (user_id, msg_id, format):
+        a "full" message also answers the "metadata" reads. The sender, date and labels are indexed, see query.
+        user_id is the one given to the handler: use a store per mailbox when several are read as "me".
+
+        Args:
+            store_path (Union[Path, str, None]=None): the SQLite file, defaults to g_cache/g_message_store.sqlite
+            max_bytes (int=MESSAGE_STORE_MAX_BYTES): the compressed messages bytes kept, the least recently read
+                messages being evicted above it
+        """
+        if store_path is None:
+            store_path = Path(get_g_cache_path(), "g_message_store.sqlite")
+        self.store_path: Path = Path(store_path)
+        self.max_bytes: int = max_bytes
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(self.store_path), check_same_thread=False)
+        with self._connection:
+            self._connection.execute(_CREATE_MESSAGES_TABLE_SQL)
+            self._connection.execute(_CREATE_LABELS_TABLE_SQL)
+            for create_index_sql in _CREATE_MESSAGES_INDEXES_SQL:
+                self._connection.execute(create_index_sql)
+        self._size_bytes: int = self._connection.execute(
+            "SELECT COALESCE(SUM(size_bytes), 0) FROM messages").fetchone()[0]
+        self.stats: Dict[str, int] = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    @property
+    def size_bytes(self) -> int:
+        return self._size_bytes
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def get_many(self, user_id: str, msg_ids: Iterable[str], message_format: str = "full") -> Dict[str, dict]:
+        """Return the stored messages by id, the missing ones being left out
+
+        Their labelIds are the current labels, see update_labels
+        """
+        msg_ids = list(msg_ids)
+        formats = ("full", "full") if message_format == "full" else (message_format, "full")
+        messages: Dict[str, dict] = {}
+        msg_labels: Dict[str, List[str]] = {}
+        accessed_keys: List[Tuple[float, str, str, str]] = []
+        accessed_at = time.time()
+        with self._lock:
+            # below the SQLite limit of 999 variables per statement
+            for chunk_start in range(0, len(msg_ids), 500):
+                chunk_msg_ids = msg_ids[chunk_start:chunk_start + 500]
+                rows = self._connection.execute(
+                    f"SELECT msg_id, message_format, message FROM messages WHERE user_id = ? "
+                    f"AND message_format IN (?, ?) AND msg_id IN ({','.join('?' * len(chunk_msg_ids))})",
+                    (user_id, *formats, *chunk_msg_ids)).fetchall()
+                for msg_id, row_format, compressed_message in rows:
+                    # the requested format over a full one
+                    if msg_id not in messages or row_format == message_format:
+                        messages[msg_id] = compressed_message
+                        accessed_keys.append((accessed_at, user_id, msg_id, row_format))
+                for msg_id, label_id in self._connection.execute(
+                        f"SELECT msg_id, label_id FROM message_labels WHERE user_id = ? "
+                        f"AND msg_id IN ({','.join('?' * len(chunk_msg_ids))}) ORDER BY rowid",
+                        (user_id, *chunk_msg_ids)):
+                    msg_labels.setdefault(msg_id, []).append(label_id)
+            with self._connection:
+                self._connection.executemany("UPDATE messages SET accessed_at = ? "
+                                             "WHERE user_id = ? AND msg_id = ? AND message_format = ?",
+                                             accessed_keys)
+            self.stats['hits'] += len(messages)
+            self.stats['misses'] += len(msg_ids) - len(messages)
+        decompressed_messages: Dict[str, dict] = {}
+        for msg_id, compressed_message in messages.items():
+            message = json.loads(zlib.decompress(compressed_message))
+            if 'labelIds' in message or msg_id in msg_labels:
+                message['labelIds'] = msg_labels.get(msg_id, [])
+            decompressed_messages[msg_id] = message
+        return decompressed_messages
+
+    def get(self, user_id: str, msg_id: str, message_format: str = "full") -> Union[dict, None]:
+        """Return the stored message, None if missing"""
+        return self.get_many(user_id=user_id, msg_ids=[msg_id], message_format=message_format).get(msg_id)
+
+    def put_many(self, user_id: str, messages: Iterable[dict], message_format: str = "full"):
+        """Store messages.get responses of message_format, then evict the least recently read above max_bytes"""
+        rows: list = []
+        # the labels of the messages are replaced, kept for the responses without labelIds
+        labelled_keys: list = []
+        label_rows: list = []
+        stored_at = time.time()
+        for message in messages:
+            compressed_message = zlib.compress(json.dumps(message, separators=(",", ":")).encode())
+            internal_date = message.get('internalDate')
+            rows.append((user_id, message['id'], message_format, _message_sender(message),
+                         None if internal_date is None else int(internal_date) / 1000,
+                         len(compressed_message), stored_at, compressed_message))
+            if 'labelIds' in message:
+                labelled_keys.append((user_id, message['id']))
+                label_rows.extend((user_id, message['id'], label_id) for label_id in message['labelIds'])
+        if not rows:
+            return
+        with self._lock, self._connection:
+            replaced_bytes = 0
+            for row in rows:
+                replaced_row = self._connection.execute(
+                    "SELECT size_bytes FROM messages WHERE user_id = ? AND msg_id = ? AND message_format = ?",
+                    row[:3]).fetchone()
+                replaced_bytes += 0 if replaced_row is None else replaced_row[0]
+            self._connection.executemany("INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self._connection.executemany("DELETE FROM message_labels WHERE user_id = ? AND msg_id = ?",
+                                         labelled_keys)
+            self._connection.executemany("INSERT OR IGNORE INTO message_labels VALUES (?, ?, ?)", label_rows)
+            self._size_bytes += sum(row[5] for row in rows) - replaced_bytes
+            self._evict()
+
+    def put(self, user_id: str, message: dict, message_format: str = "full"):
+        self.put_many(user_id=user_id, messages=[message], message_format=message_format)
+
+    def _evict(self):
+        """Delete the least recently read messages down to 90% of max_bytes, called with the lock held"""
+        if self._size_bytes <= self.max_bytes:
+            return
+        target_bytes = self.max_bytes * 0.9
+        evicted_keys: List[Tuple[str, str, str]] = []
+        for user_id, msg_id, message_format, size_bytes in self._connection.execute(
+                "SELECT user_id, msg_id, message_format, size_bytes FROM messages ORDER BY accessed_at"):
+            if self._size_bytes <= target_bytes:
+                break
+            evicted_keys.append((user_id, msg_id, message_format))
+            self._size_bytes -= size_bytes
+        self._connection.executemany("DELETE FROM messages WHERE user_id = ? AND msg_id = ? AND message_format = ?",
+                                     evicted_keys)
+        self._connection.execute("DELETE FROM message_labels WHERE NOT EXISTS (SELECT 1 FROM messages "
+                                 "WHERE messages.user_id = message_labels.user_id "
+                                 "AND messages.msg_id = message_labels.msg_id)")
+        self.stats['evictions'] += len(evicted_keys)
+
+    def delete(self, user_id: str, msg_ids: Iterable[str]):
+        """Drop messages deleted from the mailbox, in all formats"""
+        msg_keys = [(user_id, msg_id) for msg_id in msg_ids]
+        with self._lock, self._connection:
+            for msg_key in msg_keys:
+                deleted_bytes = self._connection.execute(
+                    "SELECT COALESCE(SUM(size_bytes), 0) FROM messages WHERE user_id = ? AND msg_id = ?",
+                    msg_key).fetchone()[0]
+                self._size_bytes -= deleted_bytes
+            self._connection.executemany("DELETE FROM messages WHERE user_id = ? AND msg_id = ?", msg_keys)
+            self._connection.executemany("DELETE FROM message_labels WHERE user_id = ? AND msg_id = ?", msg_keys)
+
+    def update_labels(self, user_id: str, msg_labels: Dict[str, List[str]]):
+        """Replace the labels of stored messages, i.e.: with GMailChanges.relabelled"""
+        with self._lock, self._connection:
+            for msg_id, label_ids in msg_labels.items():
+                self._connection.execute("DELETE FROM message_labels WHERE user_id = ? AND msg_id = ?",
+                                         (user_id, msg_id))
+                self._connection.executemany(
+                    "INSERT INTO message_labels SELECT ?, ?, ? WHERE EXISTS "
+                    "(SELECT 1 FROM messages WHERE user_id = ? AND msg_id = ?)",
+                    [(user_id, msg_id, label_id, user_id, msg_id) for label_id in label_ids])
+
+    def query(self, user_id: str,
+              sender: Optional[str] = None,
+              label_id: Optional[str] = None,
+              date_from: Union[datetime, None] = None,
+              date_to: Union[datetime, None] = None,
+              limit: Optional[int] = None) -> List[str]:
+        """Return the ids of the stored messages matching all the given filters, the most recent first, offline
+
+        Args:
+            sender (Optional[str]=None): the sender email address, case-insensitive
+            label_id (Optional[str]=None): a label id, i.e.: 'INBOX', 'UNREAD'
+            date_from (Union[datetime, None]=None): received at or after it
+            date_to (Union[datetime, None]=None): received before it
+            limit (Optional[int]=None): the maximum number of ids
+        """
+        conditions: List[str] = ["messages.user_id = ?"]
+        parameters: list = [user_id]
+        if sender is not None:
+            conditions.append("messages.sender = ?")
+            parameters.append(sender.lower())
+        if label_id is not None:
+            conditions.append("EXISTS (SELECT 1 FROM message_labels WHERE message_labels.user_id = messages.user_id "
+                              "AND message_labels.msg_id = messages.msg_id AND message_labels.label_id = ?)")
+            parameters.append(label_id)
+        if date_from is not None:
+            conditions.append("messages.received_at >= ?")
+            parameters.append(date_from.timestamp())
+        if date_to is not None:
+            conditions.append("messages.received_at < ?")
+            parameters.append(date_to.timestamp())
+        sql = (f"SELECT DISTINCT messages.msg_id, messages.received_at FROM messages WHERE {' AND '.join(conditions)} "
+               f"ORDER BY messages.received_at DESC")
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        with self._lock:
+            return [msg_id for msg_id, _ in self._connection.execute(sql, parameters)]
+
+    def clear(self):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM messages")
+            self._connection.execute("DELETE FROM message_labels")
+            self._size_bytes = 0
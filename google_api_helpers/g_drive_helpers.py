@@ -0,0 +1,247 @@
+"""Drive handler: file metadata and spreadsheet exports, downloaded in chunks and parsed straight into pandas
+
+A full tab exported as CSV is smaller than its values.get JSON and is parsed by the pandas C reader,
+above EXPORT_MIN_CELLS cells it is the faster path, see benchmarks/bench_export_crossover.py
+"""
+import logging
+import tempfile
+from pathlib import Path
+from typing import (Optional, List, Union, Dict, BinaryIO)
+from urllib.parse import urlencode
+
+import pandas as pd
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
+
+from google_api_helpers.app_config import logging_config
+from google_api_helpers.g_auth_helpers import (GAuthHandler, AuthScope)
+from google_api_helpers.g_instrumentation_helpers import GInstrumentation
+from google_api_helpers.g_scheduler_helpers import GRequestScheduler
+from google_api_helpers.g_transport_helpers import GTransportPool
+
+logger = logging.getLogger(f"g_drive_helpers:{Path(__file__).name}")
+
+EXPORT_MIME_TYPES: Dict[str, str] = {
+    'csv': 'text/csv',
+    'tsv': 'text/tab-separated-values',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+# exports a single tab, files.export only exports the first tab as CSV
+SHEETS_EXPORT_URL: str = "https://docs.google.com/spreadsheets/d/{spreadsheet_id}/export"
+DOWNLOAD_CHUNK_BYTES: int = 1024 * 1024
+# exports are spooled in memory up to this size, then to a temporary file
+SPOOL_MAX_BYTES: int = 64 * 1024 * 1024
+# grid cells above which a full tab is read through a CSV export rather than values.get,
+# the crossover is between 200k and 300k cells with 0.15s values.get and 0.6s export latencies
+EXPORT_MIN_CELLS: int = 250_000
+
+
+def download_request(g_handler: GAuthHandler,
+                     request: HttpRequest,
+                     quota_bucket: str = 'drive',
+                     destination: Optional[BinaryIO] = None,
+                     chunk_bytes: int = DOWNLOAD_CHUNK_BYTES,
+                     ) -> BinaryIO:
+    """Download the response of a request chunk by chunk through the transport of g_handler, throttled, retried
+    and instrumented as its API calls
+
+    Raises HttpError once the retries are exhausted, OSError if the connection was lost
+
+    Returns: destination, or a spooled temporary file, positioned at its start
+    """
+    if destination is None:
+        destination = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+
+    def read_stream(content_stream: BinaryIO) -> BinaryIO:
+        # a retried download starts over
+        destination.seek(0)
+        destination.truncate()
+        for chunk in iter(lambda: content_stream.read(chunk_bytes), b""):
+            destination.write(chunk)
+        destination.seek(0)
+        return destination
+
+    streaming_http = g_handler.get_streaming_http(read_stream=read_stream)
+    request.http = streaming_http
+    request.postproc = lambda resp, content: streaming_http.result
+    return g_handler.execute_request(request, quota_bucket=quota_bucket)
+
+
+def stream_sheet_export(g_handler: GAuthHandler,
+                        spreadsheet_id: str,
+                        sheet_id: int,
+                        export_format: str = "csv",
+                        destination: Optional[BinaryIO] = None,
+                        chunk_bytes: int = DOWNLOAD_CHUNK_BYTES,
+                        export_url: str = SHEETS_EXPORT_URL,
+                        ) -> BinaryIO:
+    """Download the export of a tab chunk by chunk with the credentials of g_handler, see download_request
+
+    Returns: destination, or a spooled temporary file, positioned at its start
+    """
+    request = HttpRequest(http=None,
+                          postproc=None,
+                          uri=f"{export_url.format(spreadsheet_id=spreadsheet_id)}?"
+                              f"{urlencode({'format': export_format, 'gid': sheet_id})}",
+                          method="GET",
+                          methodId="sheets.export")
+    return download_request(g_handler=g_handler, request=request, destination=destination, chunk_bytes=chunk_bytes)
+
+
+def read_export(export_file: BinaryIO,
+                export_format: str = "csv",
+                header: bool = False,
+                typed: bool = False,
+                as_arrow: bool = False):
+    """Parse an exported tab into a pd.DataFrame, or a pyarrow.Table if as_arrow
+
+    Args:
+        header (bool=False): use the first row as the columns names
+        typed (bool=False): let the parser infer the columns types, all values are strings otherwise
+        as_arrow (bool=False): return a pyarrow.Table, requires pyarrow
+    """
+    if as_arrow and typed and export_format in ("csv", "tsv"):
+        # the arrow reader infers the types without building pandas objects
+        from pyarrow import csv as pa_csv
+
+        return pa_csv.read_csv(export_file,
+                               read_options=pa_csv.ReadOptions(autogenerate_column_names=not header),
+                               parse_options=pa_csv.ParseOptions(delimiter="," if export_format == "csv" else "\t"))
+
+    if export_format == "xlsx":
+        df = pd.read_excel(export_file, header=0 if header else None, dtype=None if typed else str)
+    else:
+        try:
+            df = pd.read_csv(export_file,
+                             sep="," if export_format == "csv" else "\t",
+                             header=0 if header else None,
+                             dtype=None if typed else str,
+                             keep_default_na=typed)
+        except pd.errors.EmptyDataError:
+            df = pd.DataFrame()
+    if as_arrow:
+        import pyarrow as pa
+
+        return pa.Table.from_pandas(df)
+    return df
+
+
+class GDriveHandler(GAuthHandler):
+    def __init__(self, auth_scopes: Union[List[AuthScope], None] = None,
+                 credentials_folder_path: Union[Path, str, None] = None,
+                 scheduler: Optional[GRequestScheduler] = None,
+                 instrumentation: Optional[GInstrumentation] = None,
+                 transport: Union[str, GTransportPool] = "httplib2"):
+        if not auth_scopes:
+            auth_scopes = [AuthScope.DriveReadOnly]
+        super().__init__(auth_scopes, credentials_folder_path=credentials_folder_path, scheduler=scheduler,
+                         instrumentation=instrumentation, transport=transport)
+
+        # get authorization
+        self.get_g_auth()
+
+    def _has_read_scope(self) -> bool:
+        if not any(scope.value in self.auth_scopes for scope in [AuthScope.Drive,
+                                                                 AuthScope.DriveFile,
+                                                                 AuthScope.DriveReadOnly]):
+            logger.info(f"{AuthScope.Drive.value} or {AuthScope.DriveReadOnly.value} "
+                        f"not in auth. scopes: {self.auth_scopes}")
+            return False
+        return True
+
+    def get_file_metadata(self, file_id: str,
+                          fields: str = "id,name,mimeType,modifiedTime,version,size") -> Union[Dict, None]:
+        """Return the file metadata restricted to fields"""
+        if not self._has_read_scope():
+            return None
+        try:
+            return self.execute_request(
+                self.get_service_resource(api_name='drive', api_version='v3', resource_path='files').get(
+                    fileId=file_id, fields=fields),
+                quota_bucket='drive')
+        except HttpError as err:
+            logger.info(f'HttpError handled: {err}')
+            return None
+
+    def export_file(self, file_id: str,
+                    export_format: str = "xlsx",
+                    destination: Optional[BinaryIO] = None,
+                    chunk_bytes: int = DOWNLOAD_CHUNK_BYTES,
+                    ) -> Union[BinaryIO, None]:
+        """Export a whole Google file with files.export, downloaded chunk by chunk, see download_request
+
+        Files.export is limited to 10MB and only exports the first tab of a spreadsheet as CSV:
+        use export_sheet for a single tab
+
+        Returns: destination, or a spooled temporary file, positioned at its start
+        """
+        if not self._has_read_scope():
+            return None
+        if export_format not in EXPORT_MIME_TYPES:
+            logger.info(f'export_format: {export_format} not in {list(EXPORT_MIME_TYPES)}')
+            return None
+
+        files_resource = self.get_service_resource(api_name='drive', api_version='v3', resource_path='files')
+        request = files_resource.export_media(fileId=file_id, mimeType=EXPORT_MIME_TYPES[export_format])
+        try:
+            return download_request(g_handler=self, request=request, destination=destination, chunk_bytes=chunk_bytes)
+        except HttpError as err:
+            logger.info(f'HttpError handled: {err}')
+            return None
+        except OSError as err:
+            logger.info(f'{err.__class__.__name__} handled: {err}')
+            return None
+
+    def export_sheet(self, spreadsheet_id: str,
+                     sheet_id: int,
+                     export_format: str = "csv",
+                     destination: Optional[BinaryIO] = None,
+                     chunk_bytes: int = DOWNLOAD_CHUNK_BYTES,
+                     ) -> Union[BinaryIO, None]:
+        """Export a single tab of a spreadsheet, streamed chunk by chunk
+
+        Args:
+            sheet_id (int): the tab sheetId, see GSheetHandler.get_sheet_id
+            export_format (str="csv"): "csv", "tsv" or "xlsx"
+        """
+        if not self._has_read_scope():
+            return None
+        if export_format not in EXPORT_MIME_TYPES:
+            logger.info(f'export_format: {export_format} not in {list(EXPORT_MIME_TYPES)}')
+            return None
+
+        try:
+            return stream_sheet_export(g_handler=self,
+                                       spreadsheet_id=spreadsheet_id,
+                                       sheet_id=sheet_id,
+                                       export_format=export_format,
+                                       destination=destination,
+                                       chunk_bytes=chunk_bytes)
+        except HttpError as err:
+            logger.info(f'HttpError handled: {err}')
+            return None
+        except OSError as err:
+            logger.info(f'{err.__class__.__name__} handled: {err}')
+            return None
+
+    def read_sheet_export(self, spreadsheet_id: str,
+                          sheet_id: int,
+                          export_format: str = "csv",
+                          header: bool = False,
+                          typed: bool = False,
+                          as_arrow: bool = False):
+        """Export a tab and parse it into a pd.DataFrame, or a pyarrow.Table if as_arrow"""
+        export_file = self.export_sheet(spreadsheet_id=spreadsheet_id, sheet_id=sheet_id, export_format=export_format)
+        if export_file is None:
+            return None
+        with export_file:
+            return read_export(export_file=export_file, export_format=export_format,
+                               header=header, typed=typed, as_arrow=as_arrow)
+
+
+if __name__ == '__main__':
+    logging_config(log_file_name="g_drive_helpers.log",
+                   force_local_folder=True,
+                   log_level=logging.INFO)
+    gdrive = GDriveHandler(auth_scopes=None)
+    print(gdrive.get_file_metadata(file_id=input("File id: ")))
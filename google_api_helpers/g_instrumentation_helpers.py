@@ -0,0 +1,279 @@
+"""Per call instrumentation: each API call of an instrumented handler emits a GCallEvent to the hooks
+of its GInstrumentation, i.e.: a GHistogramAggregator or a GPrometheusExporter
+
+    instrumentation = GInstrumentation()
+    histograms = GHistogramAggregator()
+    instrumentation.add_hook(histograms)
+    gsheet = GSheetHandler(auth_scopes=None, instrumentation=instrumentation)
+    gsheet.read_gsheet(sheet_name="Sheet1", sheet_range="A1:G10")
+    print(histograms.summary())
+
+The phases of a call:
+    - service: getting the discovery service, built on the first call of a thread
+    - auth: refreshing the expired credentials
+    - queue: waiting for the quota bucket tokens
+    - backoff: waiting before the retries
+    - network: sending the attempts and reading their responses
+    - decode: parsing the response JSON
+Local steps following a call, i.e.: the DataFrame build, emit their own event named 'local.<step>'.
+Handlers without instrumentation, the default, skip all of it.
+"""
+import bisect
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import (Optional, List, Dict, Tuple, Callable, Iterator)
+
+import pandas as pd
+
+logger = logging.getLogger(f"g_instrumentation_helpers:{Path(__file__).name}")
+
+PHASES: Tuple[str, ...] = ('service', 'auth', 'queue', 'backoff', 'network', 'decode')
+# upper bounds in seconds of the latency histograms buckets
+LATENCY_BUCKETS: Tuple[float, ...] = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                                      1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# the spreadsheet, user or file id of a request uri
+_RESOURCE_ID_RE = re.compile(r'/(?:spreadsheets|users|files)/([^/:?]+)')
+
+
+def request_resource_id(uri: str) -> Optional[str]:
+    """Return the spreadsheet id, Gmail user id or Drive file id of a request uri, None if it has none"""
+    match = _RESOURCE_ID_RE.search(uri)
+    return None if match is None else match.group(1)
+
+
+class GCallEvent:
+    def __init__(self, method_id: str, resource_id: Optional[str] = None, quota_units: float = 0.0):
+        """Structured record of an API call
+
+        Args:
+            method_id (str): the discovery method id, i.e.: 'sheets.spreadsheets.values.get'
+            resource_id (Optional[str]=None): the spreadsheet id or Gmail user id of the call
+            quota_units (float=0.0): the quota tokens the call costs, per attempt
+        """
+        self.method_id: str = method_id
+        self.resource_id: Optional[str] = resource_id
+        self.started_at: float = time.time()
+        # phase -> seconds, see PHASES
+        self.phases: Dict[str, float] = {}
+        self.request_bytes: int = 0
+        self.response_bytes: int = 0
+        self.retries: int = 0
+        self.quota_units: float = quota_units
+        # HTTP status of the last attempt
+        self.status: Optional[int] = None
+        self.succeeded: bool = False
+
+    def add_phase(self, phase: str, seconds: float):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    @property
+    def total_seconds(self) -> float:
+        return sum(self.phases.values())
+
+    def to_dict(self) -> dict:
+        return {'method_id': self.method_id,
+                'resource_id': self.resource_id,
+                'started_at': self.started_at,
+                'total_seconds': self.total_seconds,
+                'phases': dict(self.phases),
+                'request_bytes': self.request_bytes,
+                'response_bytes': self.response_bytes,
+                'retries': self.retries,
+                'quota_units': self.quota_units,
+                'status': self.status,
+                'succeeded': self.succeeded}
+
+    def __repr__(self):
+        phases = ", ".join(f"{phase}={seconds * 1000:.1f}ms" for phase, seconds in self.phases.items())
+        return (f"GCallEvent({self.method_id}, resource_id={self.resource_id}, status={self.status}, "
+                f"retries={self.retries}, bytes={self.request_bytes}/{self.response_bytes}, "
+                f"quota_units={self.quota_units}, {phases})")
+
+
+class GInstrumentation:
+    def __init__(self, hooks: Optional[List[Callable[[GCallEvent], None]]] = None):
+        """Dispatch the call events of the handlers it is given to, can be shared between handlers and threads
+
+        Args:
+            hooks (Optional[List[Callable[[GCallEvent], None]]]=None): called with each event, i.e.:
+                a GHistogramAggregator, a GPrometheusExporter or a logging function
+        """
+        self.hooks: List[Callable[[GCallEvent], None]] = list(hooks or [])
+        # phases measured by a thread before its next call, i.e.: the service build
+        self._pending_phases = threading.local()
+
+    def add_hook(self, hook: Callable[[GCallEvent], None]):
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook: Callable[[GCallEvent], None]):
+        self.hooks.remove(hook)
+
+    def add_pending_phase(self, phase: str, seconds: float):
+        """Add a phase to the next event created by the current thread"""
+        pending_phases = getattr(self._pending_phases, "phases", None)
+        if pending_phases is None:
+            pending_phases = {}
+            self._pending_phases.phases = pending_phases
+        pending_phases[phase] = pending_phases.get(phase, 0.0) + seconds
+
+    def new_event(self, method_id: str, resource_id: Optional[str] = None, quota_units: float = 0.0) -> GCallEvent:
+        call_event = GCallEvent(method_id=method_id, resource_id=resource_id, quota_units=quota_units)
+        pending_phases = getattr(self._pending_phases, "phases", None)
+        if pending_phases:
+            call_event.phases.update(pending_phases)
+            pending_phases.clear()
+        return call_event
+
+    def emit(self, call_event: GCallEvent):
+        for hook in self.hooks:
+            # a failing hook must not fail the call
+            try:
+                hook(call_event)
+            except Exception as ex:
+                logger.warning(f'Instrumentation hook {hook!r} failed: {ex.__class__.__name__}: {ex}')
+
+    @contextmanager
+    def time_step(self, step_name: str, resource_id: Optional[str] = None) -> Iterator[GCallEvent]:
+        """Emit an event named 'local.<step_name>' timing the block, i.e.: the DataFrame build"""
+        call_event = GCallEvent(method_id=f"local.{step_name}", resource_id=resource_id)
+        started_at = time.perf_counter()
+        try:
+            yield call_event
+            call_event.succeeded = True
+        finally:
+            call_event.add_phase(step_name, time.perf_counter() - started_at)
+            self.emit(call_event)
+
+
+class GHistogramAggregator:
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        """In memory hook: latency histograms per method and phase, and totals per method
+
+        Args:
+            buckets (Tuple[float, ...]=LATENCY_BUCKETS): the upper bounds in seconds of the histograms buckets
+        """
+        self.buckets: Tuple[float, ...] = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # (method_id, phase) -> counts per bucket, the last one counting the values above the buckets
+        self._histograms: Dict[Tuple[str, str], List[int]] = {}
+        self._sums: Dict[Tuple[str, str], float] = {}
+        # method_id -> calls, errors, retries, request_bytes, response_bytes, quota_units
+        self.totals: Dict[str, Dict[str, float]] = {}
+
+    def _observe(self, histogram_key: Tuple[str, str], seconds: float):
+        histogram = self._histograms.get(histogram_key)
+        if histogram is None:
+            histogram = [0] * (len(self.buckets) + 1)
+            self._histograms[histogram_key] = histogram
+            self._sums[histogram_key] = 0.0
+        histogram[bisect.bisect_left(self.buckets, seconds)] += 1
+        self._sums[histogram_key] += seconds
+
+    def __call__(self, call_event: GCallEvent):
+        with self._lock:
+            for phase, seconds in call_event.phases.items():
+                self._observe((call_event.method_id, phase), seconds)
+            self._observe((call_event.method_id, 'total'), call_event.total_seconds)
+
+            totals = self.totals.get(call_event.method_id)
+            if totals is None:
+                totals = {'calls': 0, 'errors': 0, 'retries': 0,
+                          'request_bytes': 0, 'response_bytes': 0, 'quota_units': 0.0}
+                self.totals[call_event.method_id] = totals
+            totals['calls'] += 1
+            totals['errors'] += 0 if call_event.succeeded else 1
+            totals['retries'] += call_event.retries
+            totals['request_bytes'] += call_event.request_bytes
+            totals['response_bytes'] += call_event.response_bytes
+            totals['quota_units'] += call_event.quota_units * (call_event.retries + 1)
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+            self._sums = {}
+            self.totals = {}
+
+    def count(self, method_id: str, phase: str = 'total') -> int:
+        return sum(self._histograms.get((method_id, phase), []))
+
+    def mean(self, method_id: str, phase: str = 'total') -> Optional[float]:
+        count = self.count(method_id=method_id, phase=phase)
+        return self._sums[(method_id, phase)] / count if count else None
+
+    def quantile(self, method_id: str, phase: str = 'total', q: float = 0.5) -> Optional[float]:
+        """Estimate the q quantile, interpolated within its bucket as Prometheus histogram_quantile does
+
+        Returns: the seconds, the highest bucket bound if the quantile is above it, None without observations
+        """
+        histogram = self._histograms.get((method_id, phase))
+        if not histogram:
+            return None
+        rank = q * sum(histogram)
+        cumulated_count = 0
+        for bucket_n, bucket_count in enumerate(histogram):
+            if bucket_count and cumulated_count + bucket_count >= rank:
+                if bucket_n == len(self.buckets):
+                    return self.buckets[-1]
+                lower_bound = self.buckets[bucket_n - 1] if bucket_n else 0.0
+                return lower_bound + (self.buckets[bucket_n] - lower_bound) * (rank - cumulated_count) / bucket_count
+            cumulated_count += bucket_count
+        return self.buckets[-1]
+
+    def summary(self) -> pd.DataFrame:
+        """Return a row per method: its totals, the total latency mean and quantiles, and the mean of each phase"""
+        with self._lock:
+            rows: List[dict] = []
+            for method_id, totals in self.totals.items():
+                row = {'method_id': method_id, **totals,
+                       'mean_seconds': self.mean(method_id=method_id),
+                       'p50_seconds': self.quantile(method_id=method_id, q=0.5),
+                       'p95_seconds': self.quantile(method_id=method_id, q=0.95),
+                       'p99_seconds': self.quantile(method_id=method_id, q=0.99)}
+                for histogram_method_id, phase in self._histograms:
+                    if histogram_method_id == method_id and phase != 'total':
+                        row[f"{phase}_mean_seconds"] = self.mean(method_id=method_id, phase=phase)
+                rows.append(row)
+        return pd.DataFrame(rows)
+
+
+class GPrometheusExporter:
+    def __init__(self, registry=None,
+                 namespace: str = "google_api_helpers",
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        """Hook updating Prometheus metrics, requires prometheus_client
+
+        Args:
+            registry: the prometheus_client CollectorRegistry, the default registry if None
+            namespace (str="google_api_helpers"): the metrics names prefix
+            buckets (Tuple[float, ...]=LATENCY_BUCKETS): the upper bounds in seconds of the histograms buckets
+        """
+        from prometheus_client import (Counter, Histogram, REGISTRY)
+
+        if registry is None:
+            registry = REGISTRY
+        self.phase_seconds = Histogram(f"{namespace}_call_phase_seconds", "Seconds spent in each phase of the calls",
+                                       ['method', 'phase'], buckets=buckets, registry=registry)
+        self.call_seconds = Histogram(f"{namespace}_call_seconds", "Seconds spent in the calls",
+                                      ['method'], buckets=buckets, registry=registry)
+        self.calls = Counter(f"{namespace}_calls", "Calls by outcome", ['method', 'outcome'], registry=registry)
+        self.retries = Counter(f"{namespace}_call_retries", "Retried attempts", ['method'], registry=registry)
+        self.transferred_bytes = Counter(f"{namespace}_call_bytes", "Request and response bytes",
+                                         ['method', 'direction'], registry=registry)
+        self.quota_units = Counter(f"{namespace}_call_quota_units", "Estimated quota units spent",
+                                   ['method'], registry=registry)
+
+    def __call__(self, call_event: GCallEvent):
+        method_id = call_event.method_id
+        for phase, seconds in call_event.phases.items():
+            self.phase_seconds.labels(method_id, phase).observe(seconds)
+        self.call_seconds.labels(method_id).observe(call_event.total_seconds)
+        self.calls.labels(method_id, "success" if call_event.succeeded else "error").inc()
+        self.retries.labels(method_id).inc(call_event.retries)
+        self.transferred_bytes.labels(method_id, "request").inc(call_event.request_bytes)
+        self.transferred_bytes.labels(method_id, "response").inc(call_event.response_bytes)
+        self.quota_units.labels(method_id).inc(call_event.quota_units * (call_event.retries + 1))
@@ -1,23 +1,49 @@
 """https://skillshats.com/blogs/send-and-read-emails-with-gmail-api/"""
 import base64
+import json
 import logging
+import time
+from concurrent.futures import (FIRST_COMPLETED, ThreadPoolExecutor, wait)
 from datetime import datetime, timedelta
+from email.utils import parsedate_to_datetime
+from itertools import islice
 from pathlib import Path
-from typing import (Optional, List, Dict)
+from typing import (Callable, Optional, List, Dict, Iterable, Iterator)
 from typing import Union
 
-from googleapiclient import discovery
+import pandas as pd
 from googleapiclient.discovery import Resource
 from googleapiclient.errors import HttpError
+from googleapiclient.http import (BatchHttpRequest, HttpRequest)
 
-from google_api_helpers.app_config import logging_config
+from google_api_helpers.app_config import (get_g_cache_path, logging_config)
 from google_api_helpers.g_auth_helpers import (GAuthHandler, AuthScope)
+from google_api_helpers.g_cache_helpers import GMessageStore
+from google_api_helpers.g_instrumentation_helpers import GInstrumentation
+from google_api_helpers.g_scheduler_helpers import (GRequestScheduler, GMAIL_QUOTA_UNITS, PRIORITY_NORMAL,
+                                                    RETRY_STATUSES, is_rate_limit_error)
+from google_api_helpers.g_service_helpers import (get_batch_uri, get_resource)
+from google_api_helpers.g_transport_helpers import GTransportPool
 
 logger = logging.getLogger(f"g_mail_helpers:{Path(__file__).name}")
 
+# https://developers.google.com/gmail/api/guides/batch: at most 100 calls per batch request
+MAX_BATCH_SIZE: int = 100
+# the largest page of messages.list and history.list
+MAX_LIST_RESULTS: int = 500
+HISTORY_TYPES: List[str] = ["messageAdded", "messageDeleted", "labelAdded", "labelRemoved"]
+# list_message_headers: the default headers, and the fields of the messages.get responses
+MESSAGE_HEADERS: List[str] = ["From", "Subject", "Date"]
+MESSAGE_HEADERS_FIELDS: str = "id,threadId,labelIds,internalDate,payload/headers"
+# RFC 2822 date of the Date header, i.e.: 'Tue, 03 Oct 2023 09:15:00 +0200'
+MAIL_DATE_FORMAT: str = "%a, %d %b %Y %H:%M:%S %z"
+
 
 class GEmail:
     def __init__(self):
+        self.msg_id: Union[None, str] = None
+        self.thread_id: Union[None, str] = None
+        self.label_ids: List[str] = []
         self.payload: Union[None, dict] = None
         self.subject: Union[None, str] = None
         self.sender: Union[None, str] = None
@@ -35,60 +61,245 @@ class GEmail:
             self.received_date = date_as_g_string
 
 
+class GMailChanges:
+    def __init__(self, history_id: Union[None, str] = None, full_resync: bool = False):
+        """Changes of a mailbox since the last sync_changes, each message id appears once
+
+        added: messages added, with their current labels for the resyncs too
+        deleted: messages deleted, including the ones added then deleted since the last sync
+        relabelled: message id -> its current labelIds, for the messages neither added nor deleted
+        full_resync: True if there was no valid checkpoint, added then holds all the listed messages
+        """
+        self.history_id: Union[None, str] = history_id
+        self.full_resync: bool = full_resync
+        self.added: List[str] = []
+        self.deleted: List[str] = []
+        self.relabelled: Dict[str, List[str]] = {}
+
+    def __repr__(self):
+        return (f"GMailChanges(history_id={self.history_id}, full_resync={self.full_resync}, added={len(self.added)}, "
+                f"deleted={len(self.deleted)}, relabelled={len(self.relabelled)})")
+
+
+def _compact_history(history_records: Iterable[dict], changes: GMailChanges):
+    """Fold history.list records, oldest first, into the added, deleted and relabelled messages of changes"""
+    added: Dict[str, None] = dict.fromkeys(changes.added)
+    deleted: Dict[str, None] = dict.fromkeys(changes.deleted)
+    relabelled: Dict[str, List[str]] = changes.relabelled
+    for history_record in history_records:
+        for message_added in history_record.get('messagesAdded', []):
+            msg_id = message_added['message']['id']
+            if msg_id not in deleted:
+                added[msg_id] = None
+        for message_deleted in history_record.get('messagesDeleted', []):
+            msg_id = message_deleted['message']['id']
+            added.pop(msg_id, None)
+            relabelled.pop(msg_id, None)
+            deleted[msg_id] = None
+        for label_change in history_record.get('labelsAdded', []) + history_record.get('labelsRemoved', []):
+            message = label_change['message']
+            if message['id'] not in added and message['id'] not in deleted:
+                # the message carries its labels after the change
+                relabelled[message['id']] = message.get('labelIds', [])
+    changes.added = list(added)
+    changes.deleted = list(deleted)
+
+
+def _date_query(date_from: Union[str, datetime, None] = None,
+                date_to: Union[str, datetime, None] = None) -> str:
+    """Return the ' after:%Y/%m/%d before:%Y/%m/%d' terms of a Gmail search query, empty without dates"""
+    if isinstance(date_from, datetime):
+        date_from = date_from.strftime("%Y/%m/%d")
+    if isinstance(date_to, datetime):
+        date_to = date_to.strftime("%Y/%m/%d")
+    after = f" after:{date_from}" if date_from else ""
+    before = f" before:{date_to}" if date_to else ""
+    return f"{after}{before}"
+
+
+def _parse_mail_date(date_as_g_string: str):
+    try:
+        received_date = pd.Timestamp(parsedate_to_datetime(date_as_g_string))
+    except (TypeError, ValueError):
+        return pd.NaT
+    # '-0000' dates are naive: their zone is unknown, UTC is assumed
+    return received_date.tz_localize("UTC") if received_date.tzinfo is None else received_date.tz_convert("UTC")
+
+
+def parse_mail_dates(dates: pd.Series) -> pd.Series:
+    """Parse the Date headers into UTC datetime64, NaT when missing or invalid
+
+    The RFC 2822 dates are parsed at once by pd.to_datetime, the few ones it misses, without weekday or seconds
+    or with obsolete zones, one by one with email.utils
+    """
+    # trailing comments such as ' (UTC)' are not part of the date
+    cleaned_dates = dates.astype(object).where(dates.notna(), None).str.replace(r"\s*\([^)]*\)\s*$", "", regex=True)
+    received_dates = pd.to_datetime(cleaned_dates, format=MAIL_DATE_FORMAT, errors="coerce", utc=True)
+    missed = received_dates.isna() & cleaned_dates.notna() & (cleaned_dates != "")
+    if missed.any():
+        received_dates[missed] = [_parse_mail_date(date_as_g_string) for date_as_g_string in cleaned_dates[missed]]
+    return received_dates
+
+
+def _parse_message(message: dict, message_format: str = "full") -> GEmail:
+    """Return the GEmail of a messages.get response, without bodies for the "metadata" format"""
+    gmail_email = GEmail()
+    gmail_email.msg_id = message.get('id')
+    gmail_email.thread_id = message.get('threadId')
+    gmail_email.label_ids = message.get('labelIds', [])
+
+    # Parse the message payload, one pass over its headers
+    gmail_email.payload = message['payload']
+    headers: Dict[str, str] = {}
+    for header in gmail_email.payload['headers']:
+        headers.setdefault(header['name'], header['value'])
+    gmail_email.subject = headers.get('Subject', '')
+    gmail_email.sender = headers.get('From', '')
+    gmail_email.set_received_date(date_as_g_string=headers.get('Date', ''))
+    if message_format == "metadata":
+        return gmail_email
+
+    # Decode the message body
+    text_body = ''
+    html_body = ''
+    if 'parts' in gmail_email.payload:
+        parts = gmail_email.payload['parts']
+        for part in parts:
+            if part['mimeType'] == 'text/plain':
+                text_body += part['body']['data']
+            if part['mimeType'] == 'text/html':
+                html_body += part['body']['data']
+        if html_body != '':
+            gmail_email.body_html = base64.urlsafe_b64decode(html_body).decode()
+    else:
+        text_body = gmail_email.payload['body']['data']
+        gmail_email.body_html = None
+
+    gmail_email.body_text = base64.urlsafe_b64decode(text_body).decode()
+
+    return gmail_email
+
+
 class GMailHandler(GAuthHandler):
     def __init__(self, auth_scopes: Union[List[AuthScope], None] = None,
                  gmail_user_id: Optional[str] = None,
-                 credentials_folder_path: Union[Path, str, None] = None):
+                 credentials_folder_path: Union[Path, str, None] = None,
+                 scheduler: Optional[GRequestScheduler] = None,
+                 instrumentation: Optional[GInstrumentation] = None,
+                 transport: Union[str, GTransportPool] = "httplib2",
+                 message_store: Optional[GMessageStore] = None):
 
-        super().__init__(auth_scopes, credentials_folder_path)
+        super().__init__(auth_scopes, credentials_folder_path, scheduler=scheduler,
+                         instrumentation=instrumentation, transport=transport)
 
         # in case of delegate user, otherwise only manage email that has had auth
         self.gmail_user_id = "me" if gmail_user_id is None else gmail_user_id
 
+        # read_message, get_message_metadata and read_messages read the stored messages first when set
+        self.message_store: Union[GMessageStore, None] = message_store
+        # a service assigned to gmail_service replaces the shared one
+        self._gmail_service: Union[Resource, None] = None
+
         # get authorization
         self.get_g_auth()
-        # if None load from .env variables
 
-        self.gmail_service: Union[Resource, None] = None
+    @property
+    def gmail_service(self) -> Resource:
+        """The gmail service, shared between handlers and built once per thread, unless one was assigned"""
+        if self._gmail_service is not None:
+            return self._gmail_service
+        return self.get_service(api_name='gmail', api_version='v1')
+
+    @gmail_service.setter
+    def gmail_service(self, gmail_service: Union[Resource, None]):
+        # None goes back to the shared service
+        self._gmail_service = gmail_service
 
     def _init_gmail_service(self):
-        if self.gmail_service is None:
-            self.gmail_service = discovery.build('gmail', 'v1', credentials=self.authorized_creds)
+        # kept for backward compatibility: the service is now built lazily by gmail_service
+        self.get_service(api_name='gmail', api_version='v1')
+
+    def _execute_gmail_request(self, request: HttpRequest, priority: int = PRIORITY_NORMAL):
+        """Execute a gmail request through the scheduler, costing the quota units of its method"""
+        # methodId is i.e.: 'gmail.users.messages.list'
+        method_name = request.methodId.removeprefix('gmail.users.')
+        return self.execute_request(request, quota_bucket='gmail',
+                                    cost=GMAIL_QUOTA_UNITS.get(method_name, 5), priority=priority)
+
+    def iter_message_ids(self, query: str = "",
+                         limit: Optional[int] = None,
+                         prefetch: bool = True,
+                         user_id: Optional[str] = None,
+                         ) -> Iterator[Dict]:
+        """Yield the messages matching a Gmail search query, {'id': str, 'threadId': str}, page by page
+
+        Pages of MAX_LIST_RESULTS messages are listed with the query, the next page being fetched in the
+        background while the current one is consumed when prefetch. Listing stops at the first HttpError.
+
+        Args:
+            query (str=""): the Gmail search query, i.e.: 'from:me after:2024/01/01', all messages if empty
+            limit (Optional[int]=None): the maximum number of messages, all if None
+            prefetch (bool=True): request the next page before yielding the messages of the current one
+            user_id (Optional[str]=None): defaults to the handler gmail_user_id
+        """
+        try:
+            yield from self._iter_message_ids(query=query, limit=limit, prefetch=prefetch, user_id=user_id)
+        except HttpError as err:
+            logger.info(f'HttpError handled: {err}')
+
+    def _iter_message_ids(self, query: str = "",
+                          limit: Optional[int] = None,
+                          prefetch: bool = True,
+                          label_ids: Optional[List[str]] = None,
+                          user_id: Optional[str] = None,
+                          ) -> Iterator[Dict]:
+        """iter_message_ids raising the HttpError of a page, for the callers that need the complete listing"""
+        if user_id is None:
+            user_id = self.gmail_user_id
+        remaining_n: Optional[int] = limit
+
+        def list_page(page_token: Optional[str]) -> dict:
+            max_results = MAX_LIST_RESULTS if remaining_n is None else min(remaining_n, MAX_LIST_RESULTS)
+            return self._execute_gmail_request(
+                get_resource(self.gmail_service, "users.messages").list(userId=user_id, q=query, labelIds=label_ids,
+                                                                        pageToken=page_token,
+                                                                        maxResults=max_results))
+
+        if remaining_n is not None and remaining_n <= 0:
+            return
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            next_page = executor.submit(list_page, None)
+            while next_page is not None:
+                page = next_page.result()
+                messages = page.get('messages', [])
+                if remaining_n is not None:
+                    messages = messages[:remaining_n]
+                    remaining_n -= len(messages)
+                page_token = page.get('nextPageToken')
+                if remaining_n is not None and remaining_n <= 0:
+                    page_token = None
+
+                next_page = executor.submit(list_page, page_token) if prefetch and page_token else None
+                yield from messages
+                if not prefetch and page_token:
+                    next_page = executor.submit(list_page, page_token)
 
     def get_message_ids(self, user_id: Optional[str] = None,
                         date_from: Union[str, datetime, None] = None,
                         date_to: Union[str, datetime, None] = None,
+                        limit: Optional[int] = None,
                         ):
         """ date_from: needs to be formatted as %Y/%m/%d, defaults to last year if None
             date_to: needs to be formatted as %Y/%m/%d
+            limit: the maximum number of messages, all if None
         """
         if date_from is None:
             date_from = (datetime.now() - timedelta(days=365)).strftime("%Y/%m/%d")
-        if user_id is None:
-            user_id = self.gmail_user_id
-        if isinstance(date_from, datetime):
-            date_from = date_from.strftime("%Y/%m/%d")
-        if isinstance(date_from, datetime):
-            date_to = date_to.strftime("%Y/%m/%d")
-
-        after = f" after:{date_from}" if date_from else ""
-        before = f" before:{date_to}" if date_to else ""
-        query: str = f"{after}{before}".strip()
+        query: str = _date_query(date_from=date_from, date_to=date_to).strip()
 
         results: list = []
         try:
-            self._init_gmail_service()
-            message_ids = self.gmail_service.users().messages().list(userId=user_id, q=query).execute()
-            if message_ids and message_ids.get("messages"):
-                results.extend(message_ids['messages'])
-
-            while 'nextPageToken' in message_ids:
-
-                page_token = message_ids['nextPageToken']
-                message_ids = self.gmail_service.users().messages().list(userId=user_id, pageToken=page_token).execute()
-                if message_ids and message_ids.get("messages"):
-                    results.extend(message_ids['messages'])
-
+            results.extend(self.iter_message_ids(query=query, limit=limit, user_id=user_id))
         except Exception as ex:
             logger.error(f'Error with google_api_helpers'
                          f' with get_message_ids {ex.__class__.__name__}'
@@ -100,9 +311,7 @@ class GMailHandler(GAuthHandler):
         if user_id is None:
             user_id = self.gmail_user_id
         try:
-            self._init_gmail_service()
-            message: dict = self.gmail_service.users().messages().get(userId=user_id, id=msg_id,
-                                                                      format='metadata').execute()
+            message = self._get_message(msg_id=msg_id, message_format='metadata', user_id=user_id)
 
             return message
         except Exception as ex:
@@ -114,38 +323,8 @@ class GMailHandler(GAuthHandler):
         if user_id is None:
             user_id = self.gmail_user_id
         try:
-            self._init_gmail_service()
-            message: dict = self.gmail_service.users().messages().get(userId=user_id, id=msg_id,
-                                                                      format='full').execute()
-            gmail_email = GEmail()
-
-            # Parse the message payload
-            gmail_email.payload = message['payload']
-            headers = gmail_email.payload['headers']
-            gmail_email.subject = next((header['value'] for header in headers if header['name'] == 'Subject'), '')
-            gmail_email.sender = next((header['value'] for header in headers if header['name'] == 'From'), '')
-            date_as_g_string = next((header['value'] for header in headers if header['name'] == 'Date'), '')
-            gmail_email.set_received_date(date_as_g_string=date_as_g_string)
-
-            # Decode the message body
-            text_body = ''
-            html_body = ''
-            if 'parts' in gmail_email.payload:
-                parts = gmail_email.payload['parts']
-                for part in parts:
-                    if part['mimeType'] == 'text/plain':
-                        text_body += part['body']['data']
-                    if part['mimeType'] == 'text/html':
-                        html_body += part['body']['data']
-                if html_body != '':
-                    gmail_email.body_html = base64.urlsafe_b64decode(html_body).decode()
-            else:
-                text_body = gmail_email.payload['body']['data']
-                gmail_email.body_html = None
-
-            gmail_email.body_text = base64.urlsafe_b64decode(text_body).decode()
-
-            return gmail_email
+            message = self._get_message(msg_id=msg_id, message_format='full', user_id=user_id)
+            return _parse_message(message=message)
 
         except HttpError as ex:
             logger.info(f'Error with google_api_helpers. '
@@ -153,42 +332,344 @@ class GMailHandler(GAuthHandler):
                         f'Error is: {ex}')
             return None
 
+    def _get_message(self, msg_id: str, message_format: str, user_id: str) -> dict:
+        """Return a messages.get response, from the message_store when it has it"""
+        if self.message_store is not None:
+            message = self.message_store.get(user_id=user_id, msg_id=msg_id, message_format=message_format)
+            if message is not None:
+                return message
+        message = self._execute_gmail_request(
+            get_resource(self.gmail_service, "users.messages").get(userId=user_id, id=msg_id, format=message_format))
+        if self.message_store is not None:
+            self.message_store.put(user_id=user_id, message=message, message_format=message_format)
+        return message
+
+    def read_messages(self, msg_ids: Iterable[Union[str, Dict]],
+                      message_format: str = "full",
+                      batch_size: int = MAX_BATCH_SIZE,
+                      max_workers: int = 1,
+                      user_id: Optional[str] = None,
+                      ) -> Iterator[GEmail]:
+        """Yield the GEmail of each message, fetched by HTTP batch requests of batch_size messages.get calls
+
+        The GEmails of a batch are yielded in the msg_ids order once it completes, the batches in completion
+        order when max_workers > 1. Sub-requests answered with a 429 or 5xx are sent again in a smaller batch
+        after the scheduler backoff, the other failed messages are logged and skipped.
+
+        Args:
+            msg_ids (Iterable[Union[str, Dict]]): message ids, or the messages returned by get_message_ids
+                or iter_message_ids
+            message_format (str="full"): "full", or "metadata" for the headers only, without bodies
+            batch_size (int=MAX_BATCH_SIZE): the calls per batch request, at most MAX_BATCH_SIZE,
+                Gmail may answer large batches of a busy mailbox with more 429s
+            max_workers (int=1): the batch requests in flight, the next ones being sent while a batch is consumed
+            user_id (Optional[str]=None): defaults to the handler gmail_user_id
+        """
+        if user_id is None:
+            user_id = self.gmail_user_id
+        yield from self._iter_message_batches(
+            msg_ids=msg_ids, batch_size=batch_size, max_workers=max_workers,
+            read_batch=lambda batch_msg_ids: [
+                _parse_message(message=message, message_format=message_format)
+                for message in self._get_message_batch(msg_ids=batch_msg_ids, message_format=message_format,
+                                                       user_id=user_id)])
+
+    def list_message_headers(self, query: str = "",
+                             headers: Optional[List[str]] = None,
+                             limit: Optional[int] = None,
+                             batch_size: int = MAX_BATCH_SIZE,
+                             max_workers: int = 1,
+                             as_arrow: bool = False,
+                             user_id: Optional[str] = None,
+                             ):
+        """Return a table of the headers of the messages matching a query, without downloading their bodies
+
+        The messages are listed by iter_message_ids then fetched by HTTP batch requests in the "metadata" format,
+        restricted to the headers and a fields mask. Each row has the columns: id, thread_id, label_ids,
+        internal_date (UTC), one column per header, None when a message lacks it, and received_date (UTC)
+        parsed from the Date header when requested.
+
+        Args:
+            query (str=""): the Gmail search query, all messages if empty
+            headers (Optional[List[str]]=None): the header names, defaults to MESSAGE_HEADERS
+            limit (Optional[int]=None): the maximum number of messages, all if None
+            batch_size (int=MAX_BATCH_SIZE): the calls per batch request, see read_messages
+            max_workers (int=1): the batch requests in flight, see read_messages
+            as_arrow (bool=False): return a pyarrow.Table, requires pyarrow
+            user_id (Optional[str]=None): defaults to the handler gmail_user_id
+
+        Returns: a pd.DataFrame, or a pyarrow.Table if as_arrow
+        """
+        if user_id is None:
+            user_id = self.gmail_user_id
+        if headers is None:
+            headers = MESSAGE_HEADERS
+        header_names: List[str] = [header.lower() for header in headers]
+
+        msg_ids: List[str] = []
+        thread_ids: List[str] = []
+        label_ids: List[List[str]] = []
+        internal_dates: List[Union[str, None]] = []
+        header_columns: List[List[Union[str, None]]] = [[] for _ in headers]
+        messages = self._iter_message_batches(
+            msg_ids=self.iter_message_ids(query=query, limit=limit, user_id=user_id),
+            batch_size=batch_size, max_workers=max_workers,
+            read_batch=lambda batch_msg_ids: self._get_message_batch(msg_ids=batch_msg_ids,
+                                                                     message_format="metadata",
+                                                                     user_id=user_id,
+                                                                     metadata_headers=headers,
+                                                                     fields=MESSAGE_HEADERS_FIELDS))
+        for message in messages:
+            msg_ids.append(message['id'])
+            thread_ids.append(message.get('threadId'))
+            label_ids.append(message.get('labelIds', []))
+            internal_dates.append(message.get('internalDate'))
+            # one pass over the headers of the message, the first of a repeated header is kept
+            message_headers: Dict[str, str] = {}
+            for header in message.get('payload', {}).get('headers', []):
+                message_headers.setdefault(header['name'].lower(), header['value'])
+            for header_name, header_values in zip(header_names, header_columns):
+                header_values.append(message_headers.get(header_name))
+
+        df = pd.DataFrame({'id': msg_ids,
+                           'thread_id': thread_ids,
+                           'label_ids': label_ids,
+                           'internal_date': pd.to_datetime(pd.to_numeric(pd.Series(internal_dates, dtype=object),
+                                                                         errors="coerce"),
+                                                           unit="ms", utc=True)})
+        for header, header_values in zip(headers, header_columns):
+            df[header] = pd.Series(header_values, dtype=object)
+        if "date" in header_names:
+            df['received_date'] = parse_mail_dates(df[headers[header_names.index("date")]])
+
+        if as_arrow:
+            import pyarrow as pa
+
+            return pa.Table.from_pandas(df, preserve_index=False)
+        return df
+
+    def _iter_message_batches(self, msg_ids: Iterable[Union[str, Dict]],
+                              batch_size: int,
+                              max_workers: int,
+                              read_batch: Callable[[List[str]], list]) -> Iterator:
+        """Yield the items read_batch returns for each batch of msg_ids, max_workers batches being in flight"""
+        batch_size = max(1, min(batch_size, MAX_BATCH_SIZE))
+        # consumed lazily: the batches start while iter_message_ids lists the next pages
+        msg_ids_iterator = (msg_id['id'] if isinstance(msg_id, dict) else msg_id for msg_id in msg_ids)
+        batches_msg_ids = iter(lambda: list(islice(msg_ids_iterator, batch_size)), [])
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            in_flight: set = set()
+            for batch_msg_ids in batches_msg_ids:
+                if len(in_flight) >= max_workers:
+                    completed, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for completed_batch in completed:
+                        yield from completed_batch.result()
+                in_flight.add(executor.submit(read_batch, batch_msg_ids))
+            while in_flight:
+                completed, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for completed_batch in completed:
+                    yield from completed_batch.result()
+
+    def _get_message_batch(self, msg_ids: List[str], message_format: str, user_id: str,
+                           metadata_headers: Optional[List[str]] = None,
+                           fields: Optional[str] = None) -> List[dict]:
+        """Fetch the messages of one HTTP batch request, retrying the failed sub-requests only
+
+        Returns: the messages.get responses in the msg_ids order, the failed messages being left out
+        """
+        # messages restricted to some headers are stored apart from the complete ones
+        store_format = message_format if metadata_headers is None else f"{message_format}:{','.join(metadata_headers)}"
+        messages: Dict[str, dict] = {}
+        if self.message_store is not None:
+            messages = self.message_store.get_many(user_id=user_id, msg_ids=msg_ids, message_format=store_format)
+        pending_msg_ids: List[str] = [msg_id for msg_id in msg_ids if msg_id not in messages]
+        fetched_msg_ids: List[str] = pending_msg_ids
+        attempt_n = 0
+        while pending_msg_ids:
+            failures: Dict[str, HttpError] = {}
+
+            def store_response(request_id: str, response: dict, exception: Optional[HttpError]):
+                if exception is None:
+                    messages[request_id] = response
+                else:
+                    failures[request_id] = exception
+
+            batch = BatchHttpRequest(callback=store_response, batch_uri=get_batch_uri(api_name='gmail',
+                                                                                       api_version='v1'))
+            for msg_id in pending_msg_ids:
+                batch.add(get_resource(self.gmail_service, "users.messages").get(userId=user_id, id=msg_id,
+                                                                                 format=message_format,
+                                                                                 metadataHeaders=metadata_headers,
+                                                                                 fields=fields),
+                          request_id=msg_id)
+
+            # each call of the batch costs its own quota units
+            waited_seconds = sum(self.scheduler.acquire(quota_bucket='gmail', cost=GMAIL_QUOTA_UNITS['messages.get'])
+                                 for _ in pending_msg_ids)
+            self.scheduler.count('requests', len(pending_msg_ids))
+            batch_status = 200
+            started_at = time.perf_counter()
+            try:
+                batch.execute()
+            except HttpError as err:
+                # the batch request itself failed
+                batch_status = err.resp.status
+                failures = {msg_id: err for msg_id in pending_msg_ids}
+            self._emit_batch_event(user_id=user_id, calls_n=len(pending_msg_ids), attempt_n=attempt_n,
+                                   waited_seconds=waited_seconds, network_seconds=time.perf_counter() - started_at,
+                                   status=batch_status, succeeded=not failures)
+
+            pending_msg_ids = []
+            for msg_id, err in failures.items():
+                if err.resp.status in RETRY_STATUSES or is_rate_limit_error(status=err.resp.status,
+                                                                            content=err.content):
+                    pending_msg_ids.append(msg_id)
+                else:
+                    self.scheduler.count('failed')
+                    logger.info(f'HttpError handled: message {msg_id}: {err}')
+            if pending_msg_ids:
+                err = failures[pending_msg_ids[0]]
+                retry_delay = self.scheduler.retry_delay(status=err.resp.status, attempt_n=attempt_n,
+                                                         retry_after=err.resp.get('retry-after'),
+                                                         content=err.content)
+                if retry_delay is None:
+                    logger.info(f'HttpError handled: {len(pending_msg_ids)} messages not read: {err}')
+                    break
+                logger.info(f'HttpError {err.resp.status} on {len(pending_msg_ids)} messages of a batch, '
+                            f'retry {attempt_n + 1} in {retry_delay:.2f}s')
+                time.sleep(retry_delay)
+                attempt_n += 1
+
+        if self.message_store is not None:
+            self.message_store.put_many(user_id=user_id,
+                                        messages=[messages[msg_id] for msg_id in fetched_msg_ids if msg_id in messages],
+                                        message_format=store_format)
+        return [messages[msg_id] for msg_id in msg_ids if msg_id in messages]
+
+    def _emit_batch_event(self, user_id: str, calls_n: int, attempt_n: int,
+                          waited_seconds: float, network_seconds: float, status: int, succeeded: bool):
+        """Emit an event per batch request attempt, as execute_request does per call"""
+        if self.instrumentation is None:
+            return
+        call_event = self.instrumentation.new_event(method_id="gmail.users.messages.get.batch",
+                                                    resource_id=user_id,
+                                                    quota_units=calls_n * GMAIL_QUOTA_UNITS['messages.get'])
+        call_event.add_phase('queue', waited_seconds)
+        call_event.add_phase('network', network_seconds)
+        call_event.retries = attempt_n
+        call_event.status = status
+        call_event.succeeded = succeeded
+        self.instrumentation.emit(call_event)
+
+    def sync_changes(self, checkpoint_path: Union[Path, str, None] = None,
+                     resync_date_from: Union[str, datetime, None] = None,
+                     label_id: Optional[str] = None,
+                     save_checkpoint: bool = True,
+                     user_id: Optional[str] = None,
+                     ) -> Union[GMailChanges, None]:
+        """Return the messages added, deleted or relabelled since the last sync, with users.history.list
+
+        The historyId of the last sync is kept in a local checkpoint file. Without it, or once Gmail has expired it,
+        usually after a week, the mailbox is listed again with get_message_ids and full_resync is set.
+        A steady-state poll costs one history.list request per 500 history records.
+
+        Args:
+            checkpoint_path (Union[Path, str, None]=None): the checkpoint file, defaults to
+                g_cache/g_mail_sync_{user_id}.json, use one file per authorized mailbox
+            resync_date_from (Union[str, datetime, None]=None): the date_from of get_message_ids on a full resync
+            label_id (Optional[str]=None): only the changes of the messages with this label, i.e.: 'INBOX'
+            save_checkpoint (bool=True): save the new historyId, otherwise save it with save_sync_checkpoint once
+                the changes are processed
+            user_id (Optional[str]=None): defaults to the handler gmail_user_id
+
+        Returns: the changes, None if an HttpError occurred, the checkpoint being left unchanged
+        """
+        if user_id is None:
+            user_id = self.gmail_user_id
+        checkpoint_path = self._sync_checkpoint_path(checkpoint_path=checkpoint_path, user_id=user_id)
+        history_id: Union[None, str] = None
+        if checkpoint_path.exists():
+            history_id = json.loads(checkpoint_path.read_text()).get('historyId')
+
+        try:
+            changes = None if history_id is None else self._list_history(start_history_id=history_id,
+                                                                         label_id=label_id, user_id=user_id)
+            if changes is None:
+                # the profile historyId is read before the listing: later changes are in the next sync
+                profile = self._execute_gmail_request(
+                    get_resource(self.gmail_service, "users").getProfile(userId=user_id))
+                changes = GMailChanges(history_id=profile['historyId'], full_resync=True)
+                list_query = _date_query(date_from=resync_date_from or (datetime.now() - timedelta(days=365)))
+                # raises on a failed page: a partial listing must not move the checkpoint past the missed messages
+                changes.added = [message['id'] for message in self._iter_message_ids(
+                    query=list_query.strip(), label_ids=None if label_id is None else [label_id], user_id=user_id)]
+        except HttpError as err:
+            logger.info(f'HttpError handled: {err}')
+            return None
+
+        if self.message_store is not None and not changes.full_resync:
+            self.message_store.delete(user_id=user_id, msg_ids=changes.deleted)
+            self.message_store.update_labels(user_id=user_id, msg_labels=changes.relabelled)
+        if save_checkpoint:
+            self.save_sync_checkpoint(history_id=changes.history_id, checkpoint_path=checkpoint_path,
+                                      user_id=user_id)
+        logger.info(f'sync_changes: {changes}')
+        return changes
+
+    def _list_history(self, start_history_id: str, label_id: Optional[str], user_id: str
+                      ) -> Union[GMailChanges, None]:
+        """Return the changes since start_history_id, None if Gmail no longer has it"""
+        changes = GMailChanges(history_id=start_history_id)
+        page_token: Optional[str] = None
+        while True:
+            try:
+                page = self._execute_gmail_request(
+                    get_resource(self.gmail_service, "users.history").list(
+                        userId=user_id, startHistoryId=start_history_id, historyTypes=HISTORY_TYPES, labelId=label_id,
+                        maxResults=MAX_LIST_RESULTS, pageToken=page_token))
+            except HttpError as err:
+                if err.resp.status == 404:
+                    logger.info(f'historyId {start_history_id} expired, full resync')
+                    return None
+                raise
+            _compact_history(history_records=page.get('history', []), changes=changes)
+            page_token = page.get('nextPageToken')
+            if page_token is None:
+                # the mailbox historyId once all the records are read
+                changes.history_id = page.get('historyId', changes.history_id)
+                return changes
+
+    def _sync_checkpoint_path(self, checkpoint_path: Union[Path, str, None], user_id: str) -> Path:
+        if checkpoint_path is None:
+            return Path(get_g_cache_path(), f"g_mail_sync_{user_id}.json")
+        return Path(checkpoint_path)
+
+    def save_sync_checkpoint(self, history_id: str,
+                             checkpoint_path: Union[Path, str, None] = None,
+                             user_id: Optional[str] = None):
+        """Save the historyId the next sync_changes starts from, i.e.: GMailChanges.history_id"""
+        if user_id is None:
+            user_id = self.gmail_user_id
+        checkpoint_path = self._sync_checkpoint_path(checkpoint_path=checkpoint_path, user_id=user_id)
+        # written aside then renamed: an interrupted write leaves the previous checkpoint
+        temporary_path = checkpoint_path.with_suffix(".tmp")
+        temporary_path.write_text(json.dumps({'historyId': history_id, 'savedAt': datetime.now().isoformat()}))
+        temporary_path.replace(checkpoint_path)
+
     def get_messages_ids_from(self, sender_email: str,
                               date_from: Union[str, datetime, None] = None,
                               date_to: Union[str, datetime, None] = None,
-                              user_id: Optional[str] = None, ) -> Union[None, List[Dict]]:
-        if user_id is None:
-            user_id = self.gmail_user_id
+                              user_id: Optional[str] = None,
+                              limit: Optional[int] = None, ) -> Union[None, List[Dict]]:
         """ date_from: needs to be formatted as %Y/%m/%d
             date_to: needs to be formatted as %Y/%m/%d
-
+            limit: the maximum number of messages, all if None
         """
-
-        if isinstance(date_from, datetime):
-            date_from = date_from.strftime("%Y/%m/%d")
-        if isinstance(date_from, datetime):
-            date_to = date_to.strftime("%Y/%m/%d")
-        after = f" after:{date_from}" if date_from else ""
-        before = f" before:{date_to}" if date_to else ""
-
-        query: str = f"from:{sender_email}{after}{before}".strip()
-        page_token = None
+        query: str = f"from:{sender_email}{_date_query(date_from=date_from, date_to=date_to)}".strip()
         results = []
         try:
-            self._init_gmail_service()
-            message_ids = self.gmail_service.users().messages().list(userId=user_id, q=query,
-                                                                     pageToken=page_token).execute()
-            if message_ids and message_ids.get("messages"):
-                results.extend(message_ids['messages'])
-
-            while 'nextPageToken' in message_ids:
-
-                page_token = message_ids['nextPageToken']
-                message_ids = self.gmail_service.users().messages().list(userId=user_id, q=query,
-                                                                         pageToken=page_token).execute()
-                if message_ids and message_ids.get("messages"):
-                    results.extend(message_ids['messages'])
-
+            results.extend(self.iter_message_ids(query=query, limit=limit, user_id=user_id))
         except HttpError as ex:
             logger.error(f'Error with google_api_helpers. '
                          f'With get_messages_ids_from: {ex.__class__.__name__}. '
@@ -199,21 +680,13 @@ class GMailHandler(GAuthHandler):
                        subject_body: Optional[str] = None,
                        date_from: Union[str, datetime, None] = None,
                        date_to: Union[str, datetime, None] = None,
-                       user_id: Optional[str] = None, ) -> Union[None, List[Dict]]:
-        if user_id is None:
-            user_id = self.gmail_user_id
+                       user_id: Optional[str] = None,
+                       limit: Optional[int] = None, ) -> Union[None, List[Dict]]:
         """ date_from: needs to be formatted as %Y/%m/%d
             date_to: needs to be formatted as %Y/%m/%d
             subject_body: whether to search subject only, body only or both is equal to None
-
+            limit: the maximum number of messages, all if None
         """
-
-        if isinstance(date_from, datetime):
-            date_from = date_from.strftime("%Y/%m/%d")
-        if isinstance(date_from, datetime):
-            date_to = date_to.strftime("%Y/%m/%d")
-        after = f" after:{date_from}" if date_from else ""
-        before = f" before:{date_to}" if date_to else ""
         if subject_body is None:
             query_in = ""
         elif subject_body.lower() == 'subject':
@@ -223,26 +696,10 @@ class GMailHandler(GAuthHandler):
         else:
             query_in = ""
 
-        query: str = f"{after}{before}{query_in}{query}".strip()
-        page_token = None
+        query: str = f"{_date_query(date_from=date_from, date_to=date_to)}{query_in}{query}".strip()
         results: list = []
-
         try:
-            self._init_gmail_service()
-            message_ids = self.gmail_service.users().messages().list(userId=user_id, q=query,
-                                                                     pageToken=page_token).execute()
-
-            if message_ids and message_ids.get("messages"):
-                results.extend(message_ids['messages'])
-
-            while 'nextPageToken' in message_ids:
-
-                page_token = message_ids['nextPageToken']
-                message_ids = self.gmail_service.users().messages().list(userId=user_id, q=query,
-                                                                         pageToken=page_token).execute()
-                if message_ids and message_ids.get("messages"):
-                    results.extend(message_ids['messages'])
-
+            results.extend(self.iter_message_ids(query=query, limit=limit, user_id=user_id))
         except Exception as ex:
             logger.error(f'Error with google_api_helpers. '
                          f'With query_messages: {ex.__class__.__name__}. '
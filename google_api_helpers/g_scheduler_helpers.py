@@ -0,0 +1,263 @@
+"""Quota-aware request scheduler: every handler request passes through a token bucket of its quota,
+waits by priority when the bucket is empty, and is retried on 429, rate limit 403 and 5xx responses with
+a jittered exponential backoff respecting Retry-After
+"""
+import heapq
+import itertools
+import json
+import logging
+import random
+import threading
+import time
+from pathlib import Path
+from typing import (Optional, Dict, Tuple, List)
+
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
+
+from google_api_helpers.g_instrumentation_helpers import GCallEvent
+
+logger = logging.getLogger(f"g_scheduler_helpers:{Path(__file__).name}")
+
+# lower runs first
+PRIORITY_HIGH: int = 0
+PRIORITY_NORMAL: int = 5
+PRIORITY_LOW: int = 10
+
+# quota bucket -> (capacity, refill per second)
+# https://developers.google.com/sheets/api/limits: 60 read and 60 write requests per minute per user
+# https://developers.google.com/gmail/api/reference/quota: 250 quota units per second per user
+# https://developers.google.com/drive/api/guides/limits: 12,000 requests per minute per user
+QUOTA_BUCKETS: Dict[str, Tuple[float, float]] = {
+    'sheets_read': (60.0, 1.0),
+    'sheets_write': (60.0, 1.0),
+    'gmail': (250.0, 250.0),
+    'drive': (200.0, 200.0),
+}
+
+# quota units of the Gmail methods used by GMailHandler, see README.md
+GMAIL_QUOTA_UNITS: Dict[str, int] = {
+    'getProfile': 1,
+    'history.list': 2,
+    'messages.get': 5,
+    'messages.list': 5,
+}
+
+RETRY_STATUSES: Tuple[int, ...] = (429, 500, 502, 503, 504)
+# reasons of the 403 answered by Gmail and Drive when a rate limit is exceeded, retried as a 429
+RATE_LIMIT_REASONS: Tuple[str, ...] = ('rateLimitExceeded', 'userRateLimitExceeded')
+
+
+def is_rate_limit_error(status: Optional[int], content: Optional[bytes]) -> bool:
+    """Return True for a 403 response whose error reason is a rate limit
+
+    Args:
+        status (Optional[int]): the response status
+        content (Optional[bytes]): the response body, {"error": {"errors": [{"reason": ...}], ...}}
+    """
+    if status != 403 or not content:
+        return False
+    try:
+        error = json.loads(content).get('error', {})
+        # errors: the reasons of the legacy error format, details: the google.rpc.ErrorInfo of the current one
+        error_items = error.get('errors', []) + error.get('details', [])
+    except (ValueError, AttributeError, TypeError):
+        return False
+    return any(isinstance(error_item, dict) and error_item.get('reason') in RATE_LIMIT_REASONS
+               for error_item in error_items)
+
+
+class TokenBucket:
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity: float = capacity
+        self.refill_per_second: float = refill_per_second
+        self.tokens: float = capacity
+        self.refilled_at: float = time.monotonic()
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """Take the tokens if available
+
+        Returns: 0.0 if the tokens were taken, otherwise the seconds to wait before they are available
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.refilled_at) * self.refill_per_second)
+        self.refilled_at = now
+        # a request costing more than the capacity waits for a full bucket
+        tokens = min(tokens, self.capacity)
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return 0.0
+        return (tokens - self.tokens) / self.refill_per_second
+
+
+class GRequestScheduler:
+    def __init__(self, quota_buckets: Optional[Dict[str, Tuple[float, float]]] = None,
+                 max_retries: int = 5,
+                 base_delay: float = 1.0,
+                 max_delay: float = 64.0):
+        """Throttle and retry the Google API requests, shared between handlers and threads
+
+        Args:
+            quota_buckets (Optional[Dict[str, Tuple[float, float]]]=None): quota bucket -> (capacity, refill per second),
+                defaults to QUOTA_BUCKETS, a bucket missing from it is not throttled
+            max_retries (int=5): the retries of a request answered with a 429, rate limit 403 or 5xx status
+            base_delay (float=1.0): the backoff of the first retry in seconds, doubled on each retry
+            max_delay (float=64.0): the maximum backoff in seconds
+        """
+        if quota_buckets is None:
+            quota_buckets = QUOTA_BUCKETS
+        self.buckets: Dict[str, TokenBucket] = {
+            bucket_name: TokenBucket(capacity=capacity, refill_per_second=refill_per_second)
+            for bucket_name, (capacity, refill_per_second) in quota_buckets.items()}
+        self.max_retries: int = max_retries
+        self.base_delay: float = base_delay
+        self.max_delay: float = max_delay
+
+        self._condition = threading.Condition()
+        self._sequence = itertools.count()
+        # waiting (priority, sequence) tickets of each bucket, the smallest one is served first
+        self._waiters: Dict[str, List[Tuple[int, int]]] = {bucket_name: [] for bucket_name in self.buckets}
+
+        self._stats_lock = threading.Lock()
+        self.stats: Dict[str, float] = {'requests': 0,
+                                        'throttled': 0,
+                                        'retries': 0,
+                                        'failed': 0,
+                                        'wait_seconds': 0.0,
+                                        'backoff_seconds': 0.0}
+
+    def count(self, stat_name: str, value: float = 1):
+        with self._stats_lock:
+            self.stats[stat_name] += value
+
+    def acquire(self, quota_bucket: str, cost: float = 1.0, priority: int = PRIORITY_NORMAL) -> float:
+        """Wait until the quota bucket has cost tokens, the waiters being served by priority
+
+        Returns: the seconds waited
+        """
+        bucket = self.buckets.get(quota_bucket)
+        if bucket is None:
+            return 0.0
+
+        started_at = time.monotonic()
+        waiters = self._waiters[quota_bucket]
+        with self._condition:
+            ticket = (priority, next(self._sequence))
+            heapq.heappush(waiters, ticket)
+            acquired = False
+            try:
+                while not acquired:
+                    if waiters[0] == ticket:
+                        wait_seconds = bucket.try_acquire(tokens=cost)
+                        if wait_seconds == 0.0:
+                            heapq.heappop(waiters)
+                            acquired = True
+                        else:
+                            self._condition.wait(timeout=wait_seconds)
+                    else:
+                        self._condition.wait()
+            finally:
+                if not acquired:
+                    # an interrupted waiter, i.e.: KeyboardInterrupt, must not block the waiters behind its ticket
+                    waiters.remove(ticket)
+                    heapq.heapify(waiters)
+                # the next waiter becomes the head of the queue
+                self._condition.notify_all()
+
+        waited_seconds = time.monotonic() - started_at
+        if waited_seconds > 0.001:
+            self.count('wait_seconds', waited_seconds)
+        return waited_seconds
+
+    def backoff_seconds(self, attempt_n: int, retry_after: Optional[str] = None) -> float:
+        """Return the seconds to wait before the retry attempt_n + 1, retry_after being the Retry-After header"""
+        if retry_after is not None:
+            try:
+                return min(float(retry_after), self.max_delay)
+            except ValueError:
+                # an HTTP date, not worth parsing: use the backoff
+                pass
+        # full jitter: spread the retries of concurrent callers
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt_n))
+
+    def retry_delay(self, status: Optional[int], attempt_n: int, retry_after: Optional[str] = None,
+                    content: Optional[bytes] = None) -> Optional[float]:
+        """Count a failed attempt
+
+        Args:
+            content (Optional[bytes]=None): the response body, a 403 is retried when its reason is a rate limit
+
+        Returns: the seconds to wait before retrying it, None if it should not be retried
+        """
+        rate_limited = status == 429 or is_rate_limit_error(status=status, content=content)
+        if rate_limited:
+            self.count('throttled')
+        if (status not in RETRY_STATUSES and not rate_limited) or attempt_n >= self.max_retries:
+            self.count('failed')
+            return None
+        backoff_seconds = self.backoff_seconds(attempt_n=attempt_n, retry_after=retry_after)
+        self.count('retries')
+        self.count('backoff_seconds', backoff_seconds)
+        return backoff_seconds
+
+    def execute(self, request: HttpRequest,
+                quota_bucket: str,
+                cost: float = 1.0,
+                priority: int = PRIORITY_NORMAL,
+                call_event: Optional[GCallEvent] = None):
+        """Execute a googleapiclient request within its quota, retrying 429, rate limit 403 and 5xx responses
+
+        Args:
+            call_event (Optional[GCallEvent]=None): filled with the queue, network and backoff phases,
+                the retries and the status when given
+
+        Returns: the request response, raises the HttpError once the retries are exhausted
+        """
+        attempt_n = 0
+        while True:
+            waited_seconds = self.acquire(quota_bucket=quota_bucket, cost=cost, priority=priority)
+            self.count('requests')
+            if call_event is None:
+                try:
+                    return request.execute()
+                except HttpError as err:
+                    retry_delay = self._retry_delay_of(request=request, err=err, attempt_n=attempt_n)
+            else:
+                call_event.add_phase('queue', waited_seconds)
+                call_event.retries = attempt_n
+                started_at = time.perf_counter()
+                try:
+                    response = request.execute()
+                    call_event.add_phase('network', time.perf_counter() - started_at)
+                    return response
+                except HttpError as err:
+                    call_event.add_phase('network', time.perf_counter() - started_at)
+                    call_event.status = err.resp.status
+                    retry_delay = self._retry_delay_of(request=request, err=err, attempt_n=attempt_n)
+                    call_event.add_phase('backoff', retry_delay)
+            time.sleep(retry_delay)
+            attempt_n += 1
+
+    def _retry_delay_of(self, request: HttpRequest, err: HttpError, attempt_n: int) -> float:
+        """Return the seconds to wait before retrying a failed request, raise its HttpError if it is not retried"""
+        retry_delay = self.retry_delay(status=err.resp.status, attempt_n=attempt_n,
+                                       retry_after=err.resp.get('retry-after'), content=err.content)
+        if retry_delay is None:
+            raise err
+        logger.info(f'HttpError {err.resp.status} on {request.methodId}, retry {attempt_n + 1} '
+                    f'in {retry_delay:.2f}s')
+        return retry_delay
+
+
+_default_scheduler: Optional[GRequestScheduler] = None
+_default_scheduler_lock = threading.Lock()
+
+
+def get_default_scheduler() -> GRequestScheduler:
+    """Return the scheduler shared by the handlers of the process, quotas being per user"""
+    global _default_scheduler
+    if _default_scheduler is None:
+        with _default_scheduler_lock:
+            if _default_scheduler is None:
+                _default_scheduler = GRequestScheduler()
+    return _default_scheduler
@@ -0,0 +1,154 @@
+"""Shared Google API service layer: each discovery service is built once and reused
+
+The discovery documents are loaded from the static copies bundled with google-api-python-client,
+so nothing is fetched over the network when a service is built.
+httplib2 transports are not thread-safe, hence services are cached per thread: one transport per thread.
+Their nested resources, i.e.: spreadsheets().values(), are cached the same way, see get_resource.
+With a pooled transport, see g_transport_helpers, the services of all the threads share one connection pool.
+"""
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import (Dict, Optional, Tuple, Union)
+
+import google_auth_httplib2
+from googleapiclient import (discovery, discovery_cache)
+from googleapiclient.discovery import Resource
+from googleapiclient.http import build_http
+
+from google_api_helpers.g_transport_helpers import (GTransportPool, PooledHttp, get_transport_pool)
+
+logger = logging.getLogger(f"g_service_helpers:{Path(__file__).name}")
+
+# parsed discovery documents, shared between threads as they are only read once loaded
+_discovery_docs: Dict[Tuple[str, str], dict] = {}
+_discovery_docs_lock = threading.Lock()
+
+# services built by the current thread, keyed by (api_name, api_version, id(credentials), api_endpoint, transport)
+_thread_services = threading.local()
+
+# api_name -> endpoint replacing the discovery rootUrl, i.e.: a local stand-in server for tests and benchmarks
+_api_endpoints: Dict[str, str] = {}
+
+
+def get_discovery_doc(api_name: str, api_version: str) -> dict:
+    """Return the parsed discovery document bundled with google-api-python-client"""
+    doc_key = (api_name, api_version)
+    discovery_doc = _discovery_docs.get(doc_key)
+    if discovery_doc is None:
+        with _discovery_docs_lock:
+            discovery_doc = _discovery_docs.get(doc_key)
+            if discovery_doc is None:
+                doc_content = discovery_cache.get_static_doc(api_name, api_version)
+                if doc_content is None:
+                    raise ValueError(f"No static discovery document for api: {api_name} {api_version}")
+                discovery_doc = json.loads(doc_content)
+                _discovery_docs[doc_key] = discovery_doc
+    return discovery_doc
+
+
+def set_api_endpoint(api_name: str, api_endpoint: Optional[str] = None):
+    """Send the requests of an api to api_endpoint, i.e.: 'http://127.0.0.1:8080/', back to Google if None"""
+    if api_endpoint is None:
+        _api_endpoints.pop(api_name, None)
+    else:
+        _api_endpoints[api_name] = api_endpoint
+
+
+def get_batch_uri(api_name: str, api_version: str) -> str:
+    """Return the HTTP batch endpoint of an api, on its api_endpoint when set
+
+    service.new_batch_http_request uses the discovery rootUrl whatever the api_endpoint of the service
+    """
+    discovery_doc = get_discovery_doc(api_name=api_name, api_version=api_version)
+    api_endpoint = _api_endpoints.get(api_name, discovery_doc['rootUrl'])
+    return f"{api_endpoint.rstrip('/')}/{discovery_doc.get('batchPath', 'batch')}"
+
+
+def _get_thread_services() -> Dict[Tuple[str, str, int, Optional[str], object], Tuple[object, Resource]]:
+    services = getattr(_thread_services, "services", None)
+    if services is None:
+        services = {}
+        _thread_services.services = services
+    return services
+
+
+def _get_thread_resources() -> Dict[Tuple[int, str], Tuple[Resource, Resource]]:
+    resources = getattr(_thread_services, "resources", None)
+    if resources is None:
+        resources = {}
+        _thread_services.resources = resources
+    return resources
+
+
+def get_resource(service: Resource, resource_path: str) -> Resource:
+    """Return the nested resource of a service, i.e.: 'spreadsheets.values' for service.spreadsheets().values(),
+    built once per thread and service
+
+    googleapiclient otherwise rebuilds the nested resource with all its methods and docstrings on every access
+    """
+    resources = _get_thread_resources()
+    resource_key = (id(service), resource_path)
+    cached_resource = resources.get(resource_key)
+    # compare identities too as an id can be reused once the service is garbage collected
+    if cached_resource is not None and cached_resource[0] is service:
+        return cached_resource[1]
+
+    parent_path, _, resource_name = resource_path.rpartition(".")
+    parent_resource = service if not parent_path else get_resource(service=service, resource_path=parent_path)
+    resource = getattr(parent_resource, discovery.fix_method_name(resource_name))()
+    resources[resource_key] = (service, resource)
+    return resource
+
+
+def build_service(api_name: str, api_version: str, credentials,
+                  transport: Union[str, GTransportPool] = "httplib2") -> Resource:
+    """Return the service for (api_name, api_version, credentials), built once per thread
+
+    Args:
+        api_name (str): the api name, i.e.: 'sheets', 'gmail'
+        api_version (str): the api version, i.e.: 'v4', 'v1'
+        credentials: the authorized credentials, i.e.: GAuthHandler.authorized_creds
+        transport (Union[str, GTransportPool]="httplib2"): "httplib2", a transport per thread,
+            "requests" or "httpx", the pool of the process, or a GTransportPool
+    """
+    services = _get_thread_services()
+    api_endpoint = _api_endpoints.get(api_name)
+    service_key = (api_name, api_version, id(credentials), api_endpoint, transport)
+    cached_service = services.get(service_key)
+    # compare identities too as an id can be reused once the credentials are garbage collected
+    if cached_service is not None and cached_service[0] is credentials:
+        return cached_service[1]
+
+    discovery_doc = get_discovery_doc(api_name=api_name, api_version=api_version)
+    client_options = None if api_endpoint is None else {'api_endpoint': api_endpoint}
+    if credentials is None:
+        # let google-api-python-client look for the default credentials, as discovery.build does
+        service = discovery.build_from_document(discovery_doc, client_options=client_options)
+    else:
+        if transport == "httplib2":
+            # build_http, as discovery.build: a socket timeout and 308 not followed as a redirect
+            http = google_auth_httplib2.AuthorizedHttp(credentials, http=build_http())
+        else:
+            transport_pool = get_transport_pool(transport) if isinstance(transport, str) else transport
+            http = PooledHttp(transport_pool=transport_pool, credentials=credentials)
+        service = discovery.build_from_document(discovery_doc, http=http, client_options=client_options)
+    logger.debug(f"Built service: {api_name} {api_version} in thread: {threading.current_thread().name}")
+
+    services[service_key] = (credentials, service)
+    return service
+
+
+def clear_service_cache():
+    """Drop the services and nested resources built by the current thread"""
+    _get_thread_services().clear()
+    _get_thread_resources().clear()
+
+
+if __name__ == '__main__':
+    from google.oauth2.credentials import Credentials
+
+    my_credentials = Credentials(token="token")
+    print(build_service(api_name="sheets", api_version="v4", credentials=my_credentials))
+    print(build_service(api_name="sheets", api_version="v4", credentials=my_credentials))
@@ -0,0 +1,352 @@
+"""Asyncio Sheets client for workloads spread over many spreadsheets
+
+    async with AsyncGSheetHandler(auth_scopes=None, max_concurrency=20) as gsheet:
+        results = await asyncio.gather(*[gsheet.read_gsheet(sheet_name="Sheet1", sheet_range="A1:G10",
+                                                            spreadsheet_id=spreadsheet_id)
+                                         for spreadsheet_id in spreadsheet_ids])
+"""
+import asyncio
+import logging
+import os
+import time
+from pathlib import Path
+from typing import (Optional, List, Union, Dict, Tuple)
+from urllib.parse import quote
+
+import httpx
+import pandas as pd
+from google.auth.transport.requests import Request
+
+from google_api_helpers.app_config import (load_env_variables,
+                                           logging_config)
+from google_api_helpers.dataframe_helpers import values_to_dataframe
+from google_api_helpers.g_auth_helpers import (GAuthHandler, AuthScope)
+from google_api_helpers.g_instrumentation_helpers import (GInstrumentation, GCallEvent)
+from google_api_helpers.g_scheduler_helpers import GRequestScheduler
+from google_api_helpers.g_sheet_helpers import (VALUE_INPUT_OPTIONS, _sheet_range_address,
+                                                _split_batch_get_ranges, _split_batch_update_data)
+from google_api_helpers.misc_helpers import build_sheet_range
+
+logger = logging.getLogger(f"g_sheet_async_helpers:{Path(__file__).name}")
+
+SHEETS_BASE_URL: str = "https://sheets.googleapis.com/v4/spreadsheets"
+# requests in flight at once for a handler
+MAX_CONCURRENCY: int = 10
+
+
+def _async_method_id(method: str, path: str) -> str:
+    """Return the discovery method id of a spreadsheets endpoint request, i.e.: 'sheets.spreadsheets.values.get'"""
+    _, _, rest = path.partition("/")
+    if path.endswith("values:batchGet"):
+        method_name = "values.batchGet"
+    elif path.endswith("values:batchUpdate"):
+        method_name = "values.batchUpdate"
+    elif rest.startswith("values/"):
+        method_name = {"GET": "values.get", "PUT": "values.update"}.get(method, f"values.{path.rpartition(':')[2]}")
+    elif path.endswith(":batchUpdate"):
+        method_name = "batchUpdate"
+    else:
+        method_name = "get"
+    return f"sheets.spreadsheets.{method_name}"
+
+
+class AsyncGSheetHandler(GAuthHandler):
+    def __init__(self, auth_scopes: Union[List[AuthScope], None],
+                 spreadsheet_id: Optional[str] = None,
+                 credentials_folder_path: Union[Path, str, None] = None,
+                 max_concurrency: int = MAX_CONCURRENCY,
+                 base_url: str = SHEETS_BASE_URL,
+                 timeout: float = 60.0,
+                 scheduler: Optional[GRequestScheduler] = None,
+                 instrumentation: Optional[GInstrumentation] = None):
+        """Sheets client on a pooled httpx.AsyncClient, using the credentials authorized by GAuthHandler
+
+        Args:
+            max_concurrency (int=MAX_CONCURRENCY): the number of requests in flight at once
+            base_url (str=SHEETS_BASE_URL): the spreadsheets endpoint, i.e.: a local server for tests
+            timeout (float=60.0): the requests timeout in seconds
+        """
+        super().__init__(auth_scopes, credentials_folder_path=credentials_folder_path, scheduler=scheduler,
+                         instrumentation=instrumentation)
+
+        # get authorization
+        self.get_g_auth()
+        # if None load from .env variables
+        if spreadsheet_id is None:
+            load_env_variables()
+            self.spreadsheet_id = os.getenv('G_SHEET_ID')
+        else:
+            self.spreadsheet_id = spreadsheet_id
+
+        self.base_url: str = base_url.rstrip("/")
+        self.max_concurrency: int = max_concurrency
+        self.timeout: float = timeout
+        self._semaphore: asyncio.Semaphore = asyncio.Semaphore(max_concurrency)
+        self._refresh_lock: asyncio.Lock = asyncio.Lock()
+        self._client: Union[httpx.AsyncClient, None] = None
+
+    async def __aenter__(self) -> "AsyncGSheetHandler":
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
+
+    async def aclose(self):
+        """Close the pooled connections"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            limits = httpx.Limits(max_connections=self.max_concurrency,
+                                  max_keepalive_connections=self.max_concurrency)
+            self._client = httpx.AsyncClient(limits=limits, timeout=self.timeout)
+        return self._client
+
+    async def _get_auth_headers(self) -> Dict[str, str]:
+        creds = self.authorized_creds
+        if creds is None:
+            return {}
+        if not creds.valid and creds.refresh_token:
+            async with self._refresh_lock:
+                # another task may have refreshed the token while this one waited
+                if not creds.valid:
+                    await asyncio.to_thread(creds.refresh, Request())
+        return {'Authorization': f'Bearer {creds.token}'}
+
+    async def _request(self, method: str, path: str,
+                       params: Union[List[Tuple[str, str]], None] = None,
+                       body: Union[dict, None] = None) -> Union[dict, None]:
+        """Send a request to the spreadsheets endpoint through the scheduler, None if it failed
+
+        429 and 5xx responses are retried with the scheduler backoff, GET requests use the read quota
+        """
+        quota_bucket = 'sheets_read' if method == "GET" else 'sheets_write'
+        call_event: Optional[GCallEvent] = None
+        if self.instrumentation is not None:
+            spreadsheet_id, _, _ = path.partition("/")
+            call_event = self.instrumentation.new_event(method_id=_async_method_id(method=method, path=path),
+                                                        resource_id=spreadsheet_id.partition(":")[0],
+                                                        quota_units=1.0)
+        attempt_n = 0
+        async with self._semaphore:
+            while True:
+                # the token buckets are shared with the synchronous handlers of the process
+                waited_seconds = await asyncio.to_thread(self.scheduler.acquire, quota_bucket)
+                self.scheduler.count('requests')
+                auth_started_at = time.perf_counter()
+                headers = await self._get_auth_headers()
+                if call_event is not None:
+                    call_event.add_phase('queue', waited_seconds)
+                    call_event.add_phase('auth', time.perf_counter() - auth_started_at)
+                    call_event.retries = attempt_n
+                network_started_at = time.perf_counter()
+                try:
+                    response = await self._get_client().request(method, f"{self.base_url}/{path}",
+                                                                 params=params, json=body, headers=headers)
+                    if call_event is not None:
+                        call_event.add_phase('network', time.perf_counter() - network_started_at)
+                        call_event.status = response.status_code
+                    response.raise_for_status()
+                    break
+                except httpx.HTTPStatusError as err:
+                    retry_delay = self.scheduler.retry_delay(status=err.response.status_code, attempt_n=attempt_n,
+                                                             retry_after=err.response.headers.get('retry-after'),
+                                                             content=err.response.content)
+                    if retry_delay is None:
+                        logger.info(f'HttpError handled: {err}')
+                        self._emit_call_event(call_event)
+                        return None
+                    if call_event is not None:
+                        call_event.add_phase('backoff', retry_delay)
+                    await asyncio.sleep(retry_delay)
+                    attempt_n += 1
+                except httpx.HTTPError as err:
+                    logger.info(f'HttpError handled: {err}')
+                    self._emit_call_event(call_event)
+                    return None
+        if call_event is None:
+            return response.json()
+
+        call_event.request_bytes = len(response.request.content)
+        call_event.response_bytes = len(response.content)
+        decode_started_at = time.perf_counter()
+        content = response.json()
+        call_event.add_phase('decode', time.perf_counter() - decode_started_at)
+        call_event.succeeded = True
+        self._emit_call_event(call_event)
+        return content
+
+    def _emit_call_event(self, call_event: Optional[GCallEvent]):
+        if call_event is not None:
+            self.instrumentation.emit(call_event)
+
+    def _has_read_scope(self) -> bool:
+        if not any(scope.value in self.auth_scopes for scope in [AuthScope.SpreadSheet, AuthScope.SpreadSheetReadOnly]):
+            logger.info(f"{AuthScope.SpreadSheet.value} or {AuthScope.SpreadSheetReadOnly.value} "
+                        f"not in auth. scopes: {self.auth_scopes}")
+            return False
+        return True
+
+    def _has_write_scope(self) -> bool:
+        if AuthScope.SpreadSheet.value not in self.auth_scopes:
+            logger.info(f"{AuthScope.SpreadSheet.value} not in auth. scopes: "
+                        f"{self.auth_scopes}")
+            return False
+        return True
+
+    async def read_gsheet(self,
+                          sheet_name: str,
+                          sheet_range: str,
+                          as_dataframe: bool = True,
+                          value_render_option: str = "FORMATTED_VALUE",
+                          header: bool = False,
+                          typed: bool = False,
+                          spreadsheet_id: Optional[str] = None,
+                          ) -> Union[List[List], pd.DataFrame, None]:
+        """Async GSheetHandler.read_gsheet, spreadsheet_id defaults to the handler one"""
+        if not self._has_read_scope():
+            return None
+
+        sheet_range_addresses = quote(f"{sheet_name}!{sheet_range}", safe="")
+        result = await self._request("GET", f"{spreadsheet_id or self.spreadsheet_id}/values/{sheet_range_addresses}",
+                                     params=[('valueRenderOption', value_render_option)])
+        if result is None:
+            return None
+
+        range_values = result.get('values', [])
+        if not as_dataframe:
+            return range_values
+        with self.instrument_step('values_to_dataframe', resource_id=spreadsheet_id or self.spreadsheet_id):
+            return values_to_dataframe(range_values=range_values, header=header, typed=typed)
+
+    async def read_gsheets_batch(self,
+                                 sheet_ranges: List[Union[str, Tuple[str, str]]],
+                                 as_dataframe: bool = True,
+                                 spreadsheet_id: Optional[str] = None,
+                                 ) -> Union[Dict[Union[str, Tuple[str, str]], Union[List[List], pd.DataFrame]], None]:
+        """Async GSheetHandler.read_gsheets_batch, the split requests being sent concurrently"""
+        if not self._has_read_scope():
+            return None
+
+        range_addresses: List[str] = [_sheet_range_address(sheet_range) for sheet_range in sheet_ranges]
+        results = await asyncio.gather(*[
+            self._request("GET", f"{spreadsheet_id or self.spreadsheet_id}/values:batchGet",
+                          params=[('ranges', range_address) for range_address in batch_range_addresses])
+            for batch_range_addresses in _split_batch_get_ranges(range_addresses=range_addresses)])
+        if any(result is None for result in results):
+            return None
+
+        value_ranges: List[dict] = [value_range for result in results for value_range in result.get('valueRanges', [])]
+        ranges_values: Dict[Union[str, Tuple[str, str]], Union[List[List], pd.DataFrame]] = {}
+        for sheet_range, value_range in zip(sheet_ranges, value_ranges):
+            range_values = value_range.get('values', [])
+            ranges_values[sheet_range] = pd.DataFrame(data=range_values) if as_dataframe else range_values
+        return ranges_values
+
+    async def update_gsheet(self,
+                            sheet_name: str,
+                            sheet_new_values: List[List],
+                            sheet_range: Optional[str] = None,
+                            sheet_start_cell: Optional[str] = None,
+                            spreadsheet_id: Optional[str] = None,
+                            ) -> int:
+        """Async GSheetHandler.update_gsheet: returns the number of cells updated"""
+        if not self._has_write_scope():
+            return -1
+
+        if sheet_range is None and sheet_start_cell is None:
+            logger.info(f'sheet_range and sheet_start_cell can not be None at the same time')
+            return -1
+        elif sheet_start_cell is not None:
+            sheet_range = build_sheet_range(range_values=sheet_new_values,
+                                            start_cell=sheet_start_cell)
+            if sheet_range is None:
+                logger.info(f'No values to write from {sheet_start_cell}')
+                return 0
+
+        sheet_range_addresses = quote(f"{sheet_name}!{sheet_range}", safe="")
+        result = await self._request("PUT", f"{spreadsheet_id or self.spreadsheet_id}/values/{sheet_range_addresses}",
+                                     params=[('valueInputOption', "USER_ENTERED")],
+                                     body={'values': sheet_new_values})
+        if result is None:
+            return 0
+        return result.get('updatedCells', 0)
+
+    async def update_gsheets_batch(self,
+                                   ranges_values: Dict[Union[str, Tuple[str, str]], List[List]],
+                                   value_input_option: str = "USER_ENTERED",
+                                   spreadsheet_id: Optional[str] = None,
+                                   ) -> Union[Dict[str, Union[int, Dict]], None]:
+        """Async GSheetHandler.update_gsheets_batch, the split requests being sent concurrently"""
+        if not self._has_write_scope():
+            return None
+        if value_input_option not in VALUE_INPUT_OPTIONS:
+            logger.info(f'value_input_option: {value_input_option} not in {VALUE_INPUT_OPTIONS}')
+            return None
+
+        data_ranges: List[Tuple[object, str, List[List]]] = []
+        for data_key, range_values in ranges_values.items():
+            if isinstance(data_key, tuple):
+                sheet_name, start_cell = data_key
+                cells_range = build_sheet_range(range_values=range_values, start_cell=start_cell)
+                if cells_range is None:
+                    # nothing to write, 0 cells updated
+                    continue
+                range_address = f"{sheet_name}!{cells_range}"
+            else:
+                range_address = data_key
+            data_ranges.append((data_key, range_address, range_values))
+
+        batches = _split_batch_update_data(data_ranges=data_ranges)
+        results = await asyncio.gather(*[
+            self._request("POST", f"{spreadsheet_id or self.spreadsheet_id}/values:batchUpdate",
+                          body={'valueInputOption': value_input_option,
+                                'data': [{'range': range_address, 'values': range_values}
+                                         for _, range_address, range_values in batch_data_ranges]})
+            for batch_data_ranges in batches])
+
+        updated_cells: Dict[Union[str, Tuple[str, str]], int] = {data_key: 0 for data_key in ranges_values}
+        for batch_data_ranges, result in zip(batches, results):
+            if result is None:
+                continue
+            for (data_key, _, _), response in zip(batch_data_ranges, result.get('responses', [])):
+                updated_cells[data_key] += response.get('updatedCells', 0)
+        return {'totalUpdatedCells': sum(updated_cells.values()),
+                'updatedCells': updated_cells}
+
+    async def clear_gsheet_range(self,
+                                 sheet_name: str,
+                                 sheet_range: Optional[str] = None,
+                                 spreadsheet_id: Optional[str] = None,
+                                 ) -> Union[str, None]:
+        """Async GSheetHandler.clear_gsheet_range: clear a range, the whole sheet if sheet_range is None"""
+        if not any(scope.value in self.auth_scopes for scope in [AuthScope.SpreadSheet,
+                                                                 AuthScope.Drive,
+                                                                 AuthScope.DriveFile]):
+            logger.info(f"{AuthScope.SpreadSheet.value} or {AuthScope.SpreadSheetReadOnly.value} "
+                        f"not in auth. scopes: {self.auth_scopes}")
+            return None
+
+        sheet_range_addresses = quote(sheet_name if sheet_range is None else f"{sheet_name}!{sheet_range}", safe="")
+        result = await self._request("POST",
+                                     f"{spreadsheet_id or self.spreadsheet_id}/values/{sheet_range_addresses}:clear",
+                                     body={})
+        if result is None:
+            return None
+        return result.get("clearedRange")
+
+
+if __name__ == '__main__':
+    logging_config(log_file_name="g_sheet_async_helpers.log",
+                   force_local_folder=True,
+                   log_level=logging.INFO)
+
+
+    async def main():
+        async with AsyncGSheetHandler(auth_scopes=None, spreadsheet_id=None) as gsheet:
+            print(await gsheet.read_gsheet(sheet_name="Sheet1", sheet_range="A1:G10"))
+
+
+    asyncio.run(main())
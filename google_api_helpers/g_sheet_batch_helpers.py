@@ -0,0 +1,248 @@
+"""Structural changes queued and sent as spreadsheets.batchUpdate requests when the batch exits
+
+    with gsheet.batch() as batch:
+        new_sheet = batch.add_sheet(sheet_name="2024-02")
+        batch.delete_sheet(sheet_name="2023-02")
+        batch.clear(sheet_name="Summary", sheet_range="A2:F100")
+    print(new_sheet.reply)
+"""
+import logging
+import random
+from pathlib import Path
+from typing import (Optional, List, Union, Dict, Tuple, TYPE_CHECKING)
+
+from googleapiclient.errors import HttpError
+
+from google_api_helpers.misc_helpers import a1_to_grid_range
+
+if TYPE_CHECKING:
+    from google_api_helpers.g_sheet_helpers import GSheetHandler
+
+logger = logging.getLogger(f"g_sheet_batch_helpers:{Path(__file__).name}")
+
+# requests sent per spreadsheets.batchUpdate call
+MAX_BATCH_REQUESTS: int = 500
+
+PASTE_TYPES: Tuple[str, ...] = ("PASTE_NORMAL", "PASTE_VALUES", "PASTE_FORMAT", "PASTE_NO_BORDERS",
+                                "PASTE_FORMULA", "PASTE_DATA_VALIDATION", "PASTE_CONDITIONAL_FORMATTING")
+
+
+class GBatchOperation:
+    """A queued operation: its request is built when the batch is sent, then reply or error are set"""
+
+    def __init__(self, operation_type: str, sheet_names: List[str], parameters: dict):
+        self.operation_type: str = operation_type
+        self.sheet_names: List[str] = sheet_names
+        self.parameters: dict = parameters
+        self.request: Union[dict, None] = None
+        # the ids of the sheets the request references, the new one for addSheet
+        self.sheet_ids: List[int] = []
+        self.reply: Union[dict, None] = None
+        self.error: Union[str, None] = None
+
+    @property
+    def succeeded(self) -> bool:
+        return self.reply is not None
+
+    def __repr__(self):
+        return (f"GBatchOperation({self.operation_type}, sheets={self.sheet_names}, "
+                f"reply={self.reply}, error={self.error})")
+
+
+class GSheetBatch:
+    """Queue addSheet, deleteSheet, clear, rename and copyPaste operations and send them in as few
+    spreadsheets.batchUpdate calls as possible, each call being applied atomically by the API
+    """
+
+    def __init__(self, gsheet_handler: "GSheetHandler", max_batch_requests: int = MAX_BATCH_REQUESTS):
+        self.gsheet_handler = gsheet_handler
+        self.max_batch_requests: int = max_batch_requests
+        self.operations: List[GBatchOperation] = []
+
+    def __enter__(self) -> "GSheetBatch":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        # an exception in the block discards the queued operations
+        if exc_type is None:
+            self.execute()
+        else:
+            logger.info(f'Batch discarded: {len(self.operations)} operations, error: {exc_val}')
+            self.operations = []
+        return False
+
+    def _queue(self, operation_type: str, sheet_names: List[str], **parameters) -> GBatchOperation:
+        operation = GBatchOperation(operation_type=operation_type, sheet_names=sheet_names, parameters=parameters)
+        self.operations.append(operation)
+        return operation
+
+    def add_sheet(self, sheet_name: str,
+                  rows_n: Optional[int] = None,
+                  columns_n: Optional[int] = None) -> GBatchOperation:
+        return self._queue("addSheet", [sheet_name], rows_n=rows_n, columns_n=columns_n)
+
+    def delete_sheet(self, sheet_name: str) -> GBatchOperation:
+        return self._queue("deleteSheet", [sheet_name])
+
+    def rename_sheet(self, sheet_name: str, new_sheet_name: str) -> GBatchOperation:
+        return self._queue("renameSheet", [sheet_name], new_sheet_name=new_sheet_name)
+
+    def clear(self, sheet_name: str, sheet_range: Optional[str] = None) -> GBatchOperation:
+        """Clear the values of a range, the whole sheet if sheet_range is None, formats are kept"""
+        return self._queue("clear", [sheet_name], sheet_range=sheet_range)
+
+    def copy_paste(self, source_sheet_name: str, source_range: str,
+                   destination_sheet_name: str, destination_range: str,
+                   paste_type: str = "PASTE_NORMAL") -> GBatchOperation:
+        """Copy a range onto another one server side, the destination being repeated to fill a larger range"""
+        return self._queue("copyPaste", [source_sheet_name, destination_sheet_name],
+                           source_range=source_range, destination_range=destination_range, paste_type=paste_type)
+
+    def cut_paste(self, source_sheet_name: str, source_range: str,
+                  destination_sheet_name: str, destination_cell: str,
+                  paste_type: str = "PASTE_NORMAL") -> GBatchOperation:
+        """Move a range server side, destination_cell being the top left cell of the destination"""
+        return self._queue("cutPaste", [source_sheet_name, destination_sheet_name],
+                           source_range=source_range, destination_cell=destination_cell, paste_type=paste_type)
+
+    def _build_requests(self, operations: List[GBatchOperation]) -> List[GBatchOperation]:
+        """Resolve the sheet names to ids, in the order of the operations, and build each request
+
+        Returns: the operations with a request, the others have their error set
+        """
+        sheets_metadata = self.gsheet_handler._load_sheets_metadata()
+        if sheets_metadata is None:
+            for operation in operations:
+                operation.error = "Spreadsheet metadata not available"
+            return []
+
+        sheet_ids: Dict[str, int] = {title: sheet_properties.get('sheetId')
+                                     for title, sheet_properties in sheets_metadata.items()}
+        used_sheet_ids = set(sheet_ids.values())
+        built_operations: List[GBatchOperation] = []
+        for operation in operations:
+            if operation.parameters.get('paste_type', "PASTE_NORMAL") not in PASTE_TYPES:
+                operation.error = f"paste_type: {operation.parameters['paste_type']} not in {PASTE_TYPES}"
+                continue
+            if operation.operation_type == "addSheet":
+                if operation.sheet_names[0].upper() in sheet_ids:
+                    operation.error = f"Sheet {operation.sheet_names[0]} already exists"
+                    continue
+                # the id is chosen here so the following operations can reference the new sheet
+                new_sheet_id = random.randint(1, 2 ** 31 - 1)
+                while new_sheet_id in used_sheet_ids:
+                    new_sheet_id = random.randint(1, 2 ** 31 - 1)
+                used_sheet_ids.add(new_sheet_id)
+                sheet_ids[operation.sheet_names[0].upper()] = new_sheet_id
+                sheet_properties: dict = {'sheetId': new_sheet_id, 'title': operation.sheet_names[0]}
+                if operation.parameters['rows_n'] or operation.parameters['columns_n']:
+                    sheet_properties['gridProperties'] = {}
+                    if operation.parameters['rows_n']:
+                        sheet_properties['gridProperties']['rowCount'] = operation.parameters['rows_n']
+                    if operation.parameters['columns_n']:
+                        sheet_properties['gridProperties']['columnCount'] = operation.parameters['columns_n']
+                operation.request = {'addSheet': {'properties': sheet_properties}}
+                operation.sheet_ids = [new_sheet_id]
+                built_operations.append(operation)
+                continue
+
+            missing_sheet_names = [sheet_name for sheet_name in operation.sheet_names
+                                   if sheet_name.upper() not in sheet_ids]
+            if missing_sheet_names:
+                operation.error = f"Sheets not found: {missing_sheet_names}"
+                continue
+            operation_sheet_ids = [sheet_ids[sheet_name.upper()] for sheet_name in operation.sheet_names]
+            operation.sheet_ids = operation_sheet_ids
+
+            if operation.operation_type == "deleteSheet":
+                operation.request = {'deleteSheet': {'sheetId': operation_sheet_ids[0]}}
+                del sheet_ids[operation.sheet_names[0].upper()]
+            elif operation.operation_type == "renameSheet":
+                operation.request = {'updateSheetProperties': {
+                    'properties': {'sheetId': operation_sheet_ids[0],
+                                   'title': operation.parameters['new_sheet_name']},
+                    'fields': 'title'}}
+                sheet_ids[operation.parameters['new_sheet_name'].upper()] = sheet_ids.pop(
+                    operation.sheet_names[0].upper())
+            elif operation.operation_type == "clear":
+                operation.request = {'updateCells': {
+                    'range': a1_to_grid_range(sheet_id=operation_sheet_ids[0],
+                                              cells_range=operation.parameters['sheet_range']),
+                    'fields': 'userEnteredValue'}}
+            elif operation.operation_type == "copyPaste":
+                operation.request = {'copyPaste': {
+                    'source': a1_to_grid_range(sheet_id=operation_sheet_ids[0],
+                                               cells_range=operation.parameters['source_range']),
+                    'destination': a1_to_grid_range(sheet_id=operation_sheet_ids[1],
+                                                    cells_range=operation.parameters['destination_range']),
+                    'pasteType': operation.parameters['paste_type']}}
+            elif operation.operation_type == "cutPaste":
+                destination_range = a1_to_grid_range(sheet_id=operation_sheet_ids[1],
+                                                      cells_range=operation.parameters['destination_cell'])
+                operation.request = {'cutPaste': {
+                    'source': a1_to_grid_range(sheet_id=operation_sheet_ids[0],
+                                               cells_range=operation.parameters['source_range']),
+                    'destination': {'sheetId': destination_range['sheetId'],
+                                    'rowIndex': destination_range.get('startRowIndex', 0),
+                                    'columnIndex': destination_range.get('startColumnIndex', 0)},
+                    'pasteType': operation.parameters['paste_type']}}
+            built_operations.append(operation)
+        return built_operations
+
+    def execute(self) -> List[GBatchOperation]:
+        """Send the queued operations, each one getting its reply or its error
+
+        Returns: the operations, in the order they were queued
+        """
+        operations, self.operations = self.operations, []
+        if not operations:
+            return operations
+        built_operations = self._build_requests(operations=operations)
+
+        sheets_resource = self.gsheet_handler._get_sheet_resource("spreadsheets")
+        # the sheets a failed call should have added: the operations of the following calls on them are not sent
+        failed_sheet_ids: set = set()
+        for batch_start in range(0, len(built_operations), self.max_batch_requests):
+            batch_operations: List[GBatchOperation] = []
+            for operation in built_operations[batch_start:batch_start + self.max_batch_requests]:
+                if failed_sheet_ids.intersection(operation.sheet_ids):
+                    operation.error = "Not sent: the addSheet of its sheet failed"
+                    continue
+                batch_operations.append(operation)
+            if not batch_operations:
+                continue
+            try:
+                response = self.gsheet_handler.execute_request(
+                    sheets_resource.batchUpdate(
+                        spreadsheetId=self.gsheet_handler.spreadsheet_id,
+                        body={'requests': [operation.request for operation in batch_operations]}),
+                    quota_bucket='sheets_write')
+            except HttpError as err:
+                # a batchUpdate call is atomic: none of its requests have been applied
+                logger.info(f'HttpError handled: {err}')
+                for operation in batch_operations:
+                    operation.error = str(err)
+                    if operation.operation_type == "addSheet":
+                        failed_sheet_ids.update(operation.sheet_ids)
+                continue
+            # replies are returned in the order of the requests, empty for requests without a reply
+            for operation, reply in zip(batch_operations, response.get('replies', [])):
+                operation.reply = reply
+
+        # keep the handler caches consistent with the changes applied
+        for operation in built_operations:
+            if not operation.succeeded:
+                continue
+            if operation.operation_type in ("deleteSheet", "clear", "copyPaste", "cutPaste"):
+                for sheet_name in operation.sheet_names:
+                    self.gsheet_handler._invalidate_sheet_caches(sheet_name)
+            if operation.operation_type == "renameSheet":
+                # the caches of the old name would be found by a sheet taking it later
+                self.gsheet_handler._invalidate_sheet_caches(operation.sheet_names[0])
+                self.gsheet_handler._invalidate_sheet_caches(operation.parameters['new_sheet_name'])
+            if operation.operation_type in ("addSheet", "deleteSheet", "renameSheet"):
+                self.gsheet_handler.invalidate_sheets_metadata()
+
+        logger.info(f'Batch executed: {sum(operation.succeeded for operation in operations)} '
+                    f'of {len(operations)} operations succeeded')
+        return operations
@@ -1,26 +1,268 @@
+import json
 import logging
 import os
+import time
+from concurrent.futures import (ThreadPoolExecutor, as_completed)
 from pathlib import Path
 from pprint import pprint
-from typing import (Optional, List, Union, Dict)
+from typing import (Optional, List, Union, Dict, Tuple, Iterator)
+from urllib.parse import quote
 
+import numpy as np
 import pandas as pd
-from googleapiclient import discovery
+from googleapiclient.discovery import Resource
 from googleapiclient.errors import HttpError
 
 from google_api_helpers.app_config import (load_env_variables,
                                            logging_config)
+from google_api_helpers.dataframe_helpers import (pad_rows, values_to_dataframe, columns_to_arrow,
+                                                  columns_to_dataframe, read_values_stream)
 from google_api_helpers.g_auth_helpers import (GAuthHandler, AuthScope)
-from google_api_helpers.misc_helpers import build_sheet_range
+from google_api_helpers.g_cache_helpers import GReadCache
+from google_api_helpers.g_drive_helpers import (EXPORT_MIN_CELLS, read_export, stream_sheet_export)
+from google_api_helpers.g_instrumentation_helpers import GInstrumentation
+from google_api_helpers.g_scheduler_helpers import (GRequestScheduler, PRIORITY_HIGH)
+from google_api_helpers.g_sheet_batch_helpers import GSheetBatch
+from google_api_helpers.g_transport_helpers import GTransportPool
+from google_api_helpers.misc_helpers import (A1Range, a2n, n2a, build_sheet_range, cells_to_a1, range_dimensions,
+                                           split_cell)
 
 logger = logging.getLogger(f"g_mail_helpers:{Path(__file__).name}")
 
+# values.batchGet sends the ranges in the url query, keep it below the url length limit
+MAX_BATCH_GET_URL_LENGTH: int = 2000
+# keep each values.batchGet response below the response size limit
+MAX_BATCH_GET_CELLS: int = 1_000_000
+# Google recommends a maximum payload of 2MB per request
+MAX_BATCH_UPDATE_BYTES: int = 2_000_000
+
+# seconds the sheets titles, ids and grid sizes are kept before being fetched again
+METADATA_TTL: float = 300.0
+
+VALUE_INPUT_OPTIONS: Tuple[str, str] = ("RAW", "USER_ENTERED")
+WRITE_MODES: Tuple[str, str] = ("overwrite", "append")
+# rows sampled to estimate the payload bytes per row of a DataFrame
+PAYLOAD_SAMPLE_ROWS: int = 100
+
+
+def _sheet_range_address(sheet_range: Union[str, Tuple[str, str]]) -> str:
+    """Return the A1 address of a 'sheet_name!range' string or of a (sheet_name, range) tuple"""
+    if isinstance(sheet_range, tuple):
+        sheet_name, cells_range = sheet_range
+        return f"{sheet_name}!{cells_range}" if cells_range else f"{sheet_name}"
+    return sheet_range
+
+
+def _split_sheet_range_address(sheet_range: Union[str, Tuple[str, str]]) -> Tuple[str, str]:
+    """Return the (sheet_name, range) of a 'sheet_name!range' string or of a (sheet_name, range) tuple"""
+    if isinstance(sheet_range, tuple):
+        return sheet_range
+    sheet_name, _, cells_range = sheet_range.rpartition("!")
+    return sheet_name.strip("'"), cells_range
+
+
+def _split_batch_get_ranges(range_addresses: List[str],
+                            max_url_length: int = MAX_BATCH_GET_URL_LENGTH,
+                            max_cells: int = MAX_BATCH_GET_CELLS) -> List[List[str]]:
+    """Split the range addresses into values.batchGet requests within the url and response size limits
+
+    Open-ended ranges, i.e.: 'A:Z', can not be sized and only count toward the url length
+    """
+    batches: List[List[str]] = []
+    batch: List[str] = []
+    batch_url_length: int = 0
+    batch_cells: int = 0
+    for range_address in range_addresses:
+        range_url_length = len("&ranges=") + len(quote(range_address, safe=""))
+        rows_n, columns_n = range_dimensions(range_address)
+        range_cells = rows_n * columns_n if rows_n and columns_n else 0
+
+        if batch and (batch_url_length + range_url_length > max_url_length
+                      or batch_cells + range_cells > max_cells):
+            batches.append(batch)
+            batch, batch_url_length, batch_cells = [], 0, 0
+        batch.append(range_address)
+        batch_url_length += range_url_length
+        batch_cells += range_cells
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def _split_batch_update_data(data_ranges: List[Tuple[object, str, List[List]]],
+                             max_bytes: int = MAX_BATCH_UPDATE_BYTES) -> List[List[Tuple[object, str, List[List]]]]:
+    """Split (key, range_address, values) blocks into values.batchUpdate requests within the payload limit
+
+    A block over the limit on its own is split by rows, each part being written from its own start cell
+    """
+    batches: List[List[Tuple[object, str, List[List]]]] = []
+    batch: List[Tuple[object, str, List[List]]] = []
+    batch_bytes: int = 0
+    for data_key, range_address, range_values in data_ranges:
+        range_bytes = len(json.dumps(range_values))
+        data_parts = [(data_key, range_address, range_values, range_bytes)]
+        if range_bytes > max_bytes and len(range_values) > 1:
+            parts_n = -(-range_bytes // max_bytes)
+            part_rows_n = -(-len(range_values) // parts_n)
+            sheet_name, _, cells = range_address.rpartition("!")
+            start_letters, start_row = split_cell(cells.partition(":")[0])
+            sheet_prefix = f"{sheet_name}!" if sheet_name else ""
+            data_parts = []
+            for part_start in range(0, len(range_values), part_rows_n):
+                part_values = range_values[part_start:part_start + part_rows_n]
+                data_parts.append((data_key,
+                                   f"{sheet_prefix}{start_letters}{start_row + part_start}",
+                                   part_values,
+                                   len(json.dumps(part_values))))
+
+        for part_key, part_address, part_values, part_bytes in data_parts:
+            if batch and batch_bytes + part_bytes > max_bytes:
+                batches.append(batch)
+                batch, batch_bytes = [], 0
+            batch.append((part_key, part_address, part_values))
+            batch_bytes += part_bytes
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+class GWriteReport:
+    """Outcome of GSheetHandler.write_dataframe
+
+    When not completed, the write resumes with:
+        write_dataframe(..., start_cell=report.next_start_cell, mode="overwrite",
+                        header=False, start_row_n=report.next_row_n)
+    next_start_cell is None when nothing was written: the write has to be started again
+    """
+
+    def __init__(self):
+        self.completed: bool = False
+        self.rows_written: int = 0
+        self.cells_updated: int = 0
+        self.chunks_n: int = 0
+        self.failed_chunks_n: int = 0
+        self.elapsed_seconds: float = 0.0
+        # DataFrame position and sheet cell of the first row not written after the last successful chunk
+        self.next_row_n: int = 0
+        self.next_start_cell: Union[str, None] = None
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows_written / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+    def __repr__(self):
+        return (f"GWriteReport(completed={self.completed}, rows_written={self.rows_written}, "
+                f"cells_updated={self.cells_updated}, chunks_n={self.chunks_n}, "
+                f"failed_chunks_n={self.failed_chunks_n}, rows_per_second={self.rows_per_second:.1f}, "
+                f"next_row_n={self.next_row_n}, next_start_cell={self.next_start_cell})")
+
+
+def _dataframe_to_values(df: pd.DataFrame) -> List[List]:
+    """Return the DataFrame rows as JSON serializable lists, missing values as empty cells"""
+    datetime_columns = df.select_dtypes(include=['datetime', 'datetimetz']).columns
+    if len(datetime_columns):
+        df = df.copy()
+        for column in datetime_columns:
+            df[column] = df[column].dt.strftime("%Y-%m-%d %H:%M:%S")
+    return df.astype(object).where(df.notna(), "").values.tolist()
+
+
+def _estimate_chunk_rows(df: pd.DataFrame, max_bytes: int = MAX_BATCH_UPDATE_BYTES) -> int:
+    """Return the number of rows per request keeping the payload under max_bytes, from a sample of rows"""
+    sample_values = _dataframe_to_values(df.iloc[:PAYLOAD_SAMPLE_ROWS])
+    if not sample_values:
+        return 1
+    row_bytes = len(json.dumps(sample_values)) / len(sample_values)
+    # keep a margin for rows larger than the sampled ones
+    return max(1, int(max_bytes * 0.8 / row_bytes))
+
+
+def _infer_chunk_dtypes(chunk: pd.DataFrame) -> Dict[object, str]:
+    """Return 'float64' for the columns whose non-empty values are all numeric, 'object' otherwise"""
+    chunk_dtypes: Dict[object, str] = {}
+    for column_n, column in enumerate(chunk.columns):
+        column_values = chunk.iloc[:, column_n]
+        not_empty = column_values.notna() & (column_values != "")
+        numeric_values = pd.to_numeric(column_values[not_empty], errors='coerce')
+        is_numeric = bool(not_empty.any()) and bool(numeric_values.notna().all())
+        chunk_dtypes[column] = 'float64' if is_numeric else 'object'
+    return chunk_dtypes
+
+
+def _cast_chunk(chunk: pd.DataFrame, chunk_dtypes: Dict[object, str]) -> pd.DataFrame:
+    """Cast the chunk columns to the given dtypes, empty values of the numeric columns become NaN
+
+    The non-empty values of a numeric column that can not be parsed become NaN too, and are logged,
+    so that all the chunks have the same dtypes
+    """
+    for column_n, (column, chunk_dtype) in enumerate(chunk_dtypes.items()):
+        column_values = chunk.iloc[:, column_n]
+        if chunk_dtype == 'float64':
+            numeric_values = pd.to_numeric(column_values, errors='coerce')
+            not_parsed = numeric_values.isna() & column_values.notna() & (column_values != "")
+            if not_parsed.any():
+                logger.info(f'{int(not_parsed.sum())} values of numeric column {column} set to NaN, '
+                            f'i.e.: {column_values[not_parsed].iloc[0]}')
+            chunk.isetitem(column_n, numeric_values.astype('float64'))
+        else:
+            chunk.isetitem(column_n, column_values.astype('object'))
+    return chunk
+
+
+def _empty_cells_to_none(df: pd.DataFrame) -> pd.DataFrame:
+    """Return the DataFrame with the empty cells of its non numeric columns as None, as objects: the CSV export
+    reads them as empty strings, values.get leaves out the trailing ones
+    """
+    for column_n in range(df.shape[1]):
+        column = df.iloc[:, column_n]
+        if not pd.api.types.is_numeric_dtype(column) and not pd.api.types.is_datetime64_any_dtype(column):
+            column = column.astype(object)
+            df.isetitem(column_n, column.where(column.notna() & (column != ""), None))
+    return df
+
+
+def _changed_rectangles(changed_cells: np.ndarray) -> List[Tuple[int, int, int, int]]:
+    """Return the changed cells as (first_row, first_column, last_row, last_column) rectangles
+
+    Runs of changed cells are found row by row, runs spanning the same columns on consecutive rows
+    are merged into one rectangle
+    """
+    rows_n, columns_n = changed_cells.shape
+    # run starts and ends are where the padded row goes from unchanged to changed and back
+    padded_cells = np.zeros((rows_n, columns_n + 2), dtype=np.int8)
+    padded_cells[:, 1:-1] = changed_cells
+    run_edges = np.diff(padded_cells, axis=1)
+    start_rows, start_columns = np.nonzero(run_edges == 1)
+    _, end_columns = np.nonzero(run_edges == -1)
+
+    rectangles: List[Tuple[int, int, int, int]] = []
+    # (first_column, last_column) -> [first_row, last_row] of the rectangles still growing
+    open_rectangles: Dict[Tuple[int, int], List[int]] = {}
+    for row_n, first_column, end_column in zip(start_rows.tolist(), start_columns.tolist(), end_columns.tolist()):
+        run_columns = (first_column, end_column - 1)
+        open_rectangle = open_rectangles.get(run_columns)
+        if open_rectangle is not None and open_rectangle[1] == row_n - 1:
+            open_rectangle[1] = row_n
+            continue
+        if open_rectangle is not None:
+            rectangles.append((open_rectangle[0], run_columns[0], open_rectangle[1], run_columns[1]))
+        open_rectangles[run_columns] = [row_n, row_n]
+    for (first_column, last_column), (first_row, last_row) in open_rectangles.items():
+        rectangles.append((first_row, first_column, last_row, last_column))
+    return sorted(rectangles)
+
 
 class GSheetHandler(GAuthHandler):
     def __init__(self, auth_scopes: Union[List[AuthScope], None],
                  spreadsheet_id: Optional[str] = None,
-                 credentials_folder_path: Union[Path, str, None] = None):
-        super().__init__(auth_scopes, credentials_folder_path=credentials_folder_path)
+                 credentials_folder_path: Union[Path, str, None] = None,
+                 metadata_ttl: float = METADATA_TTL,
+                 scheduler: Optional[GRequestScheduler] = None,
+                 read_cache: Optional[GReadCache] = None,
+                 instrumentation: Optional[GInstrumentation] = None,
+                 transport: Union[str, GTransportPool] = "httplib2"):
+        super().__init__(auth_scopes, credentials_folder_path=credentials_folder_path, scheduler=scheduler,
+                         instrumentation=instrumentation, transport=transport)
 
         # get authorization
         self.get_g_auth()
@@ -31,6 +273,25 @@ class GSheetHandler(GAuthHandler):
         else:
             self.spreadsheet_id = spreadsheet_id
 
+        # last values written to or read from a range by sync_gsheet, keyed by (sheet_name, start_cell)
+        self._sync_snapshots: Dict[Tuple[str, str], np.ndarray] = {}
+
+        # sheets properties keyed by upper case title, fetched with a field mask and kept metadata_ttl seconds
+        self.metadata_ttl: float = metadata_ttl
+        self._sheets_metadata: Dict[str, dict] = {}
+        self._sheets_metadata_key: Union[Tuple[str, float], None] = None
+        # used (rows_n, columns_n) of each sheet and when they were probed, keyed by (spreadsheet_id, upper case title)
+        self._used_extents: Dict[Tuple[str, str], Tuple[Tuple[int, int], float]] = {}
+
+        # read_gsheet serves unchanged ranges from the local cache when set
+        self.read_cache: Union[GReadCache, None] = read_cache
+
+    def _get_sheet_service(self) -> Resource:
+        return self.get_service(api_name='sheets', api_version='v4')
+
+    def _get_sheet_resource(self, resource_path: str) -> Resource:
+        return self.get_service_resource(api_name='sheets', api_version='v4', resource_path=resource_path)
+
     def get_sheet_desc(self):
         # check that we are requesting a GSheet Auth
         if AuthScope.SpreadSheet.value not in self.auth_scopes:
@@ -41,24 +302,180 @@ class GSheetHandler(GAuthHandler):
         # True if grid data should be returned.
         # This parameter is ignored if a field mask was set in the request.
         include_grid_data = False  # TODO: Update placeholder value.
-        service = discovery.build('sheets', 'v4', credentials=self.authorized_creds)
 
-        request = service.spreadsheets().get(spreadsheetId=self.spreadsheet_id,
-                                             includeGridData=include_grid_data)
-        response = request.execute()
+        request = self._get_sheet_resource("spreadsheets").get(spreadsheetId=self.spreadsheet_id,
+                                                               includeGridData=include_grid_data)
+        response = self.execute_request(request, quota_bucket='sheets_read')
 
         return response
 
-    def get_sheets_properties(self) -> List[dict]:
+    def get_drive_version(self) -> Union[str, None]:
+        """Return the spreadsheet Drive version, None without a Drive scope or if the request failed
+
+        The version increases on every change to the spreadsheet, it is checked at most once
+        per read_cache.version_check_interval
+        """
+        if not any(scope.value in self.auth_scopes for scope in [AuthScope.Drive,
+                                                                 AuthScope.DriveFile,
+                                                                 AuthScope.DriveReadOnly]):
+            return None
+        if self.read_cache is not None:
+            drive_version = self.read_cache.get_checked_version(spreadsheet_id=self.spreadsheet_id)
+            if drive_version is not None:
+                return drive_version
+
+        try:
+            response = self.execute_request(
+                self.get_service_resource(api_name='drive', api_version='v3', resource_path='files').get(
+                    fileId=self.spreadsheet_id, fields="version"),
+                quota_bucket='drive', priority=PRIORITY_HIGH)
+        except HttpError as err:
+            logger.info(f'HttpError handled: {err}')
+            return None
+
+        drive_version = response.get('version')
+        if self.read_cache is not None and drive_version is not None:
+            self.read_cache.set_checked_version(spreadsheet_id=self.spreadsheet_id, drive_version=drive_version)
+        return drive_version
+
+    def _load_sheets_metadata(self, refresh: bool = False) -> Union[Dict[str, dict], None]:
+        """Return the sheets properties keyed by upper case title, fetched again once metadata_ttl has passed"""
+        if (not refresh and self._sheets_metadata_key is not None
+                and self._sheets_metadata_key[0] == self.spreadsheet_id
+                and time.monotonic() - self._sheets_metadata_key[1] < self.metadata_ttl):
+            return self._sheets_metadata
+
+        # check that we are requesting a GSheet Auth
+        if not any(scope.value in self.auth_scopes for scope in [AuthScope.SpreadSheet, AuthScope.SpreadSheetReadOnly]):
+            logger.info(f"{AuthScope.SpreadSheet.value} or {AuthScope.SpreadSheetReadOnly.value} "
+                        f"not in auth. scopes: {self.auth_scopes}")
+            return None
+
+        try:
+            response = self.execute_request(
+                self._get_sheet_resource("spreadsheets").get(spreadsheetId=self.spreadsheet_id,
+                                                             fields="sheets.properties"),
+                quota_bucket='sheets_read', priority=PRIORITY_HIGH)
+        except HttpError as err:
+            logger.info(f'HttpError handled: {err}')
+            return None
+
+        self._sheets_metadata = {sheet.get('properties').get('title').upper(): sheet.get('properties')
+                                 for sheet in response.get("sheets", [])}
+        self._sheets_metadata_key = (self.spreadsheet_id, time.monotonic())
+        return self._sheets_metadata
+
+    def invalidate_sheets_metadata(self):
+        """Drop the cached sheets properties, the next lookup fetches them again"""
+        self._sheets_metadata = {}
+        self._sheets_metadata_key = None
+        self._used_extents = {}
+
+    def _remove_sheet_metadata(self, sheet_id: int):
+        """Remove a deleted sheet from the cached sheets properties and shift the indexes of the following ones"""
+        deleted_title = next((title for title, sheet_properties in self._sheets_metadata.items()
+                              if sheet_properties.get('sheetId') == sheet_id), None)
+        if deleted_title is None:
+            return
+        deleted_index = self._sheets_metadata.pop(deleted_title).get('index', 0)
+        for sheet_properties in self._sheets_metadata.values():
+            if sheet_properties.get('index', 0) > deleted_index:
+                sheet_properties['index'] -= 1
+
+    def get_sheets_properties(self, refresh: bool = False) -> List[dict]:
         """Returns: A list of all sheets with their properties: sheetId,title,index..."""
-        sheets = self.get_sheet_desc().get("sheets")
-        sheet_properties = [sheet_property.get('properties') for sheet_property in sheets]
-        return sheet_properties
+        sheets_metadata = self._load_sheets_metadata(refresh=refresh)
+        if sheets_metadata is None:
+            return []
+        return sorted(sheets_metadata.values(), key=lambda sheet_property: sheet_property.get('index', 0))
+
+    def get_sheet_properties(self, sheet_name: str, refresh: bool = False) -> Union[dict, None]:
+        """Return the properties of a sheet by its title, case-insensitive, None if it is not found"""
+        sheets_metadata = self._load_sheets_metadata(refresh=refresh)
+        if sheets_metadata is None:
+            return None
+        return sheets_metadata.get(sheet_name.upper())
+
+    def get_sheet_id(self, sheet_name: str, refresh: bool = False) -> Union[int, None]:
+        """Return the sheetId of a sheet by its title, case-insensitive, None if it is not found"""
+        sheet_properties = self.get_sheet_properties(sheet_name=sheet_name, refresh=refresh)
+        if sheet_properties is None:
+            return None
+        return sheet_properties.get('sheetId')
+
+    def get_used_extent(self, sheet_name: str, refresh: bool = False) -> Union[Tuple[int, int], None]:
+        """Return the (rows_n, columns_n) holding the data of a sheet from A1, None if the sheet was not found
+
+        No values are read: the extent is the sheet grid, from the cached metadata, until a read of the whole sheet
+        with read_gsheet(sheet_range=None) narrows it to the rows and columns the API returned, trailing empty rows
+        and cells being left out. The extent is kept metadata_ttl seconds and dropped when the handler writes
+        to the sheet.
+        """
+        extent_key = (self.spreadsheet_id, sheet_name.upper())
+        cached_extent = self._used_extents.get(extent_key)
+        if (not refresh and cached_extent is not None
+                and time.monotonic() - cached_extent[1] < self.metadata_ttl):
+            return cached_extent[0]
+
+        sheet_properties = self.get_sheet_properties(sheet_name=sheet_name, refresh=refresh)
+        if sheet_properties is None:
+            return None
+        grid_properties: dict = sheet_properties.get('gridProperties', {})
+        return grid_properties.get('rowCount', 0), grid_properties.get('columnCount', 0)
+
+    def _set_used_extent(self, sheet_name: str, range_values: List[List]):
+        """Keep the extent of the values read from the whole sheet, see get_used_extent"""
+        used_extent = (len(range_values), max((len(row_values) for row_values in range_values), default=0))
+        self._used_extents[(self.spreadsheet_id, sheet_name.upper())] = (used_extent, time.monotonic())
+
+    def _used_range(self, sheet_name: str) -> Union[str, None]:
+        """Return the A1 range of the used extent of a sheet, '' for an empty sheet, None if it was not found"""
+        used_extent = self.get_used_extent(sheet_name=sheet_name)
+        if used_extent is None:
+            logger.info(f"Error {sheet_name} was not found in workbook sheets")
+            return None
+        rows_n, columns_n = used_extent
+        if rows_n == 0 or columns_n == 0:
+            return ""
+        return f"A1:{n2a(columns_n)}{rows_n}"
 
     def read_gsheet(self,
                     sheet_name: str,
-                    sheet_range: str,
-                    as_dataframe: bool = True) -> Union[List[List], pd.DataFrame, None]:
+                    sheet_range: Optional[str] = None,
+                    as_dataframe: bool = True,
+                    value_render_option: str = "FORMATTED_VALUE",
+                    date_time_render_option: str = "SERIAL_NUMBER",
+                    header: bool = False,
+                    typed: bool = False,
+                    date_columns: Optional[List[Union[str, int]]] = None,
+                    low_memory: bool = False,
+                    ) -> Union[List[List], pd.DataFrame, None]:
+        """Read a range of a sheet, from the handler read_cache when set and the cached values are not stale
+
+        Args:
+            sheet_name (str): the sheet name
+            sheet_range (Optional[str]=None): the A1 range, i.e.: 'A1:G10', None for the rows and columns holding
+                data, see get_used_extent
+            as_dataframe (bool=True): return a pd.DataFrame instead of a list of lists
+            value_render_option (str="FORMATTED_VALUE"): "FORMATTED_VALUE", "UNFORMATTED_VALUE" or "FORMULA"
+            date_time_render_option (str="SERIAL_NUMBER"): "SERIAL_NUMBER" or "FORMATTED_STRING",
+                ignored by the API with FORMATTED_VALUE
+            header (bool=False): use the first row as the DataFrame columns names
+            typed (bool=False): convert the DataFrame columns to boolean, Int64 or float64 when their values allow it
+            date_columns (Optional[List[Union[str, int]]]=None): DataFrame columns names or positions to convert
+                to datetime64, from serial numbers or formatted strings
+            low_memory (bool=False): parse the response while it is downloaded, see read_gsheet_streamed,
+                only with as_dataframe
+        """
+        # https://developers.google.com/sheets/api/reference/rest/v4/ValueRenderOption
+        if low_memory and as_dataframe:
+            return self.read_gsheet_streamed(sheet_name=sheet_name,
+                                             sheet_range=sheet_range,
+                                             value_render_option=value_render_option,
+                                             date_time_render_option=date_time_render_option,
+                                             header=header,
+                                             typed=typed,
+                                             date_columns=date_columns)
 
         range_values: Union[List[List], pd.DataFrame, None] = None
         # check that we are requesting a GSheet Auth
@@ -67,16 +484,40 @@ class GSheetHandler(GAuthHandler):
                         f"not in auth. scopes: {self.auth_scopes}")
             return range_values
 
-        # The ranges to retrieve from the spreadsheet.
+        # the whole sheet is read within its used extent, which the values read then narrow
+        used_range: bool = sheet_range is None
+        if used_range:
+            sheet_range = self._used_range(sheet_name=sheet_name)
+            if sheet_range is None:
+                return range_values
+            if sheet_range == "":
+                logger.info('No data found.')
+                return pd.DataFrame() if as_dataframe else []
+
+        # The ranges to retrieve from the spreadsheet
         sheet_range_addresses = f"{sheet_name}!{sheet_range}"
 
+        cache_key = (self.spreadsheet_id, sheet_range_addresses, value_render_option, date_time_render_option)
+        drive_version: Union[str, None] = None
+        if self.read_cache is not None:
+            drive_version = self.get_drive_version()
+            range_values = self.read_cache.get(cache_key=cache_key, drive_version=drive_version)
+
         try:
-            service = discovery.build('sheets', 'v4', credentials=self.authorized_creds)
-            # Call the Sheets API
-            sheet = service.spreadsheets()
-            result = sheet.values().get(spreadsheetId=self.spreadsheet_id,
-                                        range=sheet_range_addresses).execute()
-            range_values = result.get('values', [])
+            if range_values is None:
+                # Call the Sheets API
+                values_resource = self._get_sheet_resource("spreadsheets.values")
+                result = self.execute_request(values_resource.get(spreadsheetId=self.spreadsheet_id,
+                                                                 range=sheet_range_addresses,
+                                                                 valueRenderOption=value_render_option,
+                                                                 dateTimeRenderOption=date_time_render_option),
+                                              quota_bucket='sheets_read')
+                range_values = result.get('values', [])
+                if self.read_cache is not None:
+                    self.read_cache.put(cache_key=cache_key, sheet_name=sheet_name, range_values=range_values,
+                                        drive_version=drive_version)
+            if used_range:
+                self._set_used_extent(sheet_name=sheet_name, range_values=range_values)
             if not range_values:
                 logger.info('No data found.')
                 if as_dataframe:
@@ -89,10 +530,271 @@ class GSheetHandler(GAuthHandler):
             return range_values
 
         if as_dataframe:
-            range_values = pd.DataFrame(data=range_values)
+            with self.instrument_step('values_to_dataframe', resource_id=self.spreadsheet_id):
+                range_values = values_to_dataframe(range_values=range_values,
+                                                   header=header,
+                                                   typed=typed,
+                                                   date_columns=date_columns)
 
         return range_values
 
+    def _expected_rows_n(self, sheet_name: str, sheet_range: str) -> int:
+        """Return the rows a range can hold within its sheet grid, 0 when unknown"""
+        a1_range = A1Range.parse(sheet_range)
+        rows_n = a1_range.rows_n
+        sheet_properties = self.get_sheet_properties(sheet_name=sheet_name)
+        grid_rows_n = None if sheet_properties is None else sheet_properties.get('gridProperties', {}).get('rowCount')
+        if grid_rows_n:
+            grid_rows_n -= (a1_range.start_row or 1) - 1
+            rows_n = grid_rows_n if rows_n is None else min(rows_n, grid_rows_n)
+        return max(rows_n or 0, 0)
+
+    def read_gsheet_streamed(self,
+                             sheet_name: str,
+                             sheet_range: Optional[str],
+                             value_render_option: str = "FORMATTED_VALUE",
+                             date_time_render_option: str = "SERIAL_NUMBER",
+                             header: bool = False,
+                             typed: bool = False,
+                             date_columns: Optional[List[Union[str, int]]] = None,
+                             as_arrow: bool = False,
+                             ):
+        """Low memory read_gsheet: the values.get response is parsed while it is downloaded, row by row,
+        into column buffers preallocated to the range size, requires ijson
+
+        The response bytes, its decoded dict and its list of rows are never held in memory, and when typed the
+        numeric columns of UNFORMATTED_VALUE reads are kept as float64 rather than Python objects,
+        see benchmarks/bench_memory_read.py. The read cache is not used.
+        The response is streamed by the handler transport pool, the "requests" one with httplib2, and the request
+        is throttled, retried and instrumented as the others, its parsing within the network phase.
+
+        Args:
+            as_arrow (bool=False): return a pyarrow.Table, requires pyarrow
+            see read_gsheet for the others
+
+        Returns: a pd.DataFrame, or a pyarrow.Table if as_arrow, None if the request failed
+        """
+        if not any(scope.value in self.auth_scopes for scope in [AuthScope.SpreadSheet, AuthScope.SpreadSheetReadOnly]):
+            logger.info(f"{AuthScope.SpreadSheet.value} or {AuthScope.SpreadSheetReadOnly.value} "
+                        f"not in auth. scopes: {self.auth_scopes}")
+            return None
+        if self.authorized_creds is None:
+            logger.info("No authorized credentials, see get_g_auth")
+            return None
+
+        import ijson
+
+        if sheet_range is None:
+            sheet_range = self._used_range(sheet_name=sheet_name)
+            if sheet_range is None:
+                return None
+            if sheet_range == "":
+                logger.info('No data found.')
+                return columns_to_arrow(header_values=[], columns=[]) if as_arrow else pd.DataFrame()
+
+        rows_n: int = 0
+        streaming_http = self.get_streaming_http(
+            read_stream=lambda values_stream: read_values_stream(values_stream=values_stream,
+                                                                 rows_n=rows_n,
+                                                                 header=header,
+                                                                 numeric_columns=typed))
+        request = self._get_sheet_resource("spreadsheets.values").get(spreadsheetId=self.spreadsheet_id,
+                                                                      range=f"{sheet_name}!{sheet_range}",
+                                                                      valueRenderOption=value_render_option,
+                                                                      dateTimeRenderOption=date_time_render_option)
+        # parsed by streaming_http while downloaded, within the scheduler retries and the call event
+        request.http = streaming_http
+        request.postproc = lambda resp, content: streaming_http.result
+        try:
+            rows_n = self._expected_rows_n(sheet_name=sheet_name, sheet_range=sheet_range)
+            header_values, columns = self.execute_request(request, quota_bucket='sheets_read')
+        except HttpError as err:
+            logger.info(f'HttpError handled: {err}')
+            return None
+        except (OSError, ijson.JSONError) as err:
+            # the connection was lost or the response is truncated or malformed
+            logger.info(f'{err.__class__.__name__} handled: {err}')
+            return None
+
+        if as_arrow:
+            return columns_to_arrow(header_values=header_values, columns=columns)
+        with self.instrument_step('columns_to_dataframe', resource_id=self.spreadsheet_id):
+            return columns_to_dataframe(header_values=header_values,
+                                        columns=columns,
+                                        typed=typed,
+                                        date_columns=date_columns)
+
+    def iter_gsheet(self,
+                    sheet_name: str,
+                    columns: Optional[str] = "A:Z",
+                    chunk_rows: int = 10_000,
+                    header: bool = True,
+                    ) -> Iterator[pd.DataFrame]:
+        """Yield the sheet rows as pd.DataFrame chunks, the next chunk being fetched in the background
+
+        Peak memory is bounded by two chunks: the one yielded and the one being prefetched.
+        The column dtypes are inferred on the first chunk and kept for the following ones: in a numeric column,
+        the values that are not numbers become NaN and are logged.
+        Iteration goes on to the last row of the sheet used extent, see get_used_extent, through the blank rows:
+        the API leaves out the blank rows ending a chunk and a blank chunk is not yielded.
+        An HttpError is logged then raised: the rows already yielded are not the whole sheet.
+
+        Args:
+            sheet_name (str): the sheet name
+            columns (Optional[str]="A:Z"): the columns to read, None for all the columns of the sheet used extent
+            chunk_rows (int=10_000): the number of rows fetched per request
+            header (bool=True): use the first row as the columns names
+        """
+        # check that we are requesting a GSheet Auth
+        if not any(scope.value in self.auth_scopes for scope in [AuthScope.SpreadSheet, AuthScope.SpreadSheetReadOnly]):
+            logger.info(f"{AuthScope.SpreadSheet.value} or {AuthScope.SpreadSheetReadOnly.value} "
+                        f"not in auth. scopes: {self.auth_scopes}")
+            return
+
+        used_extent = self.get_used_extent(sheet_name=sheet_name)
+        if used_extent is None:
+            logger.info(f"Error {sheet_name} was not found in workbook sheets")
+            return
+        row_count, used_columns_n = used_extent
+        if columns is None:
+            if used_columns_n == 0:
+                return
+            columns = f"A:{n2a(used_columns_n)}"
+
+        start_column, _, end_column = columns.partition(":")
+        end_column = end_column or start_column
+        columns_n: int = a2n(end_column) - a2n(start_column) + 1
+
+        def read_rows(first_row: int) -> List[List]:
+            last_row = min(first_row + chunk_rows - 1, row_count)
+            result = self.execute_request(self._get_sheet_resource("spreadsheets.values").get(
+                spreadsheetId=self.spreadsheet_id,
+                range=f"{sheet_name}!{start_column}{first_row}:{end_column}{last_row}"),
+                quota_bucket='sheets_read')
+            return result.get('values', [])
+
+        column_names: List[object] = list(range(columns_n))
+        chunk_dtypes: Union[Dict[object, str], None] = None
+        header_row_pending: bool = header
+        first_row: int = 1
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            next_rows = executor.submit(read_rows, first_row) if row_count > 0 else None
+            while next_rows is not None:
+                try:
+                    rows = next_rows.result()
+                except HttpError as err:
+                    logger.error(f'iter_gsheet stopped at row {first_row} of {sheet_name}: {err}')
+                    raise
+                # prefetch the next chunk while this one is converted and consumed
+                first_row += chunk_rows
+                next_rows = executor.submit(read_rows, first_row) if first_row <= row_count else None
+                if header_row_pending:
+                    # the first row of the sheet, blank when the first chunk is
+                    header_row_pending = False
+                    header_row, rows = (rows[0], rows[1:]) if rows else ([], rows)
+                    column_names = [header_row[column_n] if column_n < len(header_row) and header_row[column_n] != ""
+                                    else column_n for column_n in range(columns_n)]
+                if not rows:
+                    continue
+
+                chunk = pd.DataFrame(data=rows).reindex(columns=range(columns_n))
+                chunk.columns = column_names
+                del rows
+                if chunk_dtypes is None:
+                    chunk_dtypes = _infer_chunk_dtypes(chunk)
+                yield _cast_chunk(chunk=chunk, chunk_dtypes=chunk_dtypes)
+
+    def read_full_sheet(self,
+                        sheet_name: str,
+                        header: bool = False,
+                        typed: bool = False,
+                        export_min_cells: int = EXPORT_MIN_CELLS,
+                        ) -> Union[pd.DataFrame, None]:
+        """Read a whole tab through the cheapest path for its size
+
+        Tabs of export_min_cells grid cells or more are exported as CSV through Drive, which needs a Drive scope,
+        smaller ones are read with values.get. All values are strings unless typed, empty cells are None
+        on both paths.
+
+        Args:
+            sheet_name (str): the sheet name
+            header (bool=False): use the first row as the columns names
+            typed (bool=False): infer the columns types
+            export_min_cells (int=EXPORT_MIN_CELLS): the grid size, from the sheet metadata, above which
+                the tab is exported
+        """
+        sheet_properties = self.get_sheet_properties(sheet_name=sheet_name)
+        if sheet_properties is None:
+            logger.info(f"Error {sheet_name} was not found in workbook sheets")
+            return None
+        grid_properties = sheet_properties.get('gridProperties', {})
+        rows_n = grid_properties.get('rowCount', 0)
+        columns_n = grid_properties.get('columnCount', 0)
+
+        if rows_n * columns_n >= export_min_cells and any(
+                scope.value in self.auth_scopes for scope in [AuthScope.Drive,
+                                                              AuthScope.DriveFile,
+                                                              AuthScope.DriveReadOnly]):
+            try:
+                export_file = stream_sheet_export(g_handler=self,
+                                                  spreadsheet_id=self.spreadsheet_id,
+                                                  sheet_id=sheet_properties.get('sheetId'))
+            except HttpError as err:
+                logger.info(f'HttpError handled: {err}')
+                return None
+            except OSError as err:
+                logger.info(f'{err.__class__.__name__} handled: {err}')
+                return None
+            with export_file:
+                return _empty_cells_to_none(read_export(export_file=export_file, header=header, typed=typed))
+
+        range_values = self.read_gsheet(sheet_name=sheet_name,
+                                        sheet_range=f"A1:{n2a(max(columns_n, 1))}{max(rows_n, 1)}",
+                                        as_dataframe=False)
+        if range_values is None:
+            return None
+        return _empty_cells_to_none(values_to_dataframe(range_values=range_values, header=header, typed=typed))
+
+    def read_gsheets_batch(self,
+                           sheet_ranges: List[Union[str, Tuple[str, str]]],
+                           as_dataframe: bool = True,
+                           ) -> Union[Dict[Union[str, Tuple[str, str]], Union[List[List], pd.DataFrame]], None]:
+        """Read several ranges with values.batchGet, split into several requests when over the size limits
+
+        Args:
+            sheet_ranges (List[Union[str, Tuple[str, str]]]): ranges as 'sheet_name!A1:B2' or as (sheet_name, 'A1:B2')
+            as_dataframe (bool=True): return each range values as a pd.DataFrame
+
+        Returns: a dict of each given range to its values, None if an HttpError occurred
+        """
+        # https://developers.google.com/sheets/api/reference/rest/v4/spreadsheets.values/batchGet
+
+        # check that we are requesting a GSheet Auth
+        if not any(scope.value in self.auth_scopes for scope in [AuthScope.SpreadSheet, AuthScope.SpreadSheetReadOnly]):
+            logger.info(f"{AuthScope.SpreadSheet.value} or {AuthScope.SpreadSheetReadOnly.value} "
+                        f"not in auth. scopes: {self.auth_scopes}")
+            return None
+
+        range_addresses: List[str] = [_sheet_range_address(sheet_range) for sheet_range in sheet_ranges]
+        value_ranges: List[dict] = []
+        try:
+            for batch_range_addresses in _split_batch_get_ranges(range_addresses=range_addresses):
+                result = self.execute_request(
+                    self._get_sheet_resource("spreadsheets.values").batchGet(spreadsheetId=self.spreadsheet_id,
+                                                                             ranges=batch_range_addresses),
+                    quota_bucket='sheets_read')
+                value_ranges.extend(result.get('valueRanges', []))
+        except HttpError as err:
+            logger.info(f'HttpError handled: {err}')
+            return None
+
+        # valueRanges are returned in the order of the requested ranges
+        ranges_values: Dict[Union[str, Tuple[str, str]], Union[List[List], pd.DataFrame]] = {}
+        for sheet_range, value_range in zip(sheet_ranges, value_ranges):
+            range_values = value_range.get('values', [])
+            ranges_values[sheet_range] = pd.DataFrame(data=range_values) if as_dataframe else range_values
+        return ranges_values
+
     def update_gsheet(self,
                       sheet_name: str,
                       sheet_new_values: List[List],
@@ -115,19 +817,22 @@ class GSheetHandler(GAuthHandler):
         elif sheet_start_cell is not None:
             sheet_range = build_sheet_range(range_values=sheet_new_values,
                                             start_cell=sheet_start_cell)
+            if sheet_range is None:
+                logger.info(f'No values to write from {sheet_start_cell}')
+                return 0
 
-        # The ranges to retrieve from the spreadsheet.
-        sheet_range_addresses = f"{sheet_name}!{sheet_range}"
+        # The ranges to retrieve from the spreadsheet, the whole sheet is trimmed to its data by the API
+        sheet_range_addresses = sheet_name if sheet_range is None else f"{sheet_name}!{sheet_range}"
+        self._invalidate_sheet_caches(sheet_name, sheet_range=sheet_range)
         updated_cells: int = 0
         try:
-            service = discovery.build('sheets', 'v4', credentials=self.authorized_creds)
             body = {
                 'values': sheet_new_values
             }
-            result = service.spreadsheets().values().update(
+            result = self.execute_request(self._get_sheet_resource("spreadsheets.values").update(
                 spreadsheetId=self.spreadsheet_id, range=sheet_range_addresses,
                 valueInputOption="USER_ENTERED", body=body
-            ).execute()
+            ), quota_bucket='sheets_write')
 
             updated_cells = result.get('updatedCells')
 
@@ -136,6 +841,319 @@ class GSheetHandler(GAuthHandler):
 
         return updated_cells
 
+    def update_gsheets_batch(self,
+                             ranges_values: Dict[Union[str, Tuple[str, str]], List[List]],
+                             value_input_option: str = "USER_ENTERED",
+                             ) -> Union[Dict[str, Union[int, Dict]], None]:
+        """Write several ranges with values.batchUpdate, split into several requests when over the payload limit
+
+        Args:
+            ranges_values (Dict[Union[str, Tuple[str, str]], List[List]]): values by range, ranges given as
+                'sheet_name!A1:B2' or as (sheet_name, start_cell)
+            value_input_option (str="USER_ENTERED"): "RAW" or "USER_ENTERED"
+
+        Returns: {'totalUpdatedCells': int, 'updatedCells': {range: int}}, None if the arguments are invalid.
+            On HttpError, the cells updated by the requests sent before the error
+        """
+        # https://developers.google.com/sheets/api/reference/rest/v4/spreadsheets.values/batchUpdate
+
+        # check that we have the rights to modify the GSheet
+        if AuthScope.SpreadSheet.value not in self.auth_scopes:
+            logger.info(f"{AuthScope.SpreadSheet.value} not in auth. scopes: "
+                        f"{self.auth_scopes}")
+            return None
+        if value_input_option not in VALUE_INPUT_OPTIONS:
+            logger.info(f'value_input_option: {value_input_option} not in {VALUE_INPUT_OPTIONS}')
+            return None
+
+        data_ranges: List[Tuple[object, str, List[List]]] = []
+        for data_key, range_values in ranges_values.items():
+            if isinstance(data_key, tuple):
+                sheet_name, start_cell = data_key
+                cells_range = build_sheet_range(range_values=range_values, start_cell=start_cell)
+                if cells_range is None:
+                    # nothing to write, 0 cells updated
+                    continue
+                range_address = f"{sheet_name}!{cells_range}"
+            else:
+                range_address = data_key
+            data_ranges.append((data_key, range_address, range_values))
+            sheet_name, _, cells_range = range_address.rpartition("!")
+            if sheet_name:
+                self._invalidate_sheet_caches(sheet_name.strip("'"), sheet_range=cells_range)
+            else:
+                self._invalidate_sheet_caches(cells_range.strip("'"))
+
+        updated_cells: Dict[Union[str, Tuple[str, str]], int] = {data_key: 0 for data_key in ranges_values}
+        try:
+            for batch_data_ranges in _split_batch_update_data(data_ranges=data_ranges):
+                body = {
+                    'valueInputOption': value_input_option,
+                    'data': [{'range': range_address, 'values': range_values}
+                             for _, range_address, range_values in batch_data_ranges]
+                }
+                result = self.execute_request(
+                    self._get_sheet_resource("spreadsheets.values").batchUpdate(spreadsheetId=self.spreadsheet_id,
+                                                                                body=body),
+                    quota_bucket='sheets_write')
+                # responses are returned in the order of the data
+                for (data_key, _, _), response in zip(batch_data_ranges, result.get('responses', [])):
+                    updated_cells[data_key] += response.get('updatedCells', 0)
+
+        except HttpError as err:
+            logger.info(f'HttpError handled: {err}')
+
+        return {'totalUpdatedCells': sum(updated_cells.values()),
+                'updatedCells': updated_cells}
+
+    def _invalidate_sheet_caches(self, sheet_name: str, sheet_range: Optional[str] = None):
+        """Drop the used extent and the cached reads of a sheet modified by the handler, and its sync snapshots
+        overlapping sheet_range, all of them if None
+        """
+        self._used_extents.pop((self.spreadsheet_id, sheet_name.upper()), None)
+        # a range without any side is the whole sheet
+        modified_range = A1Range() if sheet_range is None else A1Range.parse(sheet_range)
+        if modified_range.sheet_name is not None:
+            # not a range of cells
+            modified_range = A1Range()
+        for snapshot_key, snapshot_values in list(self._sync_snapshots.items()):
+            snapshot_sheet_name, snapshot_start_cell = snapshot_key
+            if snapshot_sheet_name.upper() != sheet_name.upper():
+                continue
+            snapshot_range = A1Range.from_shape(start_cell=snapshot_start_cell,
+                                                rows_n=snapshot_values.shape[0],
+                                                columns_n=snapshot_values.shape[1])
+            if modified_range.intersection(snapshot_range) is not None:
+                del self._sync_snapshots[snapshot_key]
+        if self.read_cache is not None:
+            self.read_cache.invalidate(spreadsheet_id=self.spreadsheet_id, sheet_name=sheet_name)
+
+    def load_sync_snapshot(self,
+                           sheet_name: str,
+                           sheet_range: str,
+                           ) -> bool:
+        """Read a range and keep its values as the sync_gsheet snapshot of the range start cell
+
+        Returns: True if the snapshot has been loaded
+        """
+        range_values = self.read_gsheet(sheet_name=sheet_name,
+                                        sheet_range=sheet_range,
+                                        as_dataframe=False,
+                                        value_render_option="UNFORMATTED_VALUE")
+        if range_values is None:
+            return False
+        start_cell = sheet_range.partition(":")[0].replace("$", "").upper()
+        snapshot_values = pad_rows(range_values)
+        snapshot_values[np.equal(snapshot_values, None)] = ""
+        self._sync_snapshots[(sheet_name, start_cell)] = snapshot_values
+        return True
+
+    def sync_gsheet(self,
+                    sheet_name: str,
+                    sheet_new_values: List[List],
+                    sheet_start_cell: str = "A1",
+                    value_input_option: str = "USER_ENTERED",
+                    ) -> Union[Dict[str, int], None]:
+        """Write only the cells that changed since the last values synced from sheet_start_cell
+
+        The changed cells are found by comparing the new values with the local snapshot of the range,
+        merged into rectangles and sent in one values.batchUpdate. Without a snapshot, the whole range
+        is written. Cells of the snapshot outside the new values are cleared.
+
+        Returns: {'updatedCells': int, 'skippedCells': int, 'updatedRanges': int}, None if an error occurred
+        """
+        start_cell = sheet_start_cell.replace("$", "").upper()
+        start_letters, start_row = split_cell(start_cell)
+        start_column = a2n(start_letters)
+        snapshot_key = (sheet_name, start_cell)
+
+        new_values = pad_rows(sheet_new_values)
+        new_values[np.equal(new_values, None)] = ""
+        snapshot_values = self._sync_snapshots.get(snapshot_key)
+        if snapshot_values is None:
+            snapshot_values = np.empty((0, 0), dtype=object)
+            changed_cells = np.ones(new_values.shape, dtype=bool)
+        else:
+            # compare on the union of both shapes, cells missing on one side are empty
+            rows_n = max(new_values.shape[0], snapshot_values.shape[0])
+            columns_n = max(new_values.shape[1], snapshot_values.shape[1])
+            padded_new_values = np.full((rows_n, columns_n), "", dtype=object)
+            padded_new_values[:new_values.shape[0], :new_values.shape[1]] = new_values
+            padded_snapshot_values = np.full((rows_n, columns_n), "", dtype=object)
+            padded_snapshot_values[:snapshot_values.shape[0], :snapshot_values.shape[1]] = snapshot_values
+            new_values = padded_new_values
+            changed_cells = padded_new_values != padded_snapshot_values
+
+        ranges_values: Dict[str, List[List]] = {}
+        rectangles = _changed_rectangles(changed_cells)
+        if rectangles:
+            corners = np.array(rectangles)
+            first_cells = cells_to_a1(rows=start_row + corners[:, 0], columns=start_column + corners[:, 1])
+            last_cells = cells_to_a1(rows=start_row + corners[:, 2], columns=start_column + corners[:, 3])
+            for rectangle_n, (first_row, first_column, last_row, last_column) in enumerate(rectangles):
+                range_address = f"{sheet_name}!{first_cells[rectangle_n]}:{last_cells[rectangle_n]}"
+                ranges_values[range_address] = new_values[first_row:last_row + 1, first_column:last_column + 1].tolist()
+        changed_cells_n = int(changed_cells.sum())
+        skipped_cells_n = int(changed_cells.size) - changed_cells_n
+
+        if ranges_values:
+            result = self.update_gsheets_batch(ranges_values=ranges_values,
+                                               value_input_option=value_input_option)
+            if result is None or result['totalUpdatedCells'] != changed_cells_n:
+                # the sheet state is unknown: the next sync writes the whole range
+                self._sync_snapshots.pop(snapshot_key, None)
+                return None
+            updated_cells_n = result['totalUpdatedCells']
+        else:
+            updated_cells_n = 0
+
+        self._sync_snapshots[snapshot_key] = new_values
+        logger.info(f'sync_gsheet: {updated_cells_n} cells updated in {len(ranges_values)} ranges, '
+                    f'{skipped_cells_n} unchanged cells skipped')
+        return {'updatedCells': updated_cells_n,
+                'skippedCells': skipped_cells_n,
+                'updatedRanges': len(ranges_values)}
+
+    def write_dataframe(self,
+                        sheet_name: str,
+                        df: pd.DataFrame,
+                        start_cell: str = "A1",
+                        mode: str = "overwrite",
+                        header: bool = True,
+                        start_row_n: int = 0,
+                        max_workers: int = 4,
+                        max_bytes: int = MAX_BATCH_UPDATE_BYTES,
+                        value_input_option: str = "USER_ENTERED",
+                        ) -> Union[GWriteReport, None]:
+        """Write a DataFrame by chunks of rows sized under max_bytes, several chunks being sent at once
+
+        Args:
+            sheet_name (str): the sheet name
+            df (pd.DataFrame): the DataFrame to write
+            start_cell (str="A1"): the top left cell in "overwrite" mode, the table to append to in "append" mode
+            mode (str="overwrite"): "overwrite" writes ranges from start_cell,
+                "append" adds the rows after the table found at start_cell with values.append
+            header (bool=True): write the columns names first, only in "overwrite" mode
+            start_row_n (int=0): the DataFrame position of the first row to write, used to resume a write
+            max_workers (int=4): the number of chunks sent at once
+            max_bytes (int=MAX_BATCH_UPDATE_BYTES): the estimated payload limit per request
+            value_input_option (str="USER_ENTERED"): "RAW" or "USER_ENTERED"
+
+        Returns: a GWriteReport, None if the arguments are invalid
+        """
+        # https://developers.google.com/sheets/api/reference/rest/v4/spreadsheets.values/append
+
+        # check that we have the rights to modify the GSheet
+        if AuthScope.SpreadSheet.value not in self.auth_scopes:
+            logger.info(f"{AuthScope.SpreadSheet.value} not in auth. scopes: "
+                        f"{self.auth_scopes}")
+            return None
+        if mode not in WRITE_MODES:
+            logger.info(f'mode: {mode} not in {WRITE_MODES}')
+            return None
+        if value_input_option not in VALUE_INPUT_OPTIONS:
+            logger.info(f'value_input_option: {value_input_option} not in {VALUE_INPUT_OPTIONS}')
+            return None
+
+        self._invalidate_sheet_caches(sheet_name)
+        write_report = GWriteReport()
+        write_report.next_row_n = start_row_n
+        started_at = time.perf_counter()
+
+        chunk_rows = _estimate_chunk_rows(df=df, max_bytes=max_bytes)
+        chunk_starts: List[int] = list(range(start_row_n, len(df), chunk_rows))
+        write_report.chunks_n = len(chunk_starts)
+        start_letters, start_row = split_cell(start_cell)
+        values_resource = self._get_sheet_resource("spreadsheets.values")
+
+        def failed_write() -> GWriteReport:
+            # where the rows start in the sheet is not known: the write has to be started again
+            write_report.failed_chunks_n += 1
+            write_report.next_start_cell = None
+            write_report.elapsed_seconds = time.perf_counter() - started_at
+            return write_report
+
+        try:
+            if mode == "overwrite" and header and start_row_n == 0:
+                self.execute_request(values_resource.update(
+                    spreadsheetId=self.spreadsheet_id,
+                    range=f"{sheet_name}!{start_letters}{start_row}",
+                    valueInputOption=value_input_option,
+                    body={'values': [[str(column) for column in df.columns]]}), quota_bucket='sheets_write')
+                start_row += 1
+            elif mode == "append" and chunk_starts:
+                # the first chunk finds the end of the table, the following ones are written after it
+                first_chunk_start = chunk_starts.pop(0)
+                result = self.execute_request(values_resource.append(
+                    spreadsheetId=self.spreadsheet_id,
+                    range=f"{sheet_name}!{start_letters}{start_row}",
+                    valueInputOption=value_input_option,
+                    insertDataOption="OVERWRITE",
+                    body={'values': _dataframe_to_values(df.iloc[first_chunk_start:first_chunk_start + chunk_rows])}
+                ), quota_bucket='sheets_write')
+                updates = result.get('updates', {})
+                if not updates.get('updatedRange'):
+                    logger.info(f'write_dataframe: no updatedRange in the append response of {sheet_name}: {result}')
+                    return failed_write()
+                _, appended_last_row = split_cell(updates['updatedRange'].rpartition(":")[2])
+                write_report.rows_written += updates.get('updatedRows', 0)
+                write_report.cells_updated += updates.get('updatedCells', 0)
+                write_report.next_row_n = min(first_chunk_start + chunk_rows, len(df))
+                # the sheet row of the DataFrame row start_row_n
+                start_row = appended_last_row + 1 - (write_report.next_row_n - start_row_n)
+        except HttpError as err:
+            logger.info(f'HttpError handled: {err}')
+            return failed_write()
+        except Exception as ex:
+            logger.error(f'Error with google_api_helpers. '
+                         f'With write_dataframe: {ex.__class__.__name__}. '
+                         f'Error is: {ex}')
+            return failed_write()
+
+        def write_chunk(chunk_start: int) -> Union[dict, None]:
+            # each thread uses its own service and transport, the scheduler keeps the chunks within the quota
+            try:
+                return self.execute_request(self._get_sheet_resource("spreadsheets.values").update(
+                    spreadsheetId=self.spreadsheet_id,
+                    range=f"{sheet_name}!{start_letters}{start_row + chunk_start - start_row_n}",
+                    valueInputOption=value_input_option,
+                    body={'values': _dataframe_to_values(df.iloc[chunk_start:chunk_start + chunk_rows])}
+                ), quota_bucket='sheets_write')
+            except HttpError as err:
+                logger.info(f'HttpError handled: {err}')
+                return None
+            except Exception as ex:
+                # i.e.: a lost connection, the chunk is failed and reported rather than raised by the executor
+                logger.error(f'Error with google_api_helpers. '
+                             f'With write_dataframe chunk {chunk_start}: {ex.__class__.__name__}. '
+                             f'Error is: {ex}')
+                return None
+
+        chunk_results: Dict[int, Union[dict, None]] = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            chunk_futures = {executor.submit(write_chunk, chunk_start): chunk_start for chunk_start in chunk_starts}
+            for chunk_future in as_completed(chunk_futures):
+                chunk_results[chunk_futures[chunk_future]] = chunk_future.result()
+
+        # resume point: after the last chunk of the contiguous run of successful chunks
+        resume_found: bool = False
+        for chunk_start in chunk_starts:
+            chunk_result = chunk_results[chunk_start]
+            if chunk_result is None:
+                write_report.failed_chunks_n += 1
+                resume_found = True
+                continue
+            write_report.rows_written += chunk_result.get('updatedRows', 0)
+            write_report.cells_updated += chunk_result.get('updatedCells', 0)
+            if not resume_found:
+                write_report.next_row_n = min(chunk_start + chunk_rows, len(df))
+
+        write_report.completed = write_report.failed_chunks_n == 0
+        write_report.next_start_cell = f"{start_letters}{start_row + write_report.next_row_n - start_row_n}"
+        write_report.elapsed_seconds = time.perf_counter() - started_at
+        logger.info(f'write_dataframe: {write_report}')
+        return write_report
+
     def clear_gsheet_range(self,
                            sheet_name: str,
                            sheet_range: Optional[str] = None,
@@ -156,17 +1174,17 @@ class GSheetHandler(GAuthHandler):
             sheet_range_addresses = f"{sheet_name}"
         else:
             sheet_range_addresses = f"{sheet_name}!{sheet_range}"
+        self._invalidate_sheet_caches(sheet_name, sheet_range=sheet_range)
 
         try:
-            service = discovery.build('sheets', 'v4', credentials=self.authorized_creds)
             clear_values_request_body = {
                 # TODO: Add desired entries to the request body.
             }
 
-            request = service.spreadsheets().values().clear(spreadsheetId=self.spreadsheet_id,
-                                                            range=sheet_range_addresses,
-                                                            body=clear_values_request_body)
-            response = request.execute()
+            request = self._get_sheet_resource("spreadsheets.values").clear(spreadsheetId=self.spreadsheet_id,
+                                                                            range=sheet_range_addresses,
+                                                                            body=clear_values_request_body)
+            response = self.execute_request(request, quota_bucket='sheets_write')
 
         except HttpError as err:
             logger.info(f'HttpError handled: {err}')
@@ -187,21 +1205,29 @@ class GSheetHandler(GAuthHandler):
             return None
 
         try:
-            service = discovery.build('sheets', 'v4', credentials=self.authorized_creds)
             spreadsheet = {
                 'properties': {
                     'title': spreadsheet_name
                 }
             }
-            spreadsheet = service.spreadsheets().create(body=spreadsheet,
-                                                        fields="spreadsheetId") \
-                .execute()
+            spreadsheet = self.execute_request(self._get_sheet_resource("spreadsheets").create(body=spreadsheet,
+                                                                                               fields="spreadsheetId"),
+                                               quota_bucket='sheets_write')
             logger.info(f"Spreadsheet ID: {(spreadsheet.get('spreadsheetId'))}")
             return spreadsheet.get('spreadsheetId')
         except HttpError as error:
             logger.error(f"An error occurred: {error}")
             return None
 
+    def batch(self) -> GSheetBatch:
+        """Return a batch queuing structural changes, sent as spreadsheets.batchUpdate calls when the with block exits
+
+            with gsheet.batch() as batch:
+                batch.add_sheet(sheet_name="2024-02")
+                batch.delete_sheet(sheet_name="2023-02")
+        """
+        return GSheetBatch(gsheet_handler=self)
+
     def create_new_sheet(self, sheet_name: str) -> Union[Dict, None]:
         """Create a new sheet on your spreadsheet using its spreadsheet_id"""
         # check that we have the rights to modify/Create the GSheet
@@ -212,7 +1238,6 @@ class GSheetHandler(GAuthHandler):
             return None
 
         try:
-            service = discovery.build('sheets', 'v4', credentials=self.authorized_creds)
             request = {
                 'addSheet': {
                     'properties': {
@@ -226,9 +1251,12 @@ class GSheetHandler(GAuthHandler):
             }
 
             # Execute the batch update request
-            response = service.spreadsheets().batchUpdate(
-                spreadsheetId=self.spreadsheet_id, body=batch_update_request).execute()
-            return response.get("replies")[0].get("addSheet").get("properties")
+            response = self.execute_request(self._get_sheet_resource("spreadsheets").batchUpdate(
+                spreadsheetId=self.spreadsheet_id, body=batch_update_request), quota_bucket='sheets_write')
+            sheet_properties = response.get("replies")[0].get("addSheet").get("properties")
+            if self._sheets_metadata_key is not None:
+                self._sheets_metadata[sheet_properties.get('title').upper()] = sheet_properties
+            return sheet_properties
         except HttpError as err:
             logger.info(f'HttpError handled: {err}')
             return None
@@ -244,14 +1272,10 @@ class GSheetHandler(GAuthHandler):
 
         # get sheet id
         if sheet_id == -1 and sheet_name is not None:
-            spreadsheet_desc = self.get_sheets_properties()
-
-            for sheet in spreadsheet_desc:
-                if sheet.get("title").upper() == sheet_name.upper():
-                    sheet_id = sheet.get("sheetId")
-            if sheet_id == -1:
+            sheet_id = self.get_sheet_id(sheet_name=sheet_name)
+            if sheet_id is None:
                 logger.info(f"Error {sheet_name} was not found in workbook sheets: "
-                            f"{spreadsheet_desc}")
+                            f"{list(self._sheets_metadata)}")
                 return None
 
         # Create a DeleteSheetRequest object
@@ -268,18 +1292,158 @@ class GSheetHandler(GAuthHandler):
 
         try:
             # Execute the batch update request to delete the sheet
-            service = discovery.build('sheets', 'v4', credentials=self.authorized_creds)
-
-            response = service.spreadsheets().batchUpdate(
-                spreadsheetId=self.spreadsheet_id, body=batch_update_request).execute()
+            response = self.execute_request(self._get_sheet_resource("spreadsheets").batchUpdate(
+                spreadsheetId=self.spreadsheet_id, body=batch_update_request), quota_bucket='sheets_write')
 
             logger.info('Sheet deleted successfully!')
+            self._remove_sheet_metadata(sheet_id=sheet_id)
+            if sheet_name is not None:
+                self._invalidate_sheet_caches(sheet_name)
             return response
 
         except HttpError as err:
             logger.info(f'HttpError handled: {err}')
             return None
 
+    def copy_sheet_to(self,
+                      dest_spreadsheet_id: str,
+                      sheet_name: str,
+                      new_sheet_name: Optional[str] = None,
+                      ) -> Union[Dict, None]:
+        """Copy a sheet, values and formats, to another spreadsheet with sheets.copyTo: the data stays server side
+
+        Args:
+            dest_spreadsheet_id (str): the destination spreadsheet
+            sheet_name (str): the sheet to copy
+            new_sheet_name (Optional[str]=None): the copy title, defaults to the API one: 'Copy of <sheet_name>'
+
+        Returns: the copied sheet properties in the destination spreadsheet, None if the copy failed:
+            a copy that could not be renamed is deleted
+        """
+        if AuthScope.SpreadSheet.value not in self.auth_scopes:
+            logger.info(f"{AuthScope.SpreadSheet.value} not in auth. scopes: "
+                        f"{self.auth_scopes}")
+            return None
+
+        sheet_id = self.get_sheet_id(sheet_name=sheet_name)
+        if sheet_id is None:
+            logger.info(f"Error {sheet_name} was not found in workbook sheets: "
+                        f"{list(self._sheets_metadata)}")
+            return None
+
+        sheets_resource = self._get_sheet_resource("spreadsheets")
+        try:
+            sheet_properties = self.execute_request(
+                self._get_sheet_resource("spreadsheets.sheets").copyTo(
+                    spreadsheetId=self.spreadsheet_id, sheetId=sheet_id,
+                    body={'destinationSpreadsheetId': dest_spreadsheet_id}),
+                quota_bucket='sheets_write')
+        except HttpError as err:
+            logger.info(f'HttpError handled: {err}')
+            return None
+
+        if new_sheet_name is not None:
+            try:
+                self.execute_request(sheets_resource.batchUpdate(
+                    spreadsheetId=dest_spreadsheet_id,
+                    body={'requests': [{'updateSheetProperties': {
+                        'properties': {'sheetId': sheet_properties.get('sheetId'), 'title': new_sheet_name},
+                        'fields': 'title'}}]}), quota_bucket='sheets_write')
+                sheet_properties['title'] = new_sheet_name
+            except HttpError as err:
+                logger.info(f'HttpError handled: {err}')
+                # the copy is not left behind under the API title
+                try:
+                    self.execute_request(sheets_resource.batchUpdate(
+                        spreadsheetId=dest_spreadsheet_id,
+                        body={'requests': [{'deleteSheet': {'sheetId': sheet_properties.get('sheetId')}}]}),
+                        quota_bucket='sheets_write')
+                except HttpError as delete_err:
+                    logger.error(f"Copied sheet {sheet_properties.get('title')} left in {dest_spreadsheet_id}, "
+                                 f"its deletion failed: {delete_err}")
+                sheet_properties = None
+
+        if dest_spreadsheet_id == self.spreadsheet_id:
+            self.invalidate_sheets_metadata()
+        return sheet_properties
+
+    def copy_sheet_to_many(self,
+                           dest_spreadsheet_ids: List[str],
+                           sheet_name: str,
+                           new_sheet_name: Optional[str] = None,
+                           max_workers: int = 4,
+                           ) -> Dict[str, Union[Dict, None]]:
+        """Copy a sheet to many spreadsheets, max_workers copies in flight within the scheduler quota
+
+        Returns: the copied sheet properties, None if the copy failed, keyed by destination spreadsheet
+        """
+        # resolve the sheet id once, before the threads look it up
+        if self.get_sheet_id(sheet_name=sheet_name) is None:
+            logger.info(f"Error {sheet_name} was not found in workbook sheets: "
+                        f"{list(self._sheets_metadata)}")
+            return {dest_spreadsheet_id: None for dest_spreadsheet_id in dest_spreadsheet_ids}
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            copy_futures = {dest_spreadsheet_id: executor.submit(self.copy_sheet_to,
+                                                                 dest_spreadsheet_id=dest_spreadsheet_id,
+                                                                 sheet_name=sheet_name,
+                                                                 new_sheet_name=new_sheet_name)
+                            for dest_spreadsheet_id in dest_spreadsheet_ids}
+        copied_sheets = {dest_spreadsheet_id: copy_future.result()
+                         for dest_spreadsheet_id, copy_future in copy_futures.items()}
+        copied_n = sum(sheet_properties is not None for sheet_properties in copied_sheets.values())
+        logger.info(f'{sheet_name} copied to {copied_n} of {len(dest_spreadsheet_ids)} spreadsheets')
+        return copied_sheets
+
+    def copy_range(self,
+                   source: Union[str, Tuple[str, str]],
+                   destination: Union[str, Tuple[str, str]],
+                   paste_type: str = "PASTE_NORMAL",
+                   ) -> bool:
+        """Copy a range onto another one of the spreadsheet with a copyPaste request: the data stays server side
+
+        Args:
+            source (Union[str, Tuple[str, str]]): 'sheet_name!A1:C10' or ('sheet_name', 'A1:C10')
+            destination (Union[str, Tuple[str, str]]): the destination range, a larger range repeats the source
+            paste_type (str="PASTE_NORMAL"): what is pasted, i.e.: "PASTE_VALUES", "PASTE_FORMAT"
+
+        Returns: True if the range has been copied
+        """
+        source_sheet_name, source_range = _split_sheet_range_address(source)
+        destination_sheet_name, destination_range = _split_sheet_range_address(destination)
+        with self.batch() as batch:
+            operation = batch.copy_paste(source_sheet_name=source_sheet_name, source_range=source_range,
+                                         destination_sheet_name=destination_sheet_name,
+                                         destination_range=destination_range,
+                                         paste_type=paste_type)
+        if not operation.succeeded:
+            logger.info(f'copy_range failed: {operation.error}')
+        return operation.succeeded
+
+    def move_range(self,
+                   source: Union[str, Tuple[str, str]],
+                   destination: Union[str, Tuple[str, str]],
+                   paste_type: str = "PASTE_NORMAL",
+                   ) -> bool:
+        """Move a range with a cutPaste request: the data stays server side and the source is cleared
+
+        Args:
+            source (Union[str, Tuple[str, str]]): 'sheet_name!A1:C10' or ('sheet_name', 'A1:C10')
+            destination (Union[str, Tuple[str, str]]): the top left cell of the destination, i.e.: 'sheet_name!E1'
+
+        Returns: True if the range has been moved
+        """
+        source_sheet_name, source_range = _split_sheet_range_address(source)
+        destination_sheet_name, destination_cell = _split_sheet_range_address(destination)
+        with self.batch() as batch:
+            operation = batch.cut_paste(source_sheet_name=source_sheet_name, source_range=source_range,
+                                        destination_sheet_name=destination_sheet_name,
+                                        destination_cell=destination_cell.partition(":")[0],
+                                        paste_type=paste_type)
+        if not operation.succeeded:
+            logger.info(f'move_range failed: {operation.error}')
+        return operation.succeeded
+
 
 if __name__ == '__main__':
     logging_config(log_file_name="g_sheet_helpers.log",
@@ -0,0 +1,357 @@
+"""Pooled keep-alive transports shared by all the handlers of a process
+
+httplib2, the googleapiclient default, opens a connection per service and per thread: every new thread or
+handler pays the TCP and TLS handshakes again. A pooled transport keeps the connections of each host alive in
+one pool, shared by the threads and handlers of the process whatever their credentials:
+    - "requests": a requests.Session over urllib3, pool_maxsize connections kept per host
+    - "httpx": an httpx.Client, HTTP/2 when the h2 package is installed
+
+    gsheet = GSheetHandler(auth_scopes=None, transport="requests")
+    gmail = GMailHandler(auth_scopes=None, transport="requests")  # reuses the same pool
+
+PooledHttp adapts a pool to the httplib2 interface googleapiclient calls, adding the credentials of the handler.
+Responses are gzip compressed: googleapiclient asks for it and both clients decode it.
+StreamingHttp reads the responses while they are downloaded, i.e.: GSheetHandler.read_gsheet_streamed.
+The pools raise the connection errors and timeouts of their client as ConnectionError and TimeoutError,
+the socket errors googleapiclient and the scheduler callers expect from httplib2.
+"""
+import importlib.util
+import io
+import logging
+import threading
+from abc import (ABC, abstractmethod)
+from contextlib import contextmanager
+from functools import partial
+from pathlib import Path
+from typing import (Optional, BinaryIO, Callable, ContextManager, Dict, Iterator, Tuple, Union)
+
+import httplib2
+from google.auth.transport.requests import Request
+
+logger = logging.getLogger(f"g_transport_helpers:{Path(__file__).name}")
+
+TRANSPORTS: Tuple[str, ...] = ("httplib2", "requests", "httpx")
+# connections kept alive per host
+POOL_MAXSIZE: int = 10
+TIMEOUT_SECONDS: float = 60.0
+# decoded bytes read at once from a streamed response
+STREAM_CHUNK_BYTES: int = 64 * 1024
+# credentials refreshes of the handlers sharing a pool
+_refresh_lock = threading.Lock()
+
+
+class GTransportPool(ABC):
+    """Connection pool shared by the handlers, thread-safe"""
+
+    def auth_request(self) -> Request:
+        """Return the google-auth transport refreshing the credentials"""
+        return Request()
+
+    @abstractmethod
+    def request(self, method: str, url: str,
+                body: Union[str, bytes, None] = None,
+                headers: Optional[Dict[str, str]] = None) -> Tuple[int, Dict[str, str], bytes]:
+        """Send a request, raise ConnectionError or TimeoutError when it could not be sent or answered
+
+        Returns: the status, the lower case headers and the decoded content of the response
+        """
+
+    @abstractmethod
+    def close(self):
+        """Close the connections of the pool"""
+
+    @contextmanager
+    def stream(self, method: str, url: str,
+               headers: Optional[Dict[str, str]] = None) -> Iterator[Tuple[int, Dict[str, str], BinaryIO]]:
+        """Send a request whose decoded content is read from a file object, within the context
+
+        The content is downloaded at once by this default, the pools read it from the connection as it is consumed
+
+        Returns: the status, the lower case headers and the content of the response
+        """
+        status, response_headers, content = self.request(method, url, headers=headers)
+        yield status, response_headers, io.BytesIO(content)
+
+
+class _ChunksStream(io.RawIOBase):
+    def __init__(self, chunks: Iterator[bytes], client_errors: Callable[[], ContextManager]):
+        """Readable file object over the decoded chunks of a streamed response
+
+        Args:
+            chunks (Iterator[bytes]): the chunks, read from the connection as they are consumed
+            client_errors (Callable[[], ContextManager]): raises the client errors as ConnectionError or TimeoutError
+        """
+        self._chunks: Iterator[bytes] = chunks
+        self._client_errors: Callable[[], ContextManager] = client_errors
+        self._pending: memoryview = memoryview(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._pending:
+            with self._client_errors():
+                chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._pending = memoryview(chunk)
+        read_n = min(len(buffer), len(self._pending))
+        buffer[:read_n] = self._pending[:read_n]
+        self._pending = self._pending[read_n:]
+        return read_n
+
+
+@contextmanager
+def _requests_errors(method: str, url: str):
+    import requests
+
+    try:
+        yield
+    except requests.Timeout as err:
+        raise TimeoutError(f"{method} {url}: {err}") from err
+    except (requests.ConnectionError, requests.exceptions.ChunkedEncodingError,
+            requests.exceptions.ContentDecodingError) as err:
+        raise ConnectionError(f"{method} {url}: {err}") from err
+
+
+@contextmanager
+def _httpx_errors(method: str, url: str):
+    import httpx
+
+    try:
+        yield
+    except httpx.TimeoutException as err:
+        raise TimeoutError(f"{method} {url}: {err}") from err
+    except (httpx.TransportError, httpx.DecodingError) as err:
+        raise ConnectionError(f"{method} {url}: {err}") from err
+
+
+class GRequestsTransportPool(GTransportPool):
+    def __init__(self, pool_maxsize: int = POOL_MAXSIZE,
+                 pool_connections: int = 10,
+                 timeout: float = TIMEOUT_SECONDS):
+        """Pool of a requests.Session
+
+        Args:
+            pool_maxsize (int=POOL_MAXSIZE): the connections kept alive per host, the requests in flight to
+                a host above it open connections that are closed after use
+            pool_connections (int=10): the hosts whose pools are kept
+            timeout (float=TIMEOUT_SECONDS): the connect and read timeout in seconds
+        """
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.pool_maxsize: int = pool_maxsize
+        self.timeout: float = timeout
+        self.session = requests.Session()
+        # googleapiclient retries through the scheduler, not in urllib3
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def auth_request(self) -> Request:
+        return Request(session=self.session)
+
+    def request(self, method: str, url: str,
+                body: Union[str, bytes, None] = None,
+                headers: Optional[Dict[str, str]] = None) -> Tuple[int, Dict[str, str], bytes]:
+        with _requests_errors(method, url):
+            response = self.session.request(method, url, data=body, headers=headers, timeout=self.timeout,
+                                            allow_redirects=True)
+        return response.status_code, {name.lower(): value for name, value in response.headers.items()}, \
+            response.content
+
+    @contextmanager
+    def stream(self, method: str, url: str,
+               headers: Optional[Dict[str, str]] = None) -> Iterator[Tuple[int, Dict[str, str], BinaryIO]]:
+        with _requests_errors(method, url):
+            response = self.session.request(method, url, headers=headers, timeout=self.timeout,
+                                            allow_redirects=True, stream=True)
+        try:
+            yield response.status_code, {name.lower(): value for name, value in response.headers.items()}, \
+                _ChunksStream(chunks=response.iter_content(chunk_size=STREAM_CHUNK_BYTES),
+                              client_errors=partial(_requests_errors, method, url))
+        finally:
+            response.close()
+
+    def close(self):
+        self.session.close()
+
+
+class GHttpxTransportPool(GTransportPool):
+    def __init__(self, pool_maxsize: int = POOL_MAXSIZE,
+                 http2: bool = True,
+                 timeout: float = TIMEOUT_SECONDS):
+        """Pool of an httpx.Client
+
+        Args:
+            pool_maxsize (int=POOL_MAXSIZE): the connections kept alive, HTTP/2 multiplexes the requests to
+                a host over one of them
+            http2 (bool=True): use HTTP/2 when the server allows it, requires the h2 package
+            timeout (float=TIMEOUT_SECONDS): the connect and read timeout in seconds
+        """
+        import httpx
+
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.info("h2 is not installed, using HTTP/1.1: pip install httpx[http2]")
+            http2 = False
+        self.pool_maxsize: int = pool_maxsize
+        self.http2: bool = http2
+        self.client = httpx.Client(http2=http2,
+                                   limits=httpx.Limits(max_connections=None,
+                                                       max_keepalive_connections=pool_maxsize),
+                                   timeout=timeout,
+                                   follow_redirects=True)
+
+    def request(self, method: str, url: str,
+                body: Union[str, bytes, None] = None,
+                headers: Optional[Dict[str, str]] = None) -> Tuple[int, Dict[str, str], bytes]:
+        with _httpx_errors(method, url):
+            response = self.client.request(method, url, content=body, headers=headers)
+        return response.status_code, {name.lower(): value for name, value in response.headers.items()}, \
+            response.content
+
+    @contextmanager
+    def stream(self, method: str, url: str,
+               headers: Optional[Dict[str, str]] = None) -> Iterator[Tuple[int, Dict[str, str], BinaryIO]]:
+        with _httpx_errors(method, url):
+            response = self.client.send(self.client.build_request(method, url, headers=headers), stream=True)
+        try:
+            yield response.status_code, {name.lower(): value for name, value in response.headers.items()}, \
+                _ChunksStream(chunks=response.iter_bytes(chunk_size=STREAM_CHUNK_BYTES),
+                              client_errors=partial(_httpx_errors, method, url))
+        finally:
+            response.close()
+
+    def close(self):
+        self.client.close()
+
+
+_transport_pools: Dict[str, GTransportPool] = {}
+_transport_pools_lock = threading.Lock()
+
+
+def get_transport_pool(transport: str) -> GTransportPool:
+    """Return the pool of the process for "requests" or "httpx", created on first use"""
+    transport_pool = _transport_pools.get(transport)
+    if transport_pool is None:
+        with _transport_pools_lock:
+            transport_pool = _transport_pools.get(transport)
+            if transport_pool is None:
+                if transport == "requests":
+                    transport_pool = GRequestsTransportPool()
+                elif transport == "httpx":
+                    transport_pool = GHttpxTransportPool()
+                else:
+                    raise ValueError(f"transport: {transport} not in {TRANSPORTS[1:]}")
+                _transport_pools[transport] = transport_pool
+    return transport_pool
+
+
+def set_transport_pool(transport: str, transport_pool: Optional[GTransportPool] = None):
+    """Replace the pool of the process for "requests" or "httpx", i.e.: with a larger pool_maxsize,
+    the previous pool is closed, a default one is created on next use if transport_pool is None
+    """
+    with _transport_pools_lock:
+        previous_pool = _transport_pools.pop(transport, None)
+        if transport_pool is not None:
+            _transport_pools[transport] = transport_pool
+    if previous_pool is not None and previous_pool is not transport_pool:
+        previous_pool.close()
+
+
+class PooledHttp:
+    def __init__(self, transport_pool: GTransportPool, credentials=None):
+        """httplib2.Http interface over a shared pool, as googleapiclient expects it
+
+        Args:
+            transport_pool (GTransportPool): the pool sending the requests
+            credentials: the google-auth credentials applied to the requests, refreshed when expired
+        """
+        self.transport_pool: GTransportPool = transport_pool
+        # read by googleapiclient to authorize the requests of a BatchHttpRequest
+        self.credentials = credentials
+
+    def _refresh_credentials(self):
+        with _refresh_lock:
+            # another thread may have refreshed them while this one waited
+            if not self.credentials.valid:
+                self.credentials.refresh(self.transport_pool.auth_request())
+
+    def request(self, uri: str, method: str = "GET",
+                body: Union[str, bytes, None] = None,
+                headers: Optional[Dict[str, str]] = None,
+                **kwargs) -> Tuple[httplib2.Response, bytes]:
+        """Send a request, the other httplib2 arguments (redirections, connection_type) are ignored"""
+        request_headers = dict(headers or {})
+        if self.credentials is not None:
+            if not self.credentials.valid:
+                self._refresh_credentials()
+            self.credentials.apply(request_headers)
+
+        status, response_headers, content = self.transport_pool.request(method, uri, body=body,
+                                                                         headers=request_headers)
+        if status == 401 and self.credentials is not None and getattr(self.credentials, "refresh_token", None):
+            # the token was revoked or expired early: refresh it once, as google_auth_httplib2 does
+            with _refresh_lock:
+                self.credentials.refresh(self.transport_pool.auth_request())
+            self.credentials.apply(request_headers)
+            status, response_headers, content = self.transport_pool.request(method, uri, body=body,
+                                                                             headers=request_headers)
+
+        # the content is already decoded, as httplib2 returns it
+        response_headers.pop("content-encoding", None)
+        response_headers["content-length"] = str(len(content))
+        response_headers["status"] = str(status)
+        return httplib2.Response(response_headers), content
+
+    @contextmanager
+    def stream(self, uri: str, method: str = "GET",
+               headers: Optional[Dict[str, str]] = None) -> Iterator[Tuple[httplib2.Response, BinaryIO]]:
+        """Send a request whose content is read from a file object as it is downloaded, see GTransportPool.stream"""
+        request_headers = dict(headers or {})
+        if self.credentials is not None:
+            if not self.credentials.valid:
+                self._refresh_credentials()
+            self.credentials.apply(request_headers)
+
+        with self.transport_pool.stream(method, uri, headers=request_headers) as (status, response_headers,
+                                                                                 content_stream):
+            response_headers.pop("content-encoding", None)
+            response_headers.pop("content-length", None)
+            response_headers["status"] = str(status)
+            yield httplib2.Response(response_headers), content_stream
+
+    def close(self):
+        # the pool is shared: it is closed by set_transport_pool only
+        pass
+
+
+class StreamingHttp:
+    def __init__(self, pooled_http: PooledHttp, read_stream: Callable[[BinaryIO], object]):
+        """httplib2.Http interface reading the successful responses with read_stream while they are downloaded
+
+        A googleapiclient request sent through it goes through the scheduler and the instrumentation as the others,
+        its postproc returning result:
+            request.http = streaming_http
+            request.postproc = lambda resp, content: streaming_http.result
+
+        Args:
+            pooled_http (PooledHttp): sends the requests with the credentials of the handler
+            read_stream (Callable[[BinaryIO], object]): reads the content, its value is kept in result
+        """
+        self.pooled_http: PooledHttp = pooled_http
+        self.credentials = pooled_http.credentials
+        self.read_stream: Callable[[BinaryIO], object] = read_stream
+        self.result: object = None
+
+    def request(self, uri: str, method: str = "GET",
+                body: Union[str, bytes, None] = None,
+                headers: Optional[Dict[str, str]] = None,
+                **kwargs) -> Tuple[httplib2.Response, bytes]:
+        """Send a request without body, the content of an error response is returned for its HttpError"""
+        with self.pooled_http.stream(uri, method=method, headers=headers) as (response, content_stream):
+            if response.status >= 300:
+                return response, content_stream.read()
+            self.result = self.read_stream(content_stream)
+        return response, b""
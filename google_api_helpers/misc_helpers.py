@@ -1,10 +1,29 @@
+import itertools
 import re
-from typing import List
+import string
+from typing import (List, Optional, Tuple, Dict, Union)
 
 import numpy as np
 
 
+# column letters up to 'ZZZ', the Sheets maximum being 18,278 columns
+MAX_COLUMNS: int = 18_278
+# number -> letters, index 0 is ''
+_COLUMN_LETTERS: List[str] = [""] + [
+    "".join(letters)
+    for letters_n in (1, 2, 3)
+    for letters in itertools.product(string.ascii_uppercase, repeat=letters_n)]
+_COLUMN_LETTERS_ARRAY: np.ndarray = np.array(_COLUMN_LETTERS)
+# letters -> number
+_COLUMN_NUMBERS: Dict[str, int] = {letters: column_n for column_n, letters in enumerate(_COLUMN_LETTERS)}
+
+_CELL_RE = re.compile(r'([a-zA-Z]{0,3})(\d*)')
+_UNQUOTED_SHEET_NAME_RE = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+
+
 def n2a(n):
+    if 0 <= n <= MAX_COLUMNS:
+        return _COLUMN_LETTERS[n]
     letters = ""
     while n > 0:
         n -= 1
@@ -14,22 +33,248 @@ def n2a(n):
 
 
 def a2n(a):
+    n = _COLUMN_NUMBERS.get(a.upper())
+    if n is not None:
+        return n
     n = 0
     for c in a:
         n = n * 26 + (ord(c.upper()) - 64)
     return n
 
 
-def build_sheet_range(range_values: List[List], start_cell: str = "A1", ):
-    letter_start, row_start = re.findall(r'[a-zA-Z]+|\d+', start_cell)
-    row_start = int(row_start)
+def split_cell(cell: str) -> Tuple[str, int]:
+    """Return the column letters and row number of an A1 cell, i.e.: 'B10' -> ('B', 10), 'B' -> ('B', 1)"""
+    letters, row = re.fullmatch(r'([a-zA-Z]*)(\d*)', cell.replace("$", "")).groups()
+    return letters.upper(), int(row) if row else 1
+
+
+def cells_to_a1(rows: Union[np.ndarray, List[int]], columns: Union[np.ndarray, List[int]]) -> np.ndarray:
+    """Return the A1 addresses of 1-based row and column numbers, without a Python loop
+
+    i.e.: ([1, 10], [1, 28]) -> ['A1', 'AB10']
+    """
+    return np.char.add(_COLUMN_LETTERS_ARRAY[np.asarray(columns)], np.asarray(rows).astype(str))
+
+
+class A1Range:
+    """A rectangular A1 range, rows and columns 1-based and inclusive, None for an open-ended side
+
+    i.e.: 'Sheet1!B2:C5' -> A1Range(2, 2, 5, 3, 'Sheet1'), 'A:C' -> A1Range(None, 1, None, 3)
+    """
+    __slots__ = ('start_row', 'start_column', 'end_row', 'end_column', 'sheet_name')
+
+    def __init__(self, start_row: Optional[int] = None,
+                 start_column: Optional[int] = None,
+                 end_row: Optional[int] = None,
+                 end_column: Optional[int] = None,
+                 sheet_name: Optional[str] = None):
+        self.start_row: Optional[int] = start_row
+        self.start_column: Optional[int] = start_column
+        self.end_row: Optional[int] = end_row
+        self.end_column: Optional[int] = end_column
+        self.sheet_name: Optional[str] = sheet_name
+
+    @classmethod
+    def parse(cls, sheet_range: str) -> "A1Range":
+        """Parse 'Sheet1!A1:C10', "'My sheet'!A:C", '2:5', 'B2' or a sheet name alone: the whole sheet
+
+        A sheet name alone that reads as cells, i.e.: 'Jan1' or 'FX', is parsed as cells, as the Sheets API does:
+        quote it, "'Jan1'", or give its cells, 'Jan1!A1:C10'
+        """
+        sheet_name, _, cells = sheet_range.rpartition("!")
+        if sheet_name.startswith("'") and sheet_name.endswith("'"):
+            sheet_name = sheet_name[1:-1].replace("''", "'")
+        start_cell, _, end_cell = cells.replace("$", "").partition(":")
+        start_match = _CELL_RE.fullmatch(start_cell)
+        end_match = _CELL_RE.fullmatch(end_cell) if end_cell else start_match
+        if start_match is None or end_match is None:
+            # column letters go up to 'ZZZ', anything else is a sheet name alone
+            if not sheet_name and cells.startswith("'") and cells.endswith("'"):
+                cells = cells[1:-1].replace("''", "'")
+            return cls(sheet_name=cells if not sheet_name else f"{sheet_name}!{cells}")
+        start_letters, start_row = start_match.groups()
+        end_letters, end_row = end_match.groups()
+        return cls(start_row=int(start_row) if start_row else None,
+                   start_column=_COLUMN_NUMBERS[start_letters.upper()] if start_letters else None,
+                   end_row=int(end_row) if end_row else None,
+                   end_column=_COLUMN_NUMBERS[end_letters.upper()] if end_letters else None,
+                   sheet_name=sheet_name or None)
+
+    @classmethod
+    def from_shape(cls, start_cell: str, rows_n: int, columns_n: int,
+                   sheet_name: Optional[str] = None) -> "A1Range":
+        """Return the range of rows_n x columns_n values written from start_cell"""
+        start_letters, start_row = split_cell(start_cell)
+        start_column = _COLUMN_NUMBERS[start_letters]
+        return cls(start_row=start_row, start_column=start_column,
+                   end_row=start_row + rows_n - 1, end_column=start_column + columns_n - 1,
+                   sheet_name=sheet_name)
+
+    @property
+    def rows_n(self) -> Optional[int]:
+        if self.start_row is None or self.end_row is None:
+            return None
+        return self.end_row - self.start_row + 1
+
+    @property
+    def columns_n(self) -> Optional[int]:
+        if self.start_column is None or self.end_column is None:
+            return None
+        return self.end_column - self.start_column + 1
+
+    @property
+    def cells_n(self) -> Optional[int]:
+        rows_n, columns_n = self.rows_n, self.columns_n
+        if rows_n is None or columns_n is None:
+            return None
+        return rows_n * columns_n
+
+    def _bounds(self) -> Tuple[int, int, float, float]:
+        # open-ended sides extend to the sheet limits
+        return (self.start_row or 1, self.start_column or 1,
+                self.end_row if self.end_row is not None else float("inf"),
+                self.end_column if self.end_column is not None else float("inf"))
+
+    def _from_bounds(self, start_row: int, start_column: int, end_row: float, end_column: float) -> "A1Range":
+        return A1Range(start_row=None if start_row == 1 and end_row == float("inf") else start_row,
+                       start_column=None if start_column == 1 and end_column == float("inf") else start_column,
+                       end_row=None if end_row == float("inf") else int(end_row),
+                       end_column=None if end_column == float("inf") else int(end_column),
+                       sheet_name=self.sheet_name)
+
+    def intersection(self, other: "A1Range") -> Optional["A1Range"]:
+        """Return the cells in both ranges, None if they do not overlap"""
+        if self.sheet_name != other.sheet_name:
+            return None
+        start_row, start_column, end_row, end_column = self._bounds()
+        other_start_row, other_start_column, other_end_row, other_end_column = other._bounds()
+        start_row, start_column = max(start_row, other_start_row), max(start_column, other_start_column)
+        end_row, end_column = min(end_row, other_end_row), min(end_column, other_end_column)
+        if start_row > end_row or start_column > end_column:
+            return None
+        return self._from_bounds(start_row, start_column, end_row, end_column)
+
+    def union(self, other: "A1Range") -> "A1Range":
+        """Return the smallest range holding both ranges"""
+        if self.sheet_name != other.sheet_name:
+            raise ValueError(f"Ranges of different sheets: {self.sheet_name}, {other.sheet_name}")
+        start_row, start_column, end_row, end_column = self._bounds()
+        other_start_row, other_start_column, other_end_row, other_end_column = other._bounds()
+        return self._from_bounds(min(start_row, other_start_row), min(start_column, other_start_column),
+                                 max(end_row, other_end_row), max(end_column, other_end_column))
+
+    def can_merge(self, other: "A1Range") -> bool:
+        """True if both ranges form a rectangle: same columns and touching rows, or same rows and touching columns"""
+        if self.sheet_name != other.sheet_name:
+            return False
+        start_row, start_column, end_row, end_column = self._bounds()
+        other_start_row, other_start_column, other_end_row, other_end_column = other._bounds()
+        if (start_column, end_column) == (other_start_column, other_end_column):
+            return start_row <= other_end_row + 1 and other_start_row <= end_row + 1
+        if (start_row, end_row) == (other_start_row, other_end_row):
+            return start_column <= other_end_column + 1 and other_start_column <= end_column + 1
+        return False
+
+    @staticmethod
+    def merge(ranges: List["A1Range"]) -> List["A1Range"]:
+        """Merge the ranges forming rectangles: vertical runs of the same columns, then horizontal runs"""
+        merged_ranges = list(ranges)
+        for sort_key in (lambda a1_range: (a1_range.sheet_name or "", a1_range._bounds()[1::2], a1_range._bounds()[0]),
+                         lambda a1_range: (a1_range.sheet_name or "", a1_range._bounds()[0::2], a1_range._bounds()[1])):
+            sorted_ranges = sorted(merged_ranges, key=sort_key)
+            merged_ranges = sorted_ranges[:1]
+            for a1_range in sorted_ranges[1:]:
+                if merged_ranges[-1].can_merge(a1_range):
+                    merged_ranges[-1] = merged_ranges[-1].union(a1_range)
+                else:
+                    merged_ranges.append(a1_range)
+        return merged_ranges
+
+    def split(self, max_cells: int) -> List["A1Range"]:
+        """Split a bounded range into ranges of at most max_cells cells: by rows, then by columns for wide rows"""
+        if self.cells_n is None:
+            raise ValueError(f"Open-ended range can not be split: {self}")
+        if self.cells_n <= max_cells:
+            return [self]
+        columns_step = min(self.columns_n, max_cells)
+        rows_step = max(1, max_cells // self.columns_n)
+        return [A1Range(start_row=start_row, start_column=start_column,
+                        end_row=min(start_row + rows_step - 1, self.end_row),
+                        end_column=min(start_column + columns_step - 1, self.end_column),
+                        sheet_name=self.sheet_name)
+                for start_row in range(self.start_row, self.end_row + 1, rows_step)
+                for start_column in range(self.start_column, self.end_column + 1, columns_step)]
+
+    def to_grid_range(self, sheet_id: int) -> dict:
+        """Return the Sheets API GridRange: zero-based, end indexes exclusive, open-ended sides left out"""
+        grid_range: dict = {'sheetId': sheet_id}
+        if self.start_row is not None:
+            grid_range['startRowIndex'] = self.start_row - 1
+        if self.end_row is not None:
+            grid_range['endRowIndex'] = self.end_row
+        if self.start_column is not None:
+            grid_range['startColumnIndex'] = self.start_column - 1
+        if self.end_column is not None:
+            grid_range['endColumnIndex'] = self.end_column
+        return grid_range
+
+    def to_a1(self, with_sheet_name: bool = True) -> str:
+        cells = (f"{_COLUMN_LETTERS[self.start_column or 0]}{'' if self.start_row is None else self.start_row}:"
+                 f"{_COLUMN_LETTERS[self.end_column or 0]}{'' if self.end_row is None else self.end_row}")
+        if cells == ":":
+            cells = ""
+        if not with_sheet_name or self.sheet_name is None:
+            return cells
+        sheet_name = self.sheet_name
+        if not _UNQUOTED_SHEET_NAME_RE.fullmatch(sheet_name) or _CELL_RE.fullmatch(sheet_name):
+            # quoted when it would read as cells, i.e.: 'Jan1'
+            sheet_name = "'" + sheet_name.replace("'", "''") + "'"
+        return f"{sheet_name}!{cells}" if cells else sheet_name
+
+    def __str__(self):
+        return self.to_a1()
+
+    def __repr__(self):
+        return f'A1Range("{self.to_a1()}")'
+
+    def __eq__(self, other):
+        if not isinstance(other, A1Range):
+            return NotImplemented
+        return (self.start_row, self.start_column, self.end_row, self.end_column, self.sheet_name) == \
+            (other.start_row, other.start_column, other.end_row, other.end_column, other.sheet_name)
+
+    def __hash__(self):
+        return hash((self.start_row, self.start_column, self.end_row, self.end_column, self.sheet_name))
+
+
+def build_sheet_range(range_values: List[List], start_cell: str = "A1", ) -> Optional[str]:
+    """Return the A1 range the values fill from start_cell, None if there are no values"""
+    # the shape is read from the lists themselves: the payload is not copied
+    rows_n = len(range_values)
+    columns_n = max((len(row_values) for row_values in range_values), default=0)
+    if rows_n == 0 or columns_n == 0:
+        return None
+    return A1Range.from_shape(start_cell=start_cell.upper(), rows_n=rows_n, columns_n=columns_n).to_a1()
+
+
+def range_dimensions(sheet_range: str) -> Tuple[Optional[int], Optional[int]]:
+    """Return the (rows, columns) count of an A1 range, None for an open-ended dimension
+
+    i.e.: 'Sheet1!A1:C10' -> (10, 3), 'A:C' -> (None, 3), '2:5' -> (4, None), 'Sheet1' -> (None, None)
+    """
+    a1_range = A1Range.parse(sheet_range)
+    return a1_range.rows_n, a1_range.columns_n
+
 
-    rows_n = np.array(range_values).shape[1]
-    columns_n = np.array(range_values).shape[1]
+def a1_to_grid_range(sheet_id: int, cells_range: Optional[str] = None) -> dict:
+    """Return the Sheets API GridRange of an A1 range without sheet name, the whole sheet if None
 
-    letter_end = n2a(a2n(letter_start) + columns_n - 1)
-    sheet_range = (str(start_cell) + str(f":{letter_end}{rows_n + int(row_start)}")).upper()
-    return sheet_range
+    Indexes are zero-based, end indexes exclusive, open-ended dimensions are left out
+    i.e.: (0, 'B2:C5') -> {'sheetId': 0, 'startRowIndex': 1, 'endRowIndex': 5, 'startColumnIndex': 1, 'endColumnIndex': 3}
+    """
+    if not cells_range:
+        return {'sheetId': sheet_id}
+    return A1Range.parse(cells_range).to_grid_range(sheet_id=sheet_id)
 
 
 if __name__ == '__main__':
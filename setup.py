@@ -12,6 +12,8 @@ setup(
                       "google-auth-httplib2",
                       "google-auth-oauthlib",
                       "oauth2client<4.0.0",
+                      "httpx",
+                      "requests",
                       "pandas",
                       "numpy",
                       "python-dotenv"
@@ -0,0 +1,106 @@
+import time
+from datetime import datetime
+
+from google_api_helpers.g_cache_helpers import (GReadCache, GMessageStore)
+
+
+def test_read_cache(tmp_path):
+    read_cache = GReadCache(cache_path=tmp_path / "read_cache.sqlite")
+    cache_key = ("spreadsheet_id", "Sheet1!A1:B2", "FORMATTED_VALUE", "SERIAL_NUMBER")
+    assert read_cache.get(cache_key=cache_key) is None
+    read_cache.put(cache_key=cache_key, sheet_name="Sheet1", range_values=[["a", 1]], drive_version="10")
+    assert read_cache.get(cache_key=cache_key, drive_version="10") == [["a", 1]]
+    # the spreadsheet changed since the values were cached
+    assert read_cache.get(cache_key=cache_key, drive_version="11") is None
+    assert read_cache.stats == {'hits': 1, 'misses': 1, 'stale': 1, 'version_checks': 0}
+    read_cache.close()
+
+
+def test_read_cache_ttl(tmp_path):
+    read_cache = GReadCache(cache_path=tmp_path / "read_cache.sqlite", ttl=0.05)
+    cache_key = ("spreadsheet_id", "Sheet1!A1:B2", "FORMATTED_VALUE", "SERIAL_NUMBER")
+    read_cache.put(cache_key=cache_key, sheet_name="Sheet1", range_values=[["a"]])
+    assert read_cache.get(cache_key=cache_key) == [["a"]]
+    time.sleep(0.06)
+    assert read_cache.get(cache_key=cache_key) is None
+
+
+def test_read_cache_invalidate(tmp_path):
+    read_cache = GReadCache(cache_path=tmp_path / "read_cache.sqlite")
+    cache_key = ("spreadsheet_id", "Sheet1!A1:B2", "FORMATTED_VALUE", "SERIAL_NUMBER")
+    other_cache_key = ("spreadsheet_id", "Sheet2!A1:B2", "FORMATTED_VALUE", "SERIAL_NUMBER")
+    read_cache.put(cache_key=cache_key, sheet_name="Sheet1", range_values=[["a"]])
+    read_cache.put(cache_key=other_cache_key, sheet_name="Sheet2", range_values=[["b"]])
+    read_cache.set_checked_version(spreadsheet_id="spreadsheet_id", drive_version="10")
+    assert read_cache.get_checked_version(spreadsheet_id="spreadsheet_id") == "10"
+    read_cache.invalidate(spreadsheet_id="spreadsheet_id", sheet_name="sheet1")
+    assert read_cache.get(cache_key=cache_key) is None
+    assert read_cache.get(cache_key=other_cache_key) == [["b"]]
+    assert read_cache.get_checked_version(spreadsheet_id="spreadsheet_id") is None
+
+
+def _message(message_n: int, label_ids: list) -> dict:
+    return {'id': f"{message_n:016x}", 'labelIds': label_ids,
+            'internalDate': str((1_700_000_000 + message_n * 3600) * 1000),
+            'payload': {'headers': [{'name': 'From',
+                                     'value': f"Sender {message_n % 2} <Sender{message_n % 2}@Mail.com>"}],
+                        'body': {'data': "x" * 1_000}}}
+
+
+def test_message_store(tmp_path):
+    message_store = GMessageStore(store_path=tmp_path / "message_store.sqlite")
+    message_store.put_many(user_id="me", messages=[_message(message_n, ['INBOX']) for message_n in range(4)])
+    assert message_store.get(user_id="me", msg_id=f"{1:016x}") == _message(1, ['INBOX'])
+    # a full message answers a metadata read
+    assert message_store.get(user_id="me", msg_id=f"{1:016x}", message_format="metadata") is not None
+    assert message_store.get(user_id="other", msg_id=f"{1:016x}") is None
+
+    assert message_store.query(user_id="me", sender="sender0@mail.com") == [f"{2:016x}", f"{0:016x}"]
+    assert message_store.query(user_id="me", date_from=datetime.fromtimestamp(1_700_000_000 + 3600)) == \
+        [f"{3:016x}", f"{2:016x}", f"{1:016x}"]
+    message_store.update_labels(user_id="me", msg_labels={f"{3:016x}": ['STARRED']})
+    assert message_store.query(user_id="me", label_id='INBOX', limit=2) == [f"{2:016x}", f"{1:016x}"]
+    message_store.delete(user_id="me", msg_ids=[f"{2:016x}"])
+    assert message_store.query(user_id="me", sender="sender0@mail.com") == [f"{0:016x}"]
+    message_store.close()
+
+
+def test_message_store_labels(tmp_path):
+    message_store = GMessageStore(store_path=tmp_path / "labels_message_store.sqlite")
+    message_store.put(user_id="me", message=_message(0, ['INBOX', 'UNREAD']))
+    # stored again once read and archived
+    message_store.put(user_id="me", message=_message(0, ['STARRED']))
+    assert message_store.query(user_id="me", label_id='INBOX') == []
+    assert message_store.query(user_id="me", label_id='UNREAD') == []
+    assert message_store.query(user_id="me", label_id='STARRED') == [f"{0:016x}"]
+    # relabelled without being read again
+    message_store.update_labels(user_id="me", msg_labels={f"{0:016x}": ['INBOX', 'IMPORTANT']})
+    assert message_store.get(user_id="me", msg_id=f"{0:016x}")['labelIds'] == ['INBOX', 'IMPORTANT']
+    message_store.update_labels(user_id="me", msg_labels={f"{0:016x}": []})
+    assert message_store.get(user_id="me", msg_id=f"{0:016x}")['labelIds'] == []
+    message_store.close()
+
+
+def test_message_store_eviction(tmp_path):
+    message_store = GMessageStore(store_path=tmp_path / "small_message_store.sqlite", max_bytes=1_000)
+    for message_n in range(20):
+        message_store.put(user_id="me", message=_message(message_n, ['INBOX']))
+        # read back: the first message is the most recently read
+        message_store.get(user_id="me", msg_id=f"{0:016x}")
+    assert message_store.size_bytes <= 1_000
+    assert message_store.stats['evictions'] > 0
+    assert message_store.get(user_id="me", msg_id=f"{0:016x}") is not None
+    assert message_store.get(user_id="me", msg_id=f"{1:016x}") is None
+
+
+if __name__ == '__main__':
+    from pathlib import Path
+    from tempfile import TemporaryDirectory
+
+    with TemporaryDirectory() as temp_folder:
+        test_read_cache(Path(temp_folder))
+        test_read_cache_ttl(Path(temp_folder))
+        test_read_cache_invalidate(Path(temp_folder))
+        test_message_store(Path(temp_folder))
+        test_message_store_labels(Path(temp_folder))
+        test_message_store_eviction(Path(temp_folder))
@@ -0,0 +1,81 @@
+import io
+import json
+
+import numpy as np
+import pytest
+
+from google_api_helpers.dataframe_helpers import (pad_rows, values_to_dataframe, columns_to_dataframe,
+                                                  read_values_stream)
+
+
+def test_pad_rows():
+    padded_values = pad_rows([['A', 'B', 'C'], ['D'], [], ['E', 'F']])
+    assert padded_values.shape == (4, 3)
+    assert padded_values.tolist() == [['A', 'B', 'C'], ['D', None, None], [None, None, None], ['E', 'F', None]]
+
+
+def test_unformatted_values_to_dataframe():
+    range_values = [['Date', 'Amount', 'Count', 'Paid', 'Name'],
+                    [45292, 10.5, 1, True, 'A'],
+                    [45293, 12, 2, False],
+                    [45294, '', 3]]
+    df = values_to_dataframe(range_values=range_values, header=True, typed=True, date_columns=['Date'])
+
+    assert list(df.columns) == ['Date', 'Amount', 'Count', 'Paid', 'Name']
+    assert str(df['Date'].iloc[0].date()) == '2024-01-01'
+    assert df['Amount'].dtype == np.float64 and np.isnan(df['Amount'].iloc[2])
+    assert df['Count'].dtype == np.int64
+    assert str(df['Paid'].dtype) == 'boolean'
+
+
+def test_formatted_values_to_dataframe():
+    range_values = [['1', 'TRUE', 'x'],
+                    ['2.5', 'false', '']]
+    df = values_to_dataframe(range_values=range_values, typed=True)
+
+    assert df[0].tolist() == [1.0, 2.5]
+    assert df[1].tolist() == [True, False]
+    assert df[2].tolist() == ['x', '']
+
+
+def test_typed_values_to_dataframe():
+    range_values = [['Code', 'Count', 'Amount', 'Date', 'Due'],
+                    ['007', '1', '1.5', '2024-01-31', '2024-02-29'],
+                    ['12', '2', '', '2024-02-01', 'soon'],
+                    ['', '', '3', '', '']]
+    df = values_to_dataframe(range_values=range_values, header=True, typed=True, date_columns=['Date', 'Due'])
+
+    # the leading zeros are kept
+    assert df['Code'].tolist() == ['007', '12', '']
+    # whole numbers are integers, Int64 with empty cells
+    assert str(df['Count'].dtype) == 'Int64' and df['Count'].tolist()[:2] == [1, 2]
+    assert df['Amount'].dtype == np.float64
+    assert str(df['Date'].iloc[0].date()) == '2024-01-31' and df['Date'].isna().iloc[2]
+    # a value that is not a date: the column is not converted
+    assert df['Due'].tolist() == ['2024-02-29', 'soon', '']
+
+
+def test_read_values_stream():
+    pytest.importorskip("ijson")
+    range_values = [['Date', 'Amount', 'Count', 'Name'],
+                    [45292, 10.5, 1, 'A'],
+                    [45293, 12, 'n/a'],
+                    [45294, '', 3, ''],
+                    []]
+    values_stream = io.BytesIO(json.dumps({'range': "Sheet1!A1:D5", 'values': range_values}).encode())
+    # chunks of 2 rows into buffers of 1 row: the buffers grow, Count is demoted from float64 to objects
+    header_values, columns = read_values_stream(values_stream=values_stream, rows_n=1, header=True,
+                                                numeric_columns=True, chunk_rows=2)
+    assert header_values == ['Date', 'Amount', 'Count', 'Name']
+    assert columns[0].dtype == np.float64 and columns[2].dtype == object
+
+    df = columns_to_dataframe(header_values=header_values, columns=columns, typed=True, date_columns=['Date'])
+    assert df.equals(values_to_dataframe(range_values=range_values, header=True, typed=True, date_columns=['Date']))
+
+
+if __name__ == '__main__':
+    test_pad_rows()
+    test_unformatted_values_to_dataframe()
+    test_formatted_values_to_dataframe()
+    test_typed_values_to_dataframe()
+    test_read_values_stream()
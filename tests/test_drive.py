@@ -0,0 +1,105 @@
+import io
+import json
+from urllib.parse import urlsplit
+
+import pandas as pd
+from google.oauth2.credentials import Credentials
+
+from google_api_helpers.g_drive_helpers import (GDriveHandler, read_export)
+from google_api_helpers.g_instrumentation_helpers import GInstrumentation
+from google_api_helpers.g_scheduler_helpers import GRequestScheduler
+from google_api_helpers.g_sheet_helpers import GSheetHandler, AuthScope
+from google_api_helpers.g_transport_helpers import GTransportPool
+
+
+class ExportTransportPool(GTransportPool):
+    """Answers the tab exports with export_content, after unavailable_n 503 answers, and the metadata of a 3x3
+    Sheet1 and its values.get
+    """
+
+    def __init__(self, export_content: bytes, range_values: list, unavailable_n: int = 0):
+        self.export_content: bytes = export_content
+        self.range_values: list = range_values
+        self.unavailable_n: int = unavailable_n
+        self.export_requests_n: int = 0
+
+    def request(self, method, url, body=None, headers=None):
+        url_path = urlsplit(url).path
+        if url_path.endswith("/export"):
+            self.export_requests_n += 1
+            if self.export_requests_n <= self.unavailable_n:
+                return 503, {'content-type': 'text/plain'}, b"Service unavailable"
+            return 200, {'content-type': 'text/csv'}, self.export_content
+        if "/values/" in url_path:
+            content = {'range': "Sheet1!A1:C3", 'majorDimension': "ROWS", 'values': self.range_values}
+        else:
+            content = {'sheets': [{'properties': {'sheetId': 0, 'title': "Sheet1", 'index': 0,
+                                                  'gridProperties': {'rowCount': 3, 'columnCount': 3}}}]}
+        return 200, {'content-type': 'application/json'}, json.dumps(content).encode()
+
+    def close(self):
+        pass
+
+
+def test_read_export():
+    export_file = io.BytesIO(b"Name,Amount\nA,1\nB,\n")
+    df = read_export(export_file=export_file, header=True)
+    assert list(df.columns) == ["Name", "Amount"]
+    assert df["Amount"].tolist() == ["1", ""]
+
+
+def test_read_export_typed():
+    export_file = io.BytesIO(b"A,1,0.5\nB,2,\n")
+    df = read_export(export_file=export_file, typed=True)
+    assert df.shape == (2, 3)
+    assert df[1].dtype == "int64"
+    assert df[2].dtype == "float64"
+
+
+def test_read_export_empty():
+    assert read_export(export_file=io.BytesIO(b"")).empty
+
+
+def test_export_sheet(tmp_path):
+    transport_pool = ExportTransportPool(export_content=b"Name,Amount\nA,1\n", range_values=[], unavailable_n=1)
+    call_events: list = []
+    gdrive = GDriveHandler(auth_scopes=[AuthScope.DriveReadOnly], credentials_folder_path=tmp_path,
+                           scheduler=GRequestScheduler(quota_buckets={}, base_delay=0.01),
+                           instrumentation=GInstrumentation(hooks=[call_events.append]),
+                           transport=transport_pool)
+    gdrive.authorized_creds = Credentials(token="token")
+
+    # retried through the scheduler, sent through the handler transport and instrumented
+    with gdrive.export_sheet(spreadsheet_id="spreadsheet_id", sheet_id=0) as export_file:
+        assert export_file.read() == b"Name,Amount\nA,1\n"
+    assert transport_pool.export_requests_n == 2
+    assert [call_event.method_id for call_event in call_events] == ["sheets.export"]
+    assert call_events[0].succeeded and call_events[0].retries == 1
+
+
+def test_read_full_sheet_empty_cells(tmp_path):
+    transport_pool = ExportTransportPool(export_content=b"Name,Amount,Note\nA,1,\nB,,x\n",
+                                         range_values=[["Name", "Amount", "Note"], ["A", "1"], ["B", "", "x"]])
+    gsheet = GSheetHandler(auth_scopes=[AuthScope.SpreadSheetReadOnly, AuthScope.DriveReadOnly],
+                           spreadsheet_id="spreadsheet_id", credentials_folder_path=tmp_path,
+                           scheduler=GRequestScheduler(quota_buckets={}, base_delay=0.01), transport=transport_pool)
+    gsheet.authorized_creds = Credentials(token="token")
+
+    values_df = gsheet.read_full_sheet(sheet_name="Sheet1", header=True)
+    export_df = gsheet.read_full_sheet(sheet_name="Sheet1", header=True, export_min_cells=1)
+    assert transport_pool.export_requests_n == 1
+    # the empty cells are None on both paths
+    pd.testing.assert_frame_equal(values_df, export_df)
+    assert values_df["Amount"].tolist() == ["1", None]
+    assert values_df["Note"].tolist() == [None, "x"]
+
+
+if __name__ == '__main__':
+    import tempfile
+    from pathlib import Path
+
+    test_read_export()
+    test_read_export_typed()
+    test_read_export_empty()
+    test_export_sheet(Path(tempfile.mkdtemp()))
+    test_read_full_sheet_empty_cells(Path(tempfile.mkdtemp()))
@@ -1,10 +1,51 @@
+import json
 from typing import Union
 from datetime import datetime, timedelta
-from google_api_helpers.g_mail_helpers import GMailHandler,GEmail
+from urllib.parse import (parse_qs, urlsplit)
+
+import pandas as pd
+from google.oauth2.credentials import Credentials
+
+from google_api_helpers.g_auth_helpers import AuthScope
+from google_api_helpers.g_mail_helpers import (GMailHandler, GEmail, GMailChanges, _compact_history,
+                                               parse_mail_dates)
+from google_api_helpers.g_service_helpers import build_service
+from google_api_helpers.g_transport_helpers import GTransportPool
 
 messages: Union[list, None] = None
 
 
+class PagingTransportPool(GTransportPool):
+    """Answers messages.list with pages of maxResults messages out of messages_n, recording the queries
+
+    The page starting at failed_page_start is answered with a 403 error
+    """
+
+    def __init__(self, messages_n: int, failed_page_start: Union[int, None] = None):
+        self.messages_n: int = messages_n
+        self.failed_page_start: Union[int, None] = failed_page_start
+        self.queries: list = []
+
+    def request(self, method, url, body=None, headers=None):
+        if urlsplit(url).path.endswith("/profile"):
+            return 200, {'content-type': 'application/json'}, json.dumps({'historyId': "100"}).encode()
+        query = {name: values[0] for name, values in parse_qs(urlsplit(url).query).items()}
+        self.queries.append(query)
+        page_start = int(query.get('pageToken', 0))
+        if page_start == self.failed_page_start:
+            error = {'error': {'code': 403, 'message': "Forbidden"}}
+            return 403, {'content-type': 'application/json'}, json.dumps(error).encode()
+        page_end = min(page_start + int(query['maxResults']), self.messages_n)
+        page = {'messages': [{'id': str(message_n), 'threadId': str(message_n)}
+                             for message_n in range(page_start, page_end)]}
+        if page_end < self.messages_n:
+            page['nextPageToken'] = str(page_end)
+        return 200, {'content-type': 'application/json'}, json.dumps(page).encode()
+
+    def close(self):
+        pass
+
+
 def test_get_msg_ids():
     global messages
     gmail = GMailHandler()
@@ -21,6 +62,104 @@ def test_read_message():
     assert len(message.body_text) > 0 and len(message.body_html) > 0
 
 
+def test_read_messages():
+    global messages
+    test_get_msg_ids()
+
+    gmail = GMailHandler()
+    g_emails = list(gmail.read_messages(msg_ids=messages[:10], message_format="metadata"))
+    assert [g_email.msg_id for g_email in g_emails] == [message.get('id') for message in messages[:10]]
+    assert all(g_email.body_text is None for g_email in g_emails)
+
+
+def test_iter_message_ids(tmp_path):
+    transport_pool = PagingTransportPool(messages_n=1_200)
+    gmail = GMailHandler(auth_scopes=[AuthScope.GmailReadOnly], credentials_folder_path=tmp_path,
+                         transport=transport_pool)
+    gmail.authorized_creds = Credentials(token="token")
+
+    message_ids = gmail.get_message_ids(date_from=datetime(2024, 1, 1), date_to=datetime(2024, 2, 1))
+    assert [message['id'] for message in message_ids] == [str(message_n) for message_n in range(1_200)]
+    # the query is sent with every page
+    assert [query['maxResults'] for query in transport_pool.queries] == ['500', '500', '500']
+    assert all(query['q'] == "after:2024/01/01 before:2024/02/01" for query in transport_pool.queries)
+
+    transport_pool.queries.clear()
+    assert len(list(gmail.iter_message_ids(query="from:me", limit=600, prefetch=False))) == 600
+    assert [query['maxResults'] for query in transport_pool.queries] == ['500', '100']
+
+
+def test_gmail_service(tmp_path):
+    gmail = GMailHandler(auth_scopes=[AuthScope.GmailReadOnly], credentials_folder_path=tmp_path)
+    gmail.authorized_creds = Credentials(token="token")
+    shared_service = gmail.gmail_service
+    assert gmail.gmail_service is shared_service
+
+    # assigned as the attribute it was
+    other_service = build_service(api_name="gmail", api_version="v1", credentials=Credentials(token="other"))
+    gmail.gmail_service = other_service
+    assert gmail.gmail_service is other_service
+    gmail.gmail_service = None
+    assert gmail.gmail_service is shared_service
+
+
+def test_sync_changes_full_resync(tmp_path):
+    transport_pool = PagingTransportPool(messages_n=1_200, failed_page_start=500)
+    gmail = GMailHandler(auth_scopes=[AuthScope.GmailReadOnly], credentials_folder_path=tmp_path,
+                         transport=transport_pool)
+    gmail.authorized_creds = Credentials(token="token")
+    checkpoint_path = tmp_path / "g_mail_sync.json"
+
+    # a failed page: the messages after it would be missed, the checkpoint is not saved
+    assert gmail.sync_changes(checkpoint_path=checkpoint_path, label_id="Label_123") is None
+    assert not checkpoint_path.exists()
+    assert transport_pool.queries[0]['labelIds'] == "Label_123"
+    assert "label:" not in transport_pool.queries[0]['q']
+
+    transport_pool.failed_page_start = None
+    changes = gmail.sync_changes(checkpoint_path=checkpoint_path, label_id="Label_123")
+    assert changes.full_resync and len(changes.added) == 1_200
+    assert json.loads(checkpoint_path.read_text())['historyId'] == "100"
+
+
+def test_compact_history():
+    def message(msg_id: str, label_ids: Union[list, None] = None) -> dict:
+        return {'message': {'id': msg_id, 'labelIds': label_ids or []}}
+
+    history_records = [{'messagesAdded': [message('a'), message('b')]},
+                       {'labelsAdded': [dict(message('b', ['INBOX', 'STARRED']), labelIds=['STARRED'])],
+                        'labelsRemoved': [dict(message('c', []), labelIds=['INBOX'])]},
+                       {'messagesDeleted': [message('a'), message('d')]},
+                       {'labelsAdded': [dict(message('e', ['UNREAD']), labelIds=['UNREAD'])]},
+                       {'labelsRemoved': [dict(message('e', []), labelIds=['UNREAD'])]}]
+    changes = GMailChanges(history_id="1")
+    _compact_history(history_records=history_records, changes=changes)
+    assert changes.added == ['b']
+    assert changes.deleted == ['a', 'd']
+    # the labels after the last change
+    assert changes.relabelled == {'c': [], 'e': []}
+
+
+def test_parse_mail_dates():
+    dates = pd.Series(["Tue, 03 Oct 2023 09:15:00 +0200", "Tue, 3 Oct 2023 09:15:00 +0000 (UTC)",
+                       "3 Oct 2023 09:15 -0500", "Tue, 03 Oct 2023 09:15:00 GMT", None, "", "not a date"])
+    received_dates = parse_mail_dates(dates)
+    assert str(received_dates.dtype).endswith(", UTC]")
+    # the last 2 were parsed by email.utils
+    assert [str(received_date) for received_date in received_dates[:4]] == \
+        ["2023-10-03 07:15:00+00:00", "2023-10-03 09:15:00+00:00",
+         "2023-10-03 14:15:00+00:00", "2023-10-03 09:15:00+00:00"]
+    assert received_dates[4:].isna().all()
+
+
+def test_list_message_headers():
+    gmail = GMailHandler()
+    df = gmail.list_message_headers(query="in:inbox", limit=10)
+    assert len(df) <= 10
+    assert list(df.columns) == ['id', 'thread_id', 'label_ids', 'internal_date', 'From', 'Subject', 'Date',
+                                'received_date']
+
+
 def test_read_message_metadata():
     global messages
     test_get_msg_ids()
@@ -31,6 +170,16 @@ def test_read_message_metadata():
 
 
 if __name__ == '__main__':
+    import tempfile
+    from pathlib import Path
+
     test_get_msg_ids()
     test_read_message()
     test_read_message()
+    test_read_messages()
+    test_iter_message_ids(Path(tempfile.mkdtemp()))
+    test_gmail_service(Path(tempfile.mkdtemp()))
+    test_sync_changes_full_resync(Path(tempfile.mkdtemp()))
+    test_compact_history()
+    test_parse_mail_dates()
+    test_list_message_headers()
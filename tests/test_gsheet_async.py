@@ -0,0 +1,32 @@
+import asyncio
+
+import pandas as pd
+
+from google_api_helpers.g_sheet_async_helpers import (AsyncGSheetHandler, AuthScope)
+
+
+def test_async_reader():
+    async def read_gsheet():
+        async with AsyncGSheetHandler(auth_scopes=[AuthScope.SpreadSheet]) as gsheet:
+            return await asyncio.gather(gsheet.read_gsheet(sheet_name="Sheet1", sheet_range='A1:G10'),
+                                        gsheet.read_gsheet(sheet_name="Sheet1", sheet_range='A1:G10',
+                                                           as_dataframe=False))
+
+    result_df, result_list = asyncio.run(read_gsheet())
+    assert isinstance(result_df, pd.DataFrame)
+    assert isinstance(result_list, list)
+
+
+def test_async_writer_batch():
+    async def update_gsheets_batch():
+        async with AsyncGSheetHandler(auth_scopes=[AuthScope.SpreadSheet]) as gsheet:
+            return await gsheet.update_gsheets_batch(ranges_values={"Sheet1!A1:B2": [['A', 'B'],
+                                                                                     ['C', 'D']]})
+
+    result = asyncio.run(update_gsheets_batch())
+    assert result['totalUpdatedCells'] == 4
+
+
+if __name__ == '__main__':
+    test_async_reader()
+    test_async_writer_batch()
@@ -1,4 +1,47 @@
+import json
+from urllib.parse import urlsplit
+
+import numpy as np
+from google.oauth2.credentials import Credentials
+
+from google_api_helpers.g_sheet_batch_helpers import GSheetBatch
 from google_api_helpers.g_sheet_helpers import (GSheetHandler, AuthScope)
+from google_api_helpers.g_transport_helpers import GTransportPool
+
+
+class BatchTransportPool(GTransportPool):
+    """Answers spreadsheets.get with Sheet1, sheets.copyTo with a 'Copy of Sheet1' and batchUpdate with empty
+    replies, an error for the failed_calls_n first calls, recording the batchUpdate requests
+    """
+
+    def __init__(self, failed_calls_n: int = 0):
+        self.failed_calls_n: int = failed_calls_n
+        self.batch_requests: list = []
+
+    def request(self, method, url, body=None, headers=None):
+        if urlsplit(url).path.endswith(":copyTo"):
+            content = {'sheetId': 42, 'title': "Copy of Sheet1", 'index': 1}
+            return 200, {'content-type': 'application/json'}, json.dumps(content).encode()
+        if not urlsplit(url).path.endswith(":batchUpdate"):
+            content = {'sheets': [{'properties': {'sheetId': 0, 'title': "Sheet1", 'index': 0}}]}
+            return 200, {'content-type': 'application/json'}, json.dumps(content).encode()
+        requests = json.loads(body)['requests']
+        self.batch_requests.append(requests)
+        if len(self.batch_requests) <= self.failed_calls_n:
+            error = {'error': {'code': 400, 'message': "Invalid requests"}}
+            return 400, {'content-type': 'application/json'}, json.dumps(error).encode()
+        content = {'replies': [{} for _ in requests]}
+        return 200, {'content-type': 'application/json'}, json.dumps(content).encode()
+
+    def close(self):
+        pass
+
+
+def _offline_gsheet(transport_pool: GTransportPool, tmp_path) -> GSheetHandler:
+    gsheet = GSheetHandler(auth_scopes=[AuthScope.SpreadSheet], spreadsheet_id="spreadsheet_id",
+                           credentials_folder_path=tmp_path, transport=transport_pool)
+    gsheet.authorized_creds = Credentials(token="token")
+    return gsheet
 
 
 def test_new_sheet():
@@ -19,6 +62,80 @@ def test_delete_sheet():
     assert spreadsheet is not None
 
 
+def test_batch():
+    gsheet = GSheetHandler(auth_scopes=[AuthScope.SpreadSheet],
+                           spreadsheet_id=None)
+    with gsheet.batch() as batch:
+        new_sheet = batch.add_sheet(sheet_name="TestSheet2")
+        renamed_sheet = batch.rename_sheet(sheet_name="TestSheet2", new_sheet_name="TestSheet3")
+        deleted_sheet = batch.delete_sheet(sheet_name="TestSheet3")
+        missing_sheet = batch.clear(sheet_name="TestSheet2")
+
+    assert new_sheet.reply.get("addSheet").get("properties").get("title") == "TestSheet2"
+    assert renamed_sheet.succeeded and deleted_sheet.succeeded
+    assert missing_sheet.error is not None
+
+
+def test_batch_failed_add_sheet(tmp_path):
+    transport_pool = BatchTransportPool(failed_calls_n=1)
+    gsheet = _offline_gsheet(transport_pool=transport_pool, tmp_path=tmp_path)
+    # a call per operation: the calls after the failed addSheet
+    with GSheetBatch(gsheet_handler=gsheet, max_batch_requests=1) as batch:
+        new_sheet = batch.add_sheet(sheet_name="TestSheet2")
+        new_sheet_clear = batch.clear(sheet_name="TestSheet2")
+        sheet_clear = batch.clear(sheet_name="Sheet1")
+
+    assert new_sheet.error is not None and new_sheet_clear.error.startswith("Not sent")
+    assert sheet_clear.succeeded
+    assert len(transport_pool.batch_requests) == 2
+
+
+def test_batch_rename_caches(tmp_path):
+    gsheet = _offline_gsheet(transport_pool=BatchTransportPool(), tmp_path=tmp_path)
+    gsheet._sync_snapshots[("Sheet1", "A1")] = np.array([["a"]], dtype=object)
+    with gsheet.batch() as batch:
+        batch.rename_sheet(sheet_name="Sheet1", new_sheet_name="Renamed")
+    # a sheet later named Sheet1 is not diffed against the snapshot of the renamed one
+    assert not gsheet._sync_snapshots
+
+
+def test_copy_sheet_failed_rename(tmp_path):
+    transport_pool = BatchTransportPool(failed_calls_n=1)
+    gsheet = _offline_gsheet(transport_pool=transport_pool, tmp_path=tmp_path)
+
+    # the copy is renamed, which fails: it is deleted rather than left as 'Copy of Sheet1'
+    assert gsheet.copy_sheet_to(dest_spreadsheet_id="dest_spreadsheet_id", sheet_name="Sheet1",
+                                new_sheet_name="Sheet2") is None
+    assert transport_pool.batch_requests[1] == [{'deleteSheet': {'sheetId': 42}}]
+
+    assert gsheet.copy_sheet_to(dest_spreadsheet_id="dest_spreadsheet_id", sheet_name="Sheet1",
+                                new_sheet_name="Sheet2") == {'sheetId': 42, 'title': "Sheet2", 'index': 1}
+
+
+def test_copy_move_range():
+    gsheet = GSheetHandler(auth_scopes=[AuthScope.SpreadSheet],
+                           spreadsheet_id=None)
+    gsheet.create_new_sheet(sheet_name="TestSheet4")
+    gsheet.update_gsheet(sheet_name="TestSheet4", sheet_new_values=[[1, 2], [3, 4]], sheet_start_cell="A1")
+    assert gsheet.copy_range(source="TestSheet4!A1:B2", destination=("TestSheet4", "D1:E2"))
+    assert gsheet.move_range(source="TestSheet4!D1:E2", destination="TestSheet4!G1")
+    assert gsheet.read_gsheet(sheet_name="TestSheet4", sheet_range="G1:H2", as_dataframe=False) == [['1', '2'],
+                                                                                                   ['3', '4']]
+    copied_sheet = gsheet.copy_sheet_to(dest_spreadsheet_id=gsheet.spreadsheet_id, sheet_name="TestSheet4",
+                                        new_sheet_name="TestSheet5")
+    assert copied_sheet.get("title") == "TestSheet5"
+    gsheet.delete_sheet(sheet_name="TestSheet5")
+    gsheet.delete_sheet(sheet_name="TestSheet4")
+
+
 if __name__ == '__main__':
+    import tempfile
+    from pathlib import Path
+
     test_new_sheet()
     test_delete_sheet()
+    test_batch()
+    test_batch_failed_add_sheet(Path(tempfile.mkdtemp()))
+    test_batch_rename_caches(Path(tempfile.mkdtemp()))
+    test_copy_sheet_failed_rename(Path(tempfile.mkdtemp()))
+    test_copy_move_range()
@@ -1,6 +1,71 @@
+import json
+from typing import Union
+from urllib.parse import (unquote, urlsplit)
+
 import pandas as pd
+import pytest
+from google.oauth2.credentials import Credentials
+
+from google_api_helpers.g_sheet_helpers import (GSheetHandler, AuthScope, _split_batch_get_ranges,
+                                                _infer_chunk_dtypes, _cast_chunk)
+from google_api_helpers.g_instrumentation_helpers import GInstrumentation
+from google_api_helpers.g_transport_helpers import GTransportPool
+from google_api_helpers.misc_helpers import A1Range
+
+
+class SparseSheetTransportPool(GTransportPool):
+    """Answers the metadata of a 1000x26 Sheet1 and its values.get with its data, trimmed as the API does,
+    recording the ranges read
+
+    The values responses are cut after truncated_bytes_n bytes when set
+    """
+
+    def __init__(self, range_values: list, truncated_bytes_n: Union[int, None] = None):
+        self.range_values: list = range_values
+        self.truncated_bytes_n: Union[int, None] = truncated_bytes_n
+        self.ranges: list = []
+
+    def request(self, method, url, body=None, headers=None):
+        url_path = unquote(urlsplit(url).path)
+        if "/values/" not in url_path:
+            result = {'sheets': [{'properties': {'sheetId': 0, 'title': "Sheet1", 'index': 0,
+                                                 'gridProperties': {'rowCount': 1000, 'columnCount': 26}}}]}
+            return 200, {'content-type': 'application/json'}, json.dumps(result).encode()
+        self.ranges.append(url_path.rpartition("/values/")[2])
+        result = {'range': self.ranges[-1], 'majorDimension': "ROWS", 'values': self.range_values}
+        return 200, {'content-type': 'application/json'}, json.dumps(result).encode()[:self.truncated_bytes_n]
 
-from google_api_helpers.g_sheet_helpers import (GSheetHandler, AuthScope)
+    def close(self):
+        pass
+
+
+class RowsTransportPool(GTransportPool):
+    """Answers the metadata of a Sheet1 of sheet_values rows and 2 columns and the values.get of its row windows,
+    trailing blank rows and cells left out as the API does, recording the ranges read
+    """
+
+    def __init__(self, sheet_values: list):
+        self.sheet_values: list = sheet_values
+        self.ranges: list = []
+
+    def request(self, method, url, body=None, headers=None):
+        url_path = unquote(urlsplit(url).path)
+        if "/values/" not in url_path:
+            result = {'sheets': [{'properties': {'sheetId': 0, 'title': "Sheet1", 'index': 0,
+                                                 'gridProperties': {'rowCount': len(self.sheet_values),
+                                                                    'columnCount': 2}}}]}
+            return 200, {'content-type': 'application/json'}, json.dumps(result).encode()
+        self.ranges.append(url_path.rpartition("/values/")[2])
+        a1_range = A1Range.parse(self.ranges[-1])
+        range_values = [row_values[a1_range.start_column - 1:a1_range.end_column]
+                        for row_values in self.sheet_values[a1_range.start_row - 1:a1_range.end_row]]
+        while range_values and not any(range_values[-1]):
+            range_values.pop()
+        result = {'range': self.ranges[-1], 'majorDimension': "ROWS", 'values': range_values}
+        return 200, {'content-type': 'application/json'}, json.dumps(result).encode()
+
+    def close(self):
+        pass
 
 
 def test_reader():
@@ -25,6 +90,134 @@ def test_reader_as_dataframe():
     assert isinstance(result, pd.DataFrame)
 
 
+def test_reader_typed_dataframe():
+    gsheet = GSheetHandler(auth_scopes=[AuthScope.SpreadSheet])
+
+    result = gsheet.read_gsheet(sheet_name="Sheet1",
+                                sheet_range='A1:G10',
+                                value_render_option="UNFORMATTED_VALUE",
+                                header=True,
+                                typed=True)
+    assert isinstance(result, pd.DataFrame)
+
+
+def test_reader_used_range():
+    gsheet = GSheetHandler(auth_scopes=[AuthScope.SpreadSheet])
+
+    result = gsheet.read_gsheet(sheet_name="Sheet1", as_dataframe=False)
+    # the extent is narrowed to the values read and cached
+    rows_n, columns_n = gsheet.get_used_extent(sheet_name="Sheet1")
+    assert len(result) == rows_n
+    assert max(len(row) for row in result) == columns_n
+
+
+def test_reader_used_range_sparse(tmp_path):
+    # no value in column A below the header, no header over column C
+    range_values = [["Date", "Amount"], ["", "1", "x"], [], ["", "", "", "4"]]
+    transport_pool = SparseSheetTransportPool(range_values=range_values)
+    gsheet = GSheetHandler(auth_scopes=[AuthScope.SpreadSheetReadOnly], spreadsheet_id="spreadsheet_id",
+                           credentials_folder_path=tmp_path, transport=transport_pool)
+    gsheet.authorized_creds = Credentials(token="token")
+
+    # sized from the grid, without reading values
+    assert gsheet.get_used_extent(sheet_name="Sheet1") == (1000, 26)
+    assert transport_pool.ranges == []
+    # one bounded read, which narrows the extent to the data returned
+    assert gsheet.read_gsheet(sheet_name="Sheet1", as_dataframe=False) == range_values
+    assert transport_pool.ranges == ["Sheet1!A1:Z1000"]
+    assert gsheet.get_used_extent(sheet_name="Sheet1") == (4, 4)
+    assert gsheet.read_gsheet(sheet_name="Sheet1", as_dataframe=False) == range_values
+    assert transport_pool.ranges == ["Sheet1!A1:Z1000", "Sheet1!A1:D4"]
+
+
+def test_reader_streamed(tmp_path):
+    pytest.importorskip("ijson")
+    transport_pool = SparseSheetTransportPool(range_values=[["Name", "Amount"], ["a", 1], ["b", 2.5]])
+    call_events: list = []
+    gsheet = GSheetHandler(auth_scopes=[AuthScope.SpreadSheetReadOnly], spreadsheet_id="spreadsheet_id",
+                           credentials_folder_path=tmp_path, transport=transport_pool,
+                           instrumentation=GInstrumentation(hooks=[call_events.append]))
+    gsheet.authorized_creds = Credentials(token="token")
+
+    df = gsheet.read_gsheet_streamed(sheet_name="Sheet1", sheet_range="A1:B3", header=True, typed=True)
+    assert df['Amount'].tolist() == [1.0, 2.5]
+    # sent through the handler transport pool and instrumented
+    assert "Sheet1!A1:B3" in transport_pool.ranges
+    assert any(call_event.method_id == "sheets.spreadsheets.values.get" and call_event.succeeded
+               for call_event in call_events)
+
+    # a truncated response
+    transport_pool.truncated_bytes_n = 80
+    call_events.clear()
+    assert gsheet.read_gsheet_streamed(sheet_name="Sheet1", sheet_range="A1:B3", header=True) is None
+    assert any(call_event.method_id == "sheets.spreadsheets.values.get" and not call_event.succeeded
+               for call_event in call_events)
+
+
+def test_reader_batch():
+    gsheet = GSheetHandler(auth_scopes=[AuthScope.SpreadSheet])
+    sheet_ranges = ["Sheet1!A1:G10", ("Sheet1", "A2:B3")]
+
+    result = gsheet.read_gsheets_batch(sheet_ranges=sheet_ranges,
+                                       as_dataframe=True)
+    assert list(result.keys()) == sheet_ranges
+    assert all(isinstance(range_values, pd.DataFrame) for range_values in result.values())
+
+
+def test_split_batch_get_ranges():
+    range_addresses = [f"Sheet1!A{row_n}:J{row_n + 9}" for row_n in range(1, 101, 10)]
+
+    assert _split_batch_get_ranges(range_addresses=range_addresses) == [range_addresses]
+    assert len(_split_batch_get_ranges(range_addresses=range_addresses, max_cells=200)) == 5
+    assert len(_split_batch_get_ranges(range_addresses=range_addresses, max_url_length=100)) == 4
+
+
+def test_iter_reader():
+    gsheet = GSheetHandler(auth_scopes=[AuthScope.SpreadSheet])
+
+    chunks = list(gsheet.iter_gsheet(sheet_name="Sheet1", columns="A:G", chunk_rows=5))
+    assert len(chunks) > 0
+    assert all(list(chunk.columns) == list(chunks[0].columns) for chunk in chunks)
+    assert all(chunk.dtypes.equals(chunks[0].dtypes) for chunk in chunks)
+
+
+def test_iter_reader_gaps(tmp_path):
+    # a header, 2 rows, 4 blank rows, then 2 rows with a text in the numeric column
+    sheet_values = [["Name", "Amount"], ["a", "1"], ["b", "2.5"], [], [], [], [], ["c", "n/a"], ["d", "4"]]
+    transport_pool = RowsTransportPool(sheet_values=sheet_values)
+    gsheet = GSheetHandler(auth_scopes=[AuthScope.SpreadSheetReadOnly], spreadsheet_id="spreadsheet_id",
+                           credentials_folder_path=tmp_path, transport=transport_pool)
+    gsheet.authorized_creds = Credentials(token="token")
+
+    chunks = list(gsheet.iter_gsheet(sheet_name="Sheet1", columns=None, chunk_rows=3))
+    # read to the last row of the used extent, the blank chunk is not yielded
+    assert transport_pool.ranges == ["Sheet1!A1:B3", "Sheet1!A4:B6", "Sheet1!A7:B9"]
+    assert len(chunks) == 2
+    assert all(list(chunk.columns) == ["Name", "Amount"] for chunk in chunks)
+    assert all(chunk.dtypes.tolist() == ['object', 'float64'] for chunk in chunks)
+    # the blank row 7 opens the last chunk, the text is NaN
+    df = pd.concat(chunks, ignore_index=True)
+    assert df["Name"].where(df["Name"].notna(), None).tolist() == ["a", "b", None, "c", "d"]
+    assert df["Amount"].isna().tolist() == [False, False, True, True, False]
+    assert df["Amount"].sum() == 7.5
+
+
+def test_chunk_dtypes():
+    first_chunk = pd.DataFrame(data=[["1", "a"], ["2.5", ""]])
+    chunk_dtypes = _infer_chunk_dtypes(first_chunk)
+    assert chunk_dtypes == {0: 'float64', 1: 'object'}
+
+    next_chunk = _cast_chunk(chunk=pd.DataFrame(data=[["3", "b"], ["", "c"]]), chunk_dtypes=chunk_dtypes)
+    assert next_chunk.dtypes.tolist() == ['float64', 'object']
+    assert next_chunk.iloc[1, 0] != next_chunk.iloc[1, 0]
+
+    # text in a numeric column: the dtypes are kept, the text becomes NaN
+    next_chunk = _cast_chunk(chunk=pd.DataFrame(data=[["x", "b"], ["4", "c"]]), chunk_dtypes=chunk_dtypes)
+    assert next_chunk.dtypes.tolist() == ['float64', 'object']
+    assert next_chunk.iloc[0, 0] != next_chunk.iloc[0, 0] and next_chunk.iloc[1, 0] == 4.0
+    assert chunk_dtypes == {0: 'float64', 1: 'object'}
+
+
 def test_desc():
     gsheet = GSheetHandler(auth_scopes=[AuthScope.SpreadSheet])
 
@@ -39,8 +232,29 @@ def test_sheet_properties():
     assert len(result) > 0
 
 
+def test_sheet_id():
+    gsheet = GSheetHandler(auth_scopes=[AuthScope.SpreadSheet])
+
+    sheet_id = gsheet.get_sheet_id(sheet_name="sheet1")
+    assert sheet_id is not None
+    assert gsheet.get_sheet_properties(sheet_name="Sheet1").get('sheetId') == sheet_id
+
+
 if __name__ == '__main__':
+    import tempfile
+    from pathlib import Path
+
     test_reader()
     test_reader_as_dataframe()
+    test_reader_typed_dataframe()
+    test_reader_used_range()
+    test_reader_used_range_sparse(Path(tempfile.mkdtemp()))
+    test_reader_streamed(Path(tempfile.mkdtemp()))
+    test_reader_batch()
+    test_split_batch_get_ranges()
+    test_iter_reader()
+    test_iter_reader_gaps(Path(tempfile.mkdtemp()))
+    test_chunk_dtypes()
     test_desc()
     test_sheet_properties()
+    test_sheet_id()
@@ -1,4 +1,46 @@
-from google_api_helpers.g_sheet_helpers import (GSheetHandler, AuthScope)
+import json
+from urllib.parse import (unquote, urlsplit)
+
+import numpy as np
+import pandas as pd
+from google.oauth2.credentials import Credentials
+
+from google_api_helpers.g_sheet_helpers import (GSheetHandler, AuthScope, _split_batch_update_data,
+                                                _dataframe_to_values, _estimate_chunk_rows, _changed_rectangles)
+from google_api_helpers.g_transport_helpers import GTransportPool
+
+
+class WriteTransportPool(GTransportPool):
+    """Answers values.update, the connection being lost for the failed_ranges, values.append without
+    updatedRange, as a fields masked reply, and values.batchUpdate, recording its ranges
+    """
+
+    def __init__(self, failed_ranges: tuple = ()):
+        self.failed_ranges: tuple = failed_ranges
+        self.batch_ranges: list = []
+
+    def request(self, method, url, body=None, headers=None):
+        url_path = unquote(urlsplit(url).path)
+        if url_path.endswith("/values:batchUpdate"):
+            data = json.loads(body)['data']
+            self.batch_ranges.extend(value_range['range'] for value_range in data)
+            content = {'responses': [{'updatedRange': value_range['range'],
+                                      'updatedCells': sum(len(row_values) for row_values in value_range['values'])}
+                                     for value_range in data]}
+            return 200, {'content-type': 'application/json'}, json.dumps(content).encode()
+        sheet_range = url_path.rpartition("/values/")[2]
+        if sheet_range in self.failed_ranges:
+            raise ConnectionError(f"Connection lost: {sheet_range}")
+        if sheet_range.endswith(":append"):
+            content = {'spreadsheetId': "spreadsheet_id"}
+        else:
+            values = json.loads(body)['values']
+            content = {'updatedRange': sheet_range, 'updatedRows': len(values),
+                       'updatedCells': sum(len(row_values) for row_values in values)}
+        return 200, {'content-type': 'application/json'}, json.dumps(content).encode()
+
+    def close(self):
+        pass
 
 
 def test_writer_with_range():
@@ -23,6 +65,126 @@ def test_writer_with_start_cell():
     assert updated_rows > 0
 
 
+def test_writer_batch():
+    gsheet = GSheetHandler(auth_scopes=[AuthScope.SpreadSheet],
+                           spreadsheet_id=None)
+    result = gsheet.update_gsheets_batch(ranges_values={"Sheet1!A1:B2": [['A', 'B'],
+                                                                         ['C', 'D']],
+                                                        ("Sheet1", "D4"): [['E'],
+                                                                           ['F']]},
+                                         value_input_option="RAW")
+    assert result['totalUpdatedCells'] == 6
+    assert result['updatedCells'][("Sheet1", "D4")] == 2
+
+
+def test_split_batch_update_data():
+    range_values = [[row_n, 'x' * 50] for row_n in range(100)]
+    batches = _split_batch_update_data(data_ranges=[("Sheet1!B5:C104", "Sheet1!B5:C104", range_values),
+                                                    ("Sheet1!A1", "Sheet1!A1", [[1]])],
+                                       max_bytes=2000)
+
+    assert len(batches) == 3
+    assert [range_address for _, range_address, _ in batches[0] + batches[1]] == ["Sheet1!B5", "Sheet1!B39"]
+    assert sum(len(part_values) for batch in batches for _, _, part_values in batch) == 101
+
+
+def test_write_dataframe():
+    gsheet = GSheetHandler(auth_scopes=[AuthScope.SpreadSheet],
+                           spreadsheet_id=None)
+    df = pd.DataFrame(data={'A': range(100), 'B': ['C'] * 100})
+    write_report = gsheet.write_dataframe(sheet_name="Sheet1",
+                                          df=df,
+                                          start_cell="D1",
+                                          mode="overwrite",
+                                          max_bytes=500)
+    assert write_report.completed
+    assert write_report.rows_written == 100
+    assert write_report.chunks_n > 1
+
+
+def test_write_dataframe_failures(tmp_path):
+    transport_pool = WriteTransportPool(failed_ranges=("Sheet1!A3",))
+    gsheet = GSheetHandler(auth_scopes=[AuthScope.SpreadSheet], spreadsheet_id="spreadsheet_id",
+                           credentials_folder_path=tmp_path, transport=transport_pool)
+    gsheet.authorized_creds = Credentials(token="token")
+    df = pd.DataFrame({'A': range(5)})
+
+    # a row per chunk: the chunk of the third row is lost, the report resumes at it
+    write_report = gsheet.write_dataframe(sheet_name="Sheet1", df=df, header=False, max_bytes=1)
+    assert not write_report.completed and write_report.failed_chunks_n == 1
+    assert (write_report.next_row_n, write_report.next_start_cell) == (2, "A3")
+    assert write_report.rows_written == 4
+
+    # the appended rows can not be located
+    write_report = gsheet.write_dataframe(sheet_name="Sheet1", df=df, mode="append")
+    assert not write_report.completed and write_report.next_start_cell is None
+
+
+def test_dataframe_to_values():
+    df = pd.DataFrame(data={'A': [1, None], 'B': pd.to_datetime(['2024-01-31', None])})
+    assert _dataframe_to_values(df) == [[1.0, '2024-01-31 00:00:00'], ['', '']]
+    assert _estimate_chunk_rows(df=pd.DataFrame(data={'A': range(1000)}), max_bytes=1000) > 100
+
+
+def test_sync_writer():
+    gsheet = GSheetHandler(auth_scopes=[AuthScope.SpreadSheet],
+                           spreadsheet_id=None)
+    sheet_values = [[row_n * 10 + column_n for column_n in range(10)] for row_n in range(10)]
+    gsheet.sync_gsheet(sheet_name="Sheet1", sheet_new_values=sheet_values, sheet_start_cell="H1")
+
+    sheet_values[2][3] = 'changed'
+    result = gsheet.sync_gsheet(sheet_name="Sheet1", sheet_new_values=sheet_values, sheet_start_cell="H1")
+    assert result == {'updatedCells': 1, 'skippedCells': 99, 'updatedRanges': 1}
+
+
+def test_sync_writer_blocks(tmp_path):
+    transport_pool = WriteTransportPool()
+    gsheet = GSheetHandler(auth_scopes=[AuthScope.SpreadSheet], spreadsheet_id="spreadsheet_id",
+                           credentials_folder_path=tmp_path, transport=transport_pool)
+    gsheet.authorized_creds = Credentials(token="token")
+    left_values = [[row_n * 10 + column_n for column_n in range(3)] for row_n in range(5)]
+    right_values = [[row_n * 10 + column_n for column_n in range(2)] for row_n in range(5)]
+
+    # two disjoint blocks of the same sheet keep their snapshots
+    gsheet.sync_gsheet(sheet_name="Sheet1", sheet_new_values=left_values, sheet_start_cell="A1")
+    gsheet.sync_gsheet(sheet_name="Sheet1", sheet_new_values=right_values, sheet_start_cell="F1")
+    left_values[1][1] = 'changed'
+    right_values[4][0] = 'changed'
+    transport_pool.batch_ranges.clear()
+    result = gsheet.sync_gsheet(sheet_name="Sheet1", sheet_new_values=left_values, sheet_start_cell="A1")
+    assert result == {'updatedCells': 1, 'skippedCells': 14, 'updatedRanges': 1}
+    result = gsheet.sync_gsheet(sheet_name="Sheet1", sheet_new_values=right_values, sheet_start_cell="F1")
+    assert result == {'updatedCells': 1, 'skippedCells': 9, 'updatedRanges': 1}
+    assert transport_pool.batch_ranges == ["Sheet1!B2:B2", "Sheet1!F5:F5"]
+
+    # a write over a block drops its snapshot only
+    gsheet.update_gsheet(sheet_name="Sheet1", sheet_new_values=[['x']], sheet_range="G2")
+    result = gsheet.sync_gsheet(sheet_name="Sheet1", sheet_new_values=right_values, sheet_start_cell="F1")
+    assert result['updatedCells'] == 10
+    result = gsheet.sync_gsheet(sheet_name="Sheet1", sheet_new_values=left_values, sheet_start_cell="A1")
+    assert result['updatedCells'] == 0
+
+
+def test_changed_rectangles():
+    changed_cells = np.zeros((6, 6), dtype=bool)
+    changed_cells[0:2, 0:2] = True
+    changed_cells[1:3, 4] = True
+    changed_cells[4, 0:2] = True
+    changed_cells[5, 5] = True
+    assert _changed_rectangles(changed_cells) == [(0, 0, 1, 1), (1, 4, 2, 4), (4, 0, 4, 1), (5, 5, 5, 5)]
+
+
 if __name__ == '__main__':
+    import tempfile
+    from pathlib import Path
+
     test_writer_with_range()
     test_writer_with_start_cell()
+    test_writer_batch()
+    test_split_batch_update_data()
+    test_write_dataframe()
+    test_write_dataframe_failures(Path(tempfile.mkdtemp()))
+    test_dataframe_to_values()
+    test_sync_writer()
+    test_sync_writer_blocks(Path(tempfile.mkdtemp()))
+    test_changed_rectangles()
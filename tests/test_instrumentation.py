@@ -0,0 +1,96 @@
+import pytest
+from googleapiclient.discovery import build_from_document
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpMockSequence
+
+from google_api_helpers.g_auth_helpers import GAuthHandler
+from google_api_helpers.g_instrumentation_helpers import (GInstrumentation, GHistogramAggregator, GCallEvent,
+                                                          request_resource_id)
+from google_api_helpers.g_scheduler_helpers import GRequestScheduler
+from google_api_helpers.g_service_helpers import get_discovery_doc
+
+
+def _values_get_request(responses: list):
+    service = build_from_document(get_discovery_doc(api_name="sheets", api_version="v4"),
+                                  http=HttpMockSequence(responses))
+    return service.spreadsheets().values().get(spreadsheetId="spreadsheet_id", range="Sheet1!A1:B2")
+
+
+def _instrumented_handler(tmp_path, instrumentation: GInstrumentation) -> GAuthHandler:
+    return GAuthHandler(auth_scopes=None, credentials_folder_path=tmp_path,
+                        scheduler=GRequestScheduler(quota_buckets={}, base_delay=0.01),
+                        instrumentation=instrumentation)
+
+
+def test_request_resource_id():
+    assert request_resource_id("https://sheets.googleapis.com/v4/spreadsheets/abc/values/A1") == "abc"
+    assert request_resource_id("https://sheets.googleapis.com/v4/spreadsheets/abc:batchUpdate") == "abc"
+    assert request_resource_id("https://gmail.googleapis.com/gmail/v1/users/me/messages") == "me"
+    assert request_resource_id("https://oauth2.googleapis.com/token") is None
+
+
+def test_call_events(tmp_path):
+    call_events: list = []
+    instrumentation = GInstrumentation(hooks=[call_events.append])
+    handler = _instrumented_handler(tmp_path, instrumentation=instrumentation)
+
+    response = handler.execute_request(_values_get_request([({'status': '429', 'retry-after': '0'}, ''),
+                                                            ({'status': '200'}, '{"values": [["a"]]}')]),
+                                       quota_bucket='sheets_read', cost=2.0)
+    assert response == {'values': [['a']]}
+    call_event = call_events[0]
+    assert call_event.method_id == "sheets.spreadsheets.values.get"
+    assert call_event.resource_id == "spreadsheet_id"
+    assert call_event.succeeded
+    assert call_event.status == 200
+    assert call_event.retries == 1
+    assert call_event.quota_units == 2.0
+    assert call_event.response_bytes == len('{"values": [["a"]]}')
+    assert {'queue', 'network', 'decode', 'backoff'} <= set(call_event.phases)
+
+    with pytest.raises(HttpError):
+        handler.execute_request(_values_get_request([({'status': '400'}, '')]), quota_bucket='sheets_read')
+    assert not call_events[1].succeeded
+    assert call_events[1].status == 400
+
+
+def test_failing_hook(tmp_path):
+    def failing_hook(call_event: GCallEvent):
+        raise ValueError(call_event.method_id)
+
+    handler = _instrumented_handler(tmp_path, instrumentation=GInstrumentation(hooks=[failing_hook]))
+    assert handler.execute_request(_values_get_request([({'status': '200'}, '{}')]),
+                                   quota_bucket='sheets_read') == {}
+
+
+def test_histogram_aggregator():
+    histograms = GHistogramAggregator(buckets=(0.1, 0.2, 0.4))
+    for seconds in (0.05, 0.15, 0.15, 0.3):
+        call_event = GCallEvent(method_id="method", quota_units=1.0)
+        call_event.add_phase('network', seconds)
+        call_event.succeeded = True
+        histograms(call_event)
+    with GInstrumentation(hooks=[histograms]).time_step('values_to_dataframe'):
+        pass
+
+    assert histograms.count(method_id="method") == 4
+    assert histograms.mean(method_id="method", phase='network') == pytest.approx(0.1625)
+    # 2 observations of 4 are in the (0.1, 0.2] bucket
+    assert histograms.quantile(method_id="method", q=0.5) == pytest.approx(0.15)
+    assert histograms.quantile(method_id="method", q=1.0) == pytest.approx(0.4)
+    assert histograms.quantile(method_id="missing") is None
+
+    summary = histograms.summary()
+    assert list(summary['method_id']) == ["method", "local.values_to_dataframe"]
+    assert summary.loc[0, 'calls'] == 4
+    assert summary.loc[0, 'quota_units'] == 4.0
+
+
+if __name__ == '__main__':
+    import tempfile
+    from pathlib import Path
+
+    test_request_resource_id()
+    test_call_events(Path(tempfile.mkdtemp()))
+    test_failing_hook(Path(tempfile.mkdtemp()))
+    test_histogram_aggregator()
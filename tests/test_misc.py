@@ -1,4 +1,5 @@
-from google_api_helpers.misc_helpers import (build_sheet_range, a2n, n2a)
+from google_api_helpers.misc_helpers import (build_sheet_range, a2n, n2a, range_dimensions, a1_to_grid_range,
+                                             A1Range, cells_to_a1)
 
 
 def test_letter_to_column_number():
@@ -16,9 +17,74 @@ def test_build_sheet_range():
               ]
     result = build_sheet_range(start_cell="b10", range_values=values)
     assert result == "B10:C12"
+    assert build_sheet_range(range_values=[]) is None
+    assert build_sheet_range(range_values=[[], []]) is None
+
+
+def test_range_dimensions():
+    assert range_dimensions("Sheet1!B10:C12") == (3, 2)
+    assert range_dimensions("A:C") == (None, 3)
+    assert range_dimensions("Sheet1") == (None, None)
+
+
+def test_a1_to_grid_range():
+    assert a1_to_grid_range(sheet_id=7, cells_range="B2:C5") == {'sheetId': 7,
+                                                                  'startRowIndex': 1, 'endRowIndex': 5,
+                                                                  'startColumnIndex': 1, 'endColumnIndex': 3}
+    assert a1_to_grid_range(sheet_id=7, cells_range="A:B") == {'sheetId': 7,
+                                                                'startColumnIndex': 0, 'endColumnIndex': 2}
+    assert a1_to_grid_range(sheet_id=7) == {'sheetId': 7}
+
+
+def test_a1_range_parse():
+    a1_range = A1Range.parse("'My sheet'!B2:C5")
+    assert (a1_range.sheet_name, a1_range.rows_n, a1_range.columns_n) == ("My sheet", 4, 2)
+    assert a1_range.to_a1() == "'My sheet'!B2:C5"
+    assert A1Range.parse("A:C").to_a1() == "A:C"
+    assert A1Range.parse("Sheet1").sheet_name == "Sheet1"
+
+
+def test_a1_range_parse_cell_like_sheet_names():
+    # read as cells, as the Sheets API does
+    assert A1Range.parse("Jan1") == A1Range(start_row=1, start_column=a2n("JAN"), end_row=1, end_column=a2n("JAN"))
+    assert A1Range.parse("FX") == A1Range(start_column=a2n("FX"), end_column=a2n("FX"))
+    # quoted or with cells: sheet names
+    assert A1Range.parse("'Jan1'") == A1Range(sheet_name="Jan1")
+    assert A1Range.parse("'FX'") == A1Range(sheet_name="FX")
+    assert A1Range.parse("Jan1!A1:B2") == A1Range(1, 1, 2, 2, sheet_name="Jan1")
+    # written back quoted
+    assert A1Range(sheet_name="Jan1").to_a1() == "'Jan1'"
+    assert A1Range(1, 1, 2, 2, sheet_name="FX").to_a1() == "'FX'!A1:B2"
+    assert A1Range.parse(A1Range(sheet_name="FX").to_a1()) == A1Range(sheet_name="FX")
+
+
+def test_a1_range_intersection_union():
+    assert A1Range.parse("A1:C10").intersection(A1Range.parse("B5:Z20")) == A1Range.parse("B5:C10")
+    assert A1Range.parse("A:C").intersection(A1Range.parse("B2:D4")) == A1Range.parse("B2:C4")
+    assert A1Range.parse("A1:B2").intersection(A1Range.parse("C3:D4")) is None
+    assert A1Range.parse("A1:B2").union(A1Range.parse("D5:D6")) == A1Range.parse("A1:D6")
+
+
+def test_a1_range_merge_split():
+    merged_ranges = A1Range.merge([A1Range.parse(sheet_range) for sheet_range in ["A1:B2", "A3:B4", "C1:C4", "E1"]])
+    assert sorted(map(str, merged_ranges)) == ["A1:C4", "E1:E1"]
+    split_ranges = A1Range.parse("A1:J100").split(max_cells=250)
+    assert [str(split_range) for split_range in split_ranges] == ["A1:J25", "A26:J50", "A51:J75", "A76:J100"]
+    assert str(A1Range.parse("A1:Z1").split(max_cells=10)[-1]) == "U1:Z1"
+
+
+def test_cells_to_a1():
+    assert cells_to_a1(rows=[1, 10], columns=[1, 28]).tolist() == ["A1", "AB10"]
 
 
 if __name__ == '__main__':
     test_letter_to_column_number()
     test_column_number_to_letter()
     test_build_sheet_range()
+    test_range_dimensions()
+    test_a1_to_grid_range()
+    test_a1_range_parse()
+    test_a1_range_parse_cell_like_sheet_names()
+    test_a1_range_intersection_union()
+    test_a1_range_merge_split()
+    test_cells_to_a1()
@@ -0,0 +1,129 @@
+import json
+import time
+from threading import Thread
+
+import pytest
+from googleapiclient.discovery import build_from_document
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpMockSequence
+
+from google_api_helpers.g_scheduler_helpers import (GRequestScheduler, TokenBucket, PRIORITY_HIGH, PRIORITY_LOW,
+                                                    is_rate_limit_error)
+from google_api_helpers.g_service_helpers import get_discovery_doc
+
+
+def _values_get_request(responses: list):
+    service = build_from_document(get_discovery_doc(api_name="sheets", api_version="v4"),
+                                  http=HttpMockSequence(responses))
+    return service.spreadsheets().values().get(spreadsheetId="spreadsheet_id", range="Sheet1!A1:B2")
+
+
+def test_token_bucket():
+    token_bucket = TokenBucket(capacity=2, refill_per_second=10)
+    assert token_bucket.try_acquire() == 0.0
+    assert token_bucket.try_acquire() == 0.0
+    assert 0 < token_bucket.try_acquire() <= 0.1
+    time.sleep(0.11)
+    assert token_bucket.try_acquire() == 0.0
+
+
+def test_acquire_waits():
+    scheduler = GRequestScheduler(quota_buckets={'sheets_read': (1, 20)})
+    scheduler.acquire(quota_bucket='sheets_read')
+    assert scheduler.acquire(quota_bucket='sheets_read') >= 0.04
+    assert scheduler.stats['wait_seconds'] > 0
+    # buckets without quota are not throttled
+    assert scheduler.acquire(quota_bucket='other') == 0.0
+
+
+def test_acquire_priority():
+    scheduler = GRequestScheduler(quota_buckets={'sheets_write': (1, 10)})
+    scheduler.acquire(quota_bucket='sheets_write')
+    served: list = []
+
+    def acquire(priority: int):
+        scheduler.acquire(quota_bucket='sheets_write', priority=priority)
+        served.append(priority)
+
+    threads = [Thread(target=acquire, args=(priority,)) for priority in (PRIORITY_LOW, PRIORITY_HIGH)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.01)
+    for thread in threads:
+        thread.join()
+    assert served == [PRIORITY_HIGH, PRIORITY_LOW]
+
+
+def test_acquire_interrupted():
+    scheduler = GRequestScheduler(quota_buckets={'sheets_write': (1, 10)})
+    scheduler.acquire(quota_bucket='sheets_write')
+
+    def interrupted_wait(timeout=None):
+        raise KeyboardInterrupt
+
+    scheduler._condition.wait = interrupted_wait
+    with pytest.raises(KeyboardInterrupt):
+        scheduler.acquire(quota_bucket='sheets_write', priority=PRIORITY_HIGH)
+    assert scheduler._waiters['sheets_write'] == []
+    del scheduler._condition.wait
+
+    # the next waiter is not blocked behind the ticket of the interrupted one
+    thread = Thread(target=scheduler.acquire, kwargs={'quota_bucket': 'sheets_write'})
+    thread.start()
+    thread.join(timeout=2)
+    assert not thread.is_alive()
+
+
+def test_execute_retries():
+    scheduler = GRequestScheduler(quota_buckets={}, base_delay=0.01)
+    request = _values_get_request([({'status': '429', 'retry-after': '0'}, ''),
+                                   ({'status': '503'}, ''),
+                                   ({'status': '200'}, '{"values": [["a"]]}')])
+    assert scheduler.execute(request, quota_bucket='sheets_read') == {'values': [['a']]}
+    assert scheduler.stats['requests'] == 3
+    assert scheduler.stats['retries'] == 2
+    assert scheduler.stats['throttled'] == 1
+
+
+def test_execute_retries_rate_limit():
+    scheduler = GRequestScheduler(quota_buckets={}, base_delay=0.01)
+    rate_limit_content = json.dumps({'error': {'code': 403, 'message': 'User-rate limit exceeded',
+                                               'errors': [{'domain': 'usageLimits',
+                                                           'reason': 'userRateLimitExceeded'}]}})
+    request = _values_get_request([({'status': '403'}, rate_limit_content),
+                                   ({'status': '200'}, '{"values": [["a"]]}')])
+    assert scheduler.execute(request, quota_bucket='gmail') == {'values': [['a']]}
+    assert scheduler.stats['retries'] == 1
+    assert scheduler.stats['throttled'] == 1
+    # other 403 are not retried
+    forbidden_content = json.dumps({'error': {'code': 403, 'message': 'Forbidden',
+                                              'errors': [{'domain': 'global', 'reason': 'forbidden'}]}})
+    request = _values_get_request([({'status': '403'}, forbidden_content)])
+    with pytest.raises(HttpError):
+        scheduler.execute(request, quota_bucket='gmail')
+    assert scheduler.stats['failed'] == 1
+    assert is_rate_limit_error(status=403, content=b'not json') is False
+    assert is_rate_limit_error(status=429, content=rate_limit_content.encode()) is False
+
+
+def test_execute_raises():
+    scheduler = GRequestScheduler(quota_buckets={}, max_retries=1, base_delay=0.01)
+    request = _values_get_request([({'status': '503'}, ''), ({'status': '503'}, '')])
+    with pytest.raises(HttpError):
+        scheduler.execute(request, quota_bucket='sheets_read')
+    # client errors are not retried
+    request = _values_get_request([({'status': '400'}, '')])
+    with pytest.raises(HttpError):
+        scheduler.execute(request, quota_bucket='sheets_read')
+    assert scheduler.stats['failed'] == 2
+    assert scheduler.stats['retries'] == 1
+
+
+if __name__ == '__main__':
+    test_token_bucket()
+    test_acquire_waits()
+    test_acquire_priority()
+    test_acquire_interrupted()
+    test_execute_retries()
+    test_execute_retries_rate_limit()
+    test_execute_raises()
@@ -0,0 +1,113 @@
+from threading import Thread
+
+import pytest
+from google.oauth2.credentials import Credentials
+from googleapiclient.http import DEFAULT_HTTP_TIMEOUT_SEC
+
+from google_api_helpers.g_service_helpers import (build_service, clear_service_cache, get_resource)
+from google_api_helpers.g_transport_helpers import (GTransportPool, GRequestsTransportPool, GHttpxTransportPool,
+                                                    PooledHttp)
+
+
+class RecordingTransportPool(GTransportPool):
+    """Answers every request with the same values.get response, recording the requests"""
+
+    def __init__(self):
+        self.requests: list = []
+
+    def request(self, method, url, body=None, headers=None):
+        self.requests.append((method, url, headers))
+        return 200, {'content-type': 'application/json', 'content-encoding': 'gzip'}, b'{"values": [["a"]]}'
+
+    def close(self):
+        pass
+
+
+def test_service_built_once():
+    credentials = Credentials(token="token")
+    service = build_service(api_name="sheets", api_version="v4", credentials=credentials)
+    assert build_service(api_name="sheets", api_version="v4", credentials=credentials) is service
+    assert get_resource(service, "spreadsheets.values") is get_resource(service, "spreadsheets.values")
+    # the service itself is left as googleapiclient builds it
+    assert service.spreadsheets() is not service.spreadsheets()
+
+
+def test_service_http():
+    service = build_service(api_name="sheets", api_version="v4", credentials=Credentials(token="token"))
+    # the httplib2 transport of discovery.build
+    assert service._http.http.timeout == DEFAULT_HTTP_TIMEOUT_SEC
+    assert 308 not in service._http.http.redirect_codes
+
+
+def test_service_per_credentials():
+    service = build_service(api_name="sheets", api_version="v4", credentials=Credentials(token="token"))
+    other_service = build_service(api_name="sheets", api_version="v4", credentials=Credentials(token="token"))
+    assert service is not other_service
+
+
+def test_service_per_thread():
+    credentials = Credentials(token="token")
+    services: list = []
+    threads = [Thread(target=lambda: services.append(build_service(api_name="gmail",
+                                                                     api_version="v1",
+                                                                     credentials=credentials)))
+               for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert services[0] is not services[1]
+    assert services[0]._http is not services[1]._http
+
+
+def test_clear_service_cache():
+    credentials = Credentials(token="token")
+    service = build_service(api_name="sheets", api_version="v4", credentials=credentials)
+    clear_service_cache()
+    assert build_service(api_name="sheets", api_version="v4", credentials=credentials) is not service
+
+
+def test_pooled_transport():
+    transport_pool = RecordingTransportPool()
+    credentials = Credentials(token="token")
+    services: list = []
+    threads = [Thread(target=lambda: services.append(build_service(api_name="sheets", api_version="v4",
+                                                                     credentials=credentials,
+                                                                     transport=transport_pool)))
+               for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # a service per thread, all sending through the shared pool
+    assert all(isinstance(service._http, PooledHttp) for service in services)
+    assert services[0]._http.transport_pool is services[1]._http.transport_pool is transport_pool
+
+    result = services[0].spreadsheets().values().get(spreadsheetId="spreadsheet_id", range="A1").execute()
+    assert result == {'values': [['a']]}
+    method, url, headers = transport_pool.requests[0]
+    assert method == "GET"
+    assert "/v4/spreadsheets/spreadsheet_id/values/A1" in url
+    assert headers['authorization'] == "Bearer token"
+    assert "gzip" in headers['accept-encoding']
+
+
+
+def test_transport_errors():
+    with pytest.raises(TypeError):
+        GTransportPool()
+    # nothing listens on port 1: the client errors are raised as the socket errors googleapiclient retries
+    for transport_pool in (GRequestsTransportPool(timeout=5), GHttpxTransportPool(http2=False, timeout=5)):
+        with pytest.raises(ConnectionError):
+            transport_pool.request("GET", "http://127.0.0.1:1/")
+        transport_pool.close()
+
+
+if __name__ == '__main__':
+    test_service_built_once()
+    test_service_http()
+    test_service_per_credentials()
+    test_service_per_thread()
+    test_clear_service_cache()
+    test_pooled_transport()
+    test_transport_errors()